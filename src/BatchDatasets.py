@@ -0,0 +1,299 @@
+import os
+import time
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from FindIdealFunctions import (session_scope, load_df, ideal_columns, top_k_sse, format_min_sse, create_results_df,
+                                precision_candidates, rescore_candidates)
+from ColumnarCache import CACHE_DIR
+from EvaluateTestData import XIndex, max_deviations_batch, results_frame
+from Instrumentation import metrics, add_metrics_arguments, configure_metrics_from_args
+from Precision import (precision, compare_selection, compare_decisions, add_precision_arguments,
+                       configure_precision_from_args, PRECISION_CHECK_CANDIDATES)
+
+# Output table of the batch mode: the 'Table 3' columns with the dataset of each row
+BATCH_TABLE = "Table 3 batch"
+BATCH_TABLE_INDEXES = {"ix_table3_batch_dataset": "Dataset", "ix_table3_batch_x": "X (test func)"}
+
+
+def load_datasets(directory):
+    """
+    Read the training and test data of every dataset below a directory.
+
+    Every subdirectory holding a train.csv and a test.csv is one dataset, identified by the subdirectory name.
+
+    Args:
+        directory (str): Directory with one subdirectory per dataset.
+
+    Returns:
+        list: (dataset, training_df, test_df) tuples sorted by dataset name, with the training columns named like
+        the Trainingdata table ('y1 (training func)', ...).
+    """
+    datasets = []
+    for name in sorted(os.listdir(directory)):
+        train_file = os.path.join(directory, name, "train.csv")
+        test_file = os.path.join(directory, name, "test.csv")
+        if not (os.path.isfile(train_file) and os.path.isfile(test_file)):
+            continue
+        training_df = pd.read_csv(train_file)
+        training_df.columns = ["x"] + [f"{column} (training func)" for column in training_df.columns[1:]]
+        datasets.append((name, training_df, pd.read_csv(test_file)[["x", "y"]]))
+    return datasets
+
+
+def stack_training(datasets, ideal_x, dtype=None):
+    """
+    Stack the training functions of all datasets into one array on the ideal x grid.
+
+    Args:
+        datasets (list): (dataset, training_df, test_df) tuples as returned by load_datasets.
+        ideal_x (np.ndarray): x values of the ideal functions.
+        dtype (type, optional): Floating point type of the array (default is the configured precision).
+
+    Returns:
+        tuple: (training_array, starts) with one column per training function of every dataset, and the first
+        column of each dataset.
+
+    Raises:
+        ValueError: If the x values of a training set differ from the ideal x values.
+    """
+    dtype = precision.dtype if dtype is None else dtype
+    arrays, starts, start = [], [], 0
+    for dataset, training_df, _ in datasets:
+        if len(training_df) != len(ideal_x) or not np.allclose(training_df["x"].values, ideal_x):
+            raise ValueError(f"Training data of dataset '{dataset}' is not on the x grid of the ideal functions")
+        arrays.append(training_df.iloc[:, 1:5].to_numpy(dtype=dtype))  # Training functions y1 to y4, as in get_min_sse
+        starts.append(start)
+        start += arrays[-1].shape[1]
+    return np.hstack(arrays) if arrays else np.empty((len(ideal_x), 0), dtype=dtype), starts
+
+
+def select_batch(training_array, starts, ideal_array, top_k=1):
+    """
+    Find the k best ideal functions for each training function of every dataset in one SSE computation.
+
+    Args:
+        training_array (np.ndarray): Stacked training functions as returned by stack_training.
+        starts (list): First column of each dataset in training_array.
+        ideal_array (np.ndarray): Array of shape (n_points, n_ideal) with the ideal functions.
+        top_k (int): Number of candidates to keep per training function (default is 1).
+
+    Returns:
+        list: One dictionary per dataset, as returned by FindIdealFunctions.get_min_sse.
+    """
+    best_sse, best_idx = top_k_sse(training_array, ideal_array, top_k)
+    stops = starts[1:] + [training_array.shape[1]]
+    return [format_min_sse(best_sse[start:stop], best_idx[start:stop], top_k) for start, stop in zip(starts, stops)]
+
+
+def fit_batch(training_array, starts, ideal_array):
+    """
+    Select the best ideal function for each training function of every dataset in one SSE computation.
+
+    Args:
+        training_array (np.ndarray): Stacked training functions as returned by stack_training.
+        starts (list): First column of each dataset in training_array.
+        ideal_array (np.ndarray): Array of shape (n_points, n_ideal) with the ideal functions.
+
+    Returns:
+        list: One DataFrame per dataset, as returned by FindIdealFunctions.fit.
+    """
+    return [create_results_df(min_sse) for min_sse in select_batch(training_array, starts, ideal_array)]
+
+
+def evaluate_batch(datasets, training_array, starts, ideal_functions_df, best_ideal_dfs, lookup="exact",
+                   tolerance=0.0, x_index=None):
+    """
+    Calculate the deviation thresholds and match the test data of every dataset against the shared ideal functions.
+
+    The max deviations of all datasets are computed in one pass and all test points are resolved on the ideal x
+    grid with one lookup. The y values and deviations have the floating point type of training_array.
+
+    Args:
+        datasets (list): (dataset, training_df, test_df) tuples as returned by load_datasets.
+        training_array (np.ndarray): Stacked training functions as returned by stack_training.
+        starts (list): First column of each dataset in training_array.
+        ideal_functions_df (pd.DataFrame): DataFrame containing the ideal functions.
+        best_ideal_dfs (list): Best ideal functions of each dataset, as returned by fit_batch.
+        lookup (str): Lookup mode for test x values, see XIndex.resolve (default is 'exact').
+        tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+        x_index (XIndex, optional): Prebuilt index over ideal_functions_df['x'], built here if not given.
+
+    Returns:
+        pd.DataFrame: The matching results of all datasets as returned by compute_matches, with a leading
+        'Dataset' column. IDs are numbered per dataset.
+    """
+    if x_index is None:
+        x_index = XIndex(ideal_functions_df["x"].values)
+
+    # Only the ideal functions selected by some dataset are needed
+    selected = [list(best_ideal_df["Ideal Function"]) for best_ideal_df in best_ideal_dfs]
+    union = list(dict.fromkeys(func for funcs in selected for func in funcs))
+    ideal_values = ideal_functions_df[[f"{func} (ideal func)" for func in union]].to_numpy(dtype=training_array.dtype)
+
+    # Max deviations of every (training function, selected ideal function) pair of every dataset at once
+    training_indices = [start + j for start, funcs in zip(starts, selected) for j in range(len(funcs))]
+    ideal_indices = [union.index(func) for funcs in selected for func in funcs]
+    max_dev = max_deviations_batch(training_array, ideal_values, ideal_indices, training_indices)["max_dev"]
+
+    # Resolve the test points of all datasets on the ideal x grid together
+    test_x = np.concatenate([test_df["x"].values for _, _, test_df in datasets])
+    ideal_y, found = x_index.resolve(test_x, ideal_values, mode=lookup, tolerance=tolerance)
+
+    frames, row, pair = [], 0, 0
+    for (dataset, _, test_df), funcs in zip(datasets, selected):
+        rows = slice(row, row + len(test_df))
+        max_devs = dict(zip(funcs, max_dev[pair:pair + len(funcs)]))
+        matched = found[rows]
+        columns = [union.index(func) for func in funcs]
+        results_df = results_frame(np.arange(1, len(test_df) + 1)[matched], test_df["x"].values[matched],
+                                   test_df["y"].to_numpy(dtype=training_array.dtype)[matched],
+                                   ideal_y[rows][matched][:, columns], funcs, max_devs)
+        results_df.insert(0, "Dataset", dataset)
+        frames.append(results_df)
+        row += len(test_df)
+        pair += len(funcs)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def check_batch_precision(session, ideal_model, datasets, min_sses, results_df, lookup="exact", tolerance=0.0):
+    """
+    Re-score the reduced precision candidates and redo the matching of every dataset in float64, and flag every
+    changed selection and within_threshold decision.
+
+    Only the candidate ideal functions are read again, in float64; the datasets are float64 as read from their files.
+
+    Args:
+        session (Session): SQLAlchemy session for database operations.
+        ideal_model (Base): Idealfunctions or Idealfunctionarrays.
+        datasets (list): (dataset, training_df, test_df) tuples as returned by load_datasets.
+        min_sses (list): Reduced precision results of each dataset as returned by select_batch, with candidates.
+        results_df (pd.DataFrame): Reduced precision matching results as returned by evaluate_batch.
+        lookup (str): Lookup mode the results were matched with (default is 'exact').
+        tolerance (float): x tolerance the results were matched with (default is 0).
+
+    Returns:
+        tuple: (changed, flipped) with (dataset, training function, reduced precision ideal function, float64 ideal
+        function) of every changed selection, and the flipped decisions as returned by Precision.compare_decisions
+        with a leading 'Dataset' column.
+    """
+    candidates = [precision_candidates(min_sse) for min_sse in min_sses]
+    names = [name for dataset_candidates in candidates for funcs in dataset_candidates.values() for name in funcs]
+    ideal_df = load_df(session, ideal_model, cache_dir=CACHE_DIR, columns=ideal_columns(names), dtype=np.float64)
+    best_ideal_dfs = [create_results_df(min_sse) for min_sse in min_sses]
+
+    changed = []
+    for (dataset, training_df, _), dataset_candidates, best_ideal_df in zip(datasets, candidates, best_ideal_dfs):
+        reference = create_results_df(rescore_candidates(training_df, ideal_df, dataset_candidates))
+        changed += [(dataset,) + change for change in compare_selection(best_ideal_df, reference)]
+
+    training_array, starts = stack_training(datasets, ideal_df["x"].values, np.float64)
+    reference_df = evaluate_batch(datasets, training_array, starts, ideal_df, best_ideal_dfs, lookup, tolerance)
+    flipped = []
+    for dataset, _, _ in datasets:
+        dataset_flipped = compare_decisions(results_df[results_df["Dataset"] == dataset],
+                                            reference_df[reference_df["Dataset"] == dataset])
+        dataset_flipped.insert(0, "Dataset", dataset)
+        flipped.append(dataset_flipped)
+    flipped = pd.concat(flipped, ignore_index=True)
+    logging.info(f"Checked the {precision.mode} batch against float64: {len(changed)} selections and "
+                 f"{len(flipped)} decisions changed")
+    return changed, flipped
+
+
+def export_batch_results(results_df, session):
+    """
+    Write the matches within threshold of all datasets to the BATCH_TABLE table.
+
+    Args:
+        results_df (pd.DataFrame): DataFrame returned by evaluate_batch.
+        session (Session): SQLAlchemy session for database operations.
+
+    Returns:
+        pd.DataFrame: The exported rows.
+    """
+    columns_to_export = ["Dataset", "X (test func)", "Y (test func)", "Delta Y (test func)", "No. of ideal func"]
+    table_df = results_df.loc[results_df["within_threshold"], columns_to_export]
+    table_df.to_sql(BATCH_TABLE, con=session.bind, if_exists="replace", index=False)
+    with session.bind.begin() as connection:
+        for name, column in BATCH_TABLE_INDEXES.items():
+            connection.execute(text(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{BATCH_TABLE}" ("{column}")'))
+    return table_df
+
+
+def main(datasets_dir, session_factory=None, lookup="exact", tolerance=0.0, ideal_schema="wide"):
+    """
+    Fit and evaluate every dataset below a directory against the ideal functions in the database.
+
+    The ideal functions are loaded once; the best fits of all datasets are written to ideal_vs_training_batch.csv
+    and the matches within threshold to the BATCH_TABLE table. In reduced precision (see Precision.PrecisionMode)
+    the selections and decisions are checked against float64, see check_batch_precision.
+
+    Args:
+        datasets_dir (str): Directory with one subdirectory per dataset, see load_datasets.
+        session_factory (sessionmaker, optional): Session factory to use instead of the module's default database.
+        lookup (str): Lookup mode for test x values, see XIndex.resolve (default is 'exact').
+        tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+        ideal_schema (str): Storage of the ideal functions, 'wide' or 'long' (see ConfigandImport.IDEAL_MODELS).
+
+    Returns:
+        tuple: (best_fit_df, results_df), both with a 'Dataset' column.
+    """
+    from ConfigandImport import IDEAL_MODELS
+    ideal_model = IDEAL_MODELS[ideal_schema]
+    start_time = time.perf_counter()
+    with session_scope(session_factory) as session:
+        with metrics.stage("load") as stage:
+            ideal_functions_df = load_df(session, ideal_model, cache_dir=CACHE_DIR)
+            datasets = load_datasets(datasets_dir)
+            stage.add_rows(len(ideal_functions_df) + sum(len(training_df) + len(test_df)
+                                                         for _, training_df, test_df in datasets))
+
+        with metrics.stage("compute", rows=len(datasets)):
+            training_array, starts = stack_training(datasets, ideal_functions_df["x"].values)
+            ideal_array = ideal_functions_df.iloc[:, 1:].to_numpy(dtype=training_array.dtype)
+            top_k = PRECISION_CHECK_CANDIDATES if precision.checked else 1
+            min_sses = select_batch(training_array, starts, ideal_array, top_k)
+            best_ideal_dfs = [create_results_df(min_sse) for min_sse in min_sses]
+
+        with metrics.stage("match", rows=sum(len(test_df) for _, _, test_df in datasets)):
+            results_df = evaluate_batch(datasets, training_array, starts, ideal_functions_df, best_ideal_dfs,
+                                        lookup, tolerance)
+
+        if precision.checked and datasets:
+            with metrics.stage("precision_check"):
+                check_batch_precision(session, ideal_model, datasets, min_sses, results_df, lookup, tolerance)
+
+        with metrics.stage("db_export", rows=len(results_df)):
+            best_fit_df = pd.concat([best_ideal_df.assign(Dataset=dataset)[["Dataset"] + list(best_ideal_df.columns)]
+                                     for (dataset, _, _), best_ideal_df in zip(datasets, best_ideal_dfs)],
+                                    ignore_index=True) if datasets else pd.DataFrame()
+            best_fit_df.to_csv("ideal_vs_training_batch.csv", index=False)
+            if len(results_df):
+                export_batch_results(results_df, session)
+
+    elapsed = time.perf_counter() - start_time
+    logging.info(f"Fitted and evaluated {len(datasets)} datasets in {elapsed:.3f} s "
+                 f"({len(datasets) / elapsed:.1f} datasets/sec)")
+    metrics.finish()
+    return best_fit_df, results_df
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Fit and evaluate many training/test datasets in one pass.")
+    parser.add_argument("datasets", help="Directory with one subdirectory (train.csv, test.csv) per dataset")
+    parser.add_argument("--lookup", choices=["exact", "linear", "cubic"], default="exact",
+                        help="How test x values are resolved on the ideal x grid")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Largest accepted x distance to the closest ideal row in exact mode")
+    parser.add_argument("--ideal-schema", choices=["wide", "long"], default="wide",
+                        help="Read the ideal functions from the wide table or the long per-function table")
+    add_metrics_arguments(parser)
+    add_precision_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics_from_args(args)
+    configure_precision_from_args(args)
+    main(args.datasets, lookup=args.lookup, tolerance=args.tolerance, ideal_schema=args.ideal_schema)
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import logging
+import numpy as np
+import pandas as pd
+
+from ConfigandImport import Base, Parent, Trainingdata, Idealfunctions, Testdata
+from FindIdealFunctions import load_df, get_min_sse, create_results_df
+from EvaluateTestData import calculate_max_deviations, match_test_to_ideal
+
+# Stages in pipeline order; each one is timed separately
+STAGES = [
+    "importcsv",
+    "load_df",
+    "get_min_sse",
+    "calculate_max_deviations",
+    "match_test_to_ideal",
+    "plot_training_vs_ideal_bokeh",
+    "plot_ideal_functions_with_bands_bokeh",
+    "create_table3",
+]
+
+# Number of ideal function columns of the Idealfunctions table
+DB_IDEAL_FUNCTIONS = 50
+
+
+def generate_datasets(directory, row_scale=1, func_scale=1, base_rows=400, base_funcs=50, base_tests=100, seed=0):
+    """
+    Write synthetic train.csv, ideal.csv and test.csv files shaped like the assignment data.
+
+    The ideal functions are random combinations of sine, polynomial and constant terms on a uniform x grid.
+    The four training functions are noisy copies of four of them, and the test points lie on the grid near one
+    of those four.
+
+    Args:
+        directory (str): Directory the CSV files are written to.
+        row_scale (int): Multiplier for the number of x rows and test points.
+        func_scale (int): Multiplier for the number of ideal functions.
+        base_rows (int): Number of x rows at scale 1 (default is 400, like train.csv).
+        base_funcs (int): Number of ideal functions at scale 1 (default is 50, like ideal.csv).
+        base_tests (int): Number of test points at scale 1 (default is 100, like test.csv).
+        seed (int): Seed of the random generator.
+
+    Returns:
+        dict: Paths of the 'train', 'ideal' and 'test' files.
+    """
+    rng = np.random.default_rng(seed)
+    n_rows, n_funcs, n_tests = base_rows * row_scale, base_funcs * func_scale, base_tests * row_scale
+    x = np.round(np.linspace(-20.0, 20.0, n_rows), 6)
+
+    coefficients = rng.normal(size=(4, n_funcs))
+    ideal = (coefficients[0] * np.sin(x[:, None] * np.abs(coefficients[1])) + coefficients[2] * x[:, None]
+             + coefficients[3] * 10)
+    chosen = rng.choice(n_funcs, size=4, replace=False)
+    training = ideal[:, chosen] + rng.normal(scale=0.3, size=(n_rows, 4))
+    test_rows = rng.integers(0, n_rows, size=n_tests)
+    test_y = ideal[test_rows, rng.choice(chosen, size=n_tests)] + rng.normal(scale=0.5, size=n_tests)
+
+    paths = {name: os.path.join(directory, f"{name}.csv") for name in ["train", "ideal", "test"]}
+    pd.DataFrame(np.column_stack([x, training]), columns=["x"] + [f"y{i}" for i in range(1, 5)]) \
+        .to_csv(paths["train"], index=False)
+    pd.DataFrame(np.column_stack([x, ideal]), columns=["x"] + [f"y{i}" for i in range(1, n_funcs + 1)]) \
+        .to_csv(paths["ideal"], index=False)
+    pd.DataFrame({"x": x[test_rows], "y": test_y}).to_csv(paths["test"], index=False)
+    return paths
+
+
+def time_call(func, repeats):
+    """
+    Time a function call several times.
+
+    Args:
+        func (callable): Function without arguments.
+        repeats (int): Number of timed calls.
+
+    Returns:
+        tuple: (list of durations in seconds, result of the last call).
+    """
+    durations = []
+    result = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start_time)
+    return durations, result
+
+
+def benchmark_scale(directory, row_scale, func_scale, stages, repeats, base_rows=400, base_tests=100,
+                    plot_points=None):
+    """
+    Run the timed stages on one synthetic dataset.
+
+    The database stages (importcsv, load_df) are limited to the 50 ideal function columns of the Idealfunctions
+    table; the compute stages use all generated ideal functions from the CSV file.
+
+    Args:
+        directory (str): Working directory for the dataset, database and generated outputs.
+        row_scale (int): Multiplier for the number of x rows and test points.
+        func_scale (int): Multiplier for the number of ideal functions.
+        stages (list): Names of the stages to time, see STAGES.
+        repeats (int): Number of timed calls per stage.
+        base_rows (int): Number of x rows at scale 1.
+        base_tests (int): Number of test points at scale 1.
+        plot_points (int, optional): If given, the Bokeh plots are timed a second time in the downsampled WebGL
+            mode with about this many points per line.
+
+    Returns:
+        list: One result dictionary per timed stage.
+    """
+    paths = generate_datasets(directory, row_scale, func_scale, base_rows=base_rows, base_tests=base_tests)
+    engine, Session = Parent.setup_database(f"sqlite:///{os.path.join(directory, 'benchmark.db')}")
+    session = Session()
+    results = []
+    info = {"row_scale": row_scale, "func_scale": func_scale, "rows": base_rows * row_scale,
+            "ideal_functions": DB_IDEAL_FUNCTIONS * func_scale, "test_points": base_tests * row_scale}
+
+    def record(stage, func, **extra):
+        if stage not in stages:
+            return func()
+        durations, result = time_call(func, repeats)
+        results.append({**info, "stage": stage, "seconds": min(durations),
+                        "median_seconds": float(np.median(durations)), "repeats": durations, **extra})
+        logging.info(f"{stage} at rows x{row_scale}, functions x{func_scale}: {min(durations):.6f} s")
+        return result
+
+    def import_all():
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        for model, name in [(Trainingdata, "train"), (Idealfunctions, "ideal"), (Testdata, "test")]:
+            model.importcsv(paths[name], session, bulk=True)
+
+    record("importcsv", import_all, rows_per_call=base_rows * row_scale * 2 + base_tests * row_scale)
+    if "importcsv" not in stages:
+        import_all()
+
+    tables = record("load_df", lambda: [load_df(session, model) for model in [Trainingdata, Idealfunctions, Testdata]])
+    training_df, _, test_df = tables
+    ideal_df = pd.read_csv(paths["ideal"])
+    ideal_df.columns = ["x"] + [f"{name} (ideal func)" for name in ideal_df.columns[1:]]
+
+    min_sse = record("get_min_sse", lambda: get_min_sse(training_df, ideal_df))
+    best_ideal_df = create_results_df(min_sse)
+    training_funcs = best_ideal_df["Training Function"].tolist()
+    ideal_funcs = best_ideal_df["Ideal Function"].tolist()
+
+    max_devs = record("calculate_max_deviations",
+                      lambda: calculate_max_deviations(training_df, ideal_df, training_funcs, ideal_funcs))
+    results_df = record("match_test_to_ideal",
+                        lambda: match_test_to_ideal(test_df.copy(), ideal_df, max_devs, ideal_funcs, session))
+
+    plot_stages = [stage for stage in STAGES[5:] if stage in stages]
+    if plot_stages:
+        from Vizualisationsbokeh import plot_training_vs_ideal_bokeh, plot_ideal_functions_with_bands_bokeh, \
+            create_table3
+        os.makedirs("Visualisations", exist_ok=True)
+        within_df = results_df[results_df["within_threshold"]]
+        outside_df = results_df[~results_df["ID"].isin(within_df["ID"])].drop_duplicates(subset="ID")
+        for max_points in [None, plot_points] if plot_points else [None]:
+            plots = {
+                "plot_training_vs_ideal_bokeh": (
+                    lambda: plot_training_vs_ideal_bokeh(training_df, ideal_df, best_ideal_df, interactive=False,
+                                                         max_points=max_points),
+                    "Visualisations/Training_vs_Ideal_Functions.html"),
+                "plot_ideal_functions_with_bands_bokeh": (
+                    lambda: plot_ideal_functions_with_bands_bokeh(ideal_df, ideal_funcs, max_devs, within_df,
+                                                                  outside_df, interactive=False, max_points=max_points),
+                    "Ideal_Functions_vs_Test_Data.html"),
+                "create_table3": (lambda: create_table3(results_df, interactive=False), "table3_bokeh.html"),
+            }
+            for stage in plot_stages:
+                if max_points and stage == "create_table3":
+                    continue  # The table has no lines to downsample
+                plot, output = plots[stage]
+                record(stage, plot, plot_points=max_points)
+                results[-1]["output_bytes"] = os.path.getsize(output) if os.path.exists(output) else None
+
+    session.close()
+    engine.dispose()
+    return results
+
+
+def run_benchmarks(row_scales=(1, 10, 100), func_scales=(1, 10), stages=None, repeats=3, output=None,
+                   base_rows=400, base_tests=100, plot_points=None):
+    """
+    Benchmark the pipeline stages on synthetic datasets of several sizes and write the results as JSON.
+
+    Args:
+        row_scales (iterable): Multipliers for the number of x rows and test points.
+        func_scales (iterable): Multipliers for the number of ideal functions.
+        stages (list, optional): Names of the stages to time (default is all of STAGES).
+        repeats (int): Number of timed calls per stage; the fastest one is reported as 'seconds'.
+        output (str, optional): Path of the JSON report.
+        base_rows (int): Number of x rows at scale 1.
+        base_tests (int): Number of test points at scale 1.
+        plot_points (int, optional): Also time the downsampled WebGL plots with about this many points per line.
+
+    Returns:
+        dict: The report with 'metadata' and 'results'.
+    """
+    stages = list(stages or STAGES)
+    results = []
+    cwd = os.getcwd()
+    for row_scale in row_scales:
+        for func_scale in func_scales:
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)  # The pipeline writes its CSV and HTML outputs to the working directory
+                try:
+                    results += benchmark_scale(directory, row_scale, func_scale, stages, repeats,
+                                               base_rows=base_rows, base_tests=base_tests, plot_points=plot_points)
+                finally:
+                    os.chdir(cwd)
+
+    report = {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as handle:
+            json.dump(report, handle, indent=2)
+        logging.info(f"Benchmark results written to {output}")
+    return report
+
+
+def compare_reports(current, baseline, threshold=1.2):
+    """
+    Find stages that got slower compared to an earlier benchmark report.
+
+    Args:
+        current (dict): Report returned by run_benchmarks.
+        baseline (dict): Earlier report, e.g. from the previous release.
+        threshold (float): Slowdown ratio above which a stage counts as a regression (default is 1.2).
+
+    Returns:
+        list: (stage, row_scale, func_scale, plot_points, ratio) tuples of the regressions.
+    """
+    def key(result):
+        return result["stage"], result["row_scale"], result["func_scale"], result.get("plot_points")
+
+    baseline_seconds = {key(result): result["seconds"] for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = baseline_seconds.get(key(result))
+        if before:
+            ratio = result["seconds"] / before
+            if ratio > threshold:
+                regressions.append((*key(result), ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic datasets.")
+    parser.add_argument("--row-scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="Multipliers for the number of x rows and test points")
+    parser.add_argument("--func-scales", type=int, nargs="+", default=[1, 10],
+                        help="Multipliers for the number of ideal functions")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=None, help="Stages to time (default all)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed calls per stage")
+    parser.add_argument("--output", default="benchmark_results.json", help="Path of the JSON report")
+    parser.add_argument("--plot-points", type=int, default=None,
+                        help="Also time the downsampled WebGL plots with about this many points per line")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio reported as regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.row_scales, args.func_scales, args.stages, args.repeats, args.output,
+                            plot_points=args.plot_points)
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare_reports(report, json.load(handle), args.threshold)
+        for stage, row_scale, func_scale, plot_points, ratio in regressions:
+            mode = f" with {plot_points} plot points" if plot_points else ""
+            print(f"Regression: {stage}{mode} at rows x{row_scale}, functions x{func_scale} is {ratio:.2f}x slower")
+        sys.exit(1 if regressions else 0)
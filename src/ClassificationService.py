@@ -0,0 +1,467 @@
+import json
+import time
+import asyncio
+import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from FindIdealFunctions import (session_scope, load_df, ideal_columns, get_min_sse_cached, create_results_df,
+                                check_fit_precision)
+from ColumnarCache import CACHE_DIR
+from EvaluateTestData import XIndex, calculate_max_deviations_cached
+from ResultCache import ResultCache
+from Precision import precision, PRECISION_CHECK_CANDIDATES
+
+# HTTP status lines used by the service
+_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class Classifier:
+    """
+    Classifies test points against the selected ideal functions, which are held in memory as plain arrays.
+
+    Unlike compute_matches, no DataFrame is built per call, so small requests are answered in microseconds.
+
+    Only the few selected functions are held, so the values are float64 by default whatever the configured
+    precision: float32 would save little memory here and its threshold decisions could not be checked against
+    float64 per request.
+
+    Attributes:
+        funcs (list): Names of the selected ideal functions, one per column of values.
+        values (np.ndarray): Array of shape (n_rows, n_funcs) with the selected ideal function values.
+        max_deviation (np.ndarray): Deviation threshold of each selected ideal function.
+        x_index (XIndex): Index over the ideal x values.
+        best_ideal_df (pd.DataFrame or None): The fit result the classifier was built from, if known.
+    """
+
+    def __init__(self, ideal_functions_df, ideal_funcs, max_devs, lookup="exact", tolerance=0.0, best_ideal_df=None,
+                 dtype=None):
+        """
+        Args:
+            ideal_functions_df (pd.DataFrame): DataFrame containing ideal functions.
+            ideal_funcs (list): List of the selected ideal function names.
+            max_devs (dict): Dictionary containing the maximum deviations for each ideal function.
+            lookup (str): Lookup mode for test x values, see XIndex.resolve (default is 'exact').
+            tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+            best_ideal_df (pd.DataFrame, optional): The fit result, returned by the refit endpoint.
+            dtype (type, optional): Floating point type of the values and deviations (default is float64).
+        """
+        self.funcs = [func for func in ideal_funcs if f"{func} (ideal func)" in ideal_functions_df.columns]
+        self.dtype = np.float64 if dtype is None else dtype
+        self.values = ideal_functions_df[[f"{func} (ideal func)" for func in self.funcs]].to_numpy(dtype=self.dtype)
+        self.max_deviation = np.array([max_devs.get(func, float('inf')) for func in self.funcs], dtype=float)
+        self.x_index = XIndex(ideal_functions_df["x"].values)
+        self.lookup = lookup
+        self.tolerance = tolerance
+        self.best_ideal_df = best_ideal_df
+
+    @classmethod
+    def from_database(cls, session_factory=None, lookup="exact", tolerance=0.0, ideal_schema="wide", cache=None):
+        """
+        Load the training data and ideal functions, select the best ideal functions and build a classifier.
+
+        The selection runs in the configured precision and, in reduced precision, is checked against float64 like
+        FindIdealFunctions.main; the classifier itself is built from the selected functions in float64.
+
+        Args:
+            session_factory (sessionmaker, optional): Session factory to use instead of the default database.
+            lookup (str): Lookup mode for test x values, see XIndex.resolve (default is 'exact').
+            tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+            ideal_schema (str): Storage of the ideal functions, 'wide' or 'long' (see ConfigandImport.IDEAL_MODELS).
+            cache (ResultCache, optional): Cache of earlier fit and max deviation results.
+
+        Returns:
+            Classifier: The classifier.
+        """
+        from ConfigandImport import Trainingdata, IDEAL_MODELS
+        ideal_model = IDEAL_MODELS[ideal_schema]
+        cache = cache if cache is not None else ResultCache()
+        with session_scope(session_factory) as session:
+            training_data_df = load_df(session, Trainingdata, cache_dir=CACHE_DIR)
+            ideal_functions_df = load_df(session, ideal_model, cache_dir=CACHE_DIR)
+            top_k = PRECISION_CHECK_CANDIDATES if precision.checked else 1
+            min_sse = get_min_sse_cached(training_data_df, ideal_functions_df, cache, top_k)
+            if precision.checked:
+                check_fit_precision(session, ideal_model, min_sse)
+            best_ideal_df = create_results_df(min_sse)
+            training_funcs = best_ideal_df["Training Function"].tolist()
+            ideal_funcs = best_ideal_df["Ideal Function"].tolist()
+            if precision.reduced:
+                # Only the selected functions are kept, so they are read again in float64
+                training_data_df = load_df(session, Trainingdata, cache_dir=CACHE_DIR, dtype=np.float64)
+                ideal_functions_df = load_df(session, ideal_model, cache_dir=CACHE_DIR,
+                                             columns=ideal_columns(ideal_funcs), dtype=np.float64)
+        max_devs = calculate_max_deviations_cached(training_data_df, ideal_functions_df, training_funcs, ideal_funcs,
+                                                   cache, np.float64)
+        return cls(ideal_functions_df, ideal_funcs, max_devs, lookup, tolerance, best_ideal_df)
+
+    def classify(self, x, y):
+        """
+        Compute the deviation of each test point from each selected ideal function.
+
+        Args:
+            x (np.ndarray): x values of the test points.
+            y (np.ndarray): y values of the test points.
+
+        Returns:
+            tuple: (found, delta_y, within_threshold) where found marks the points resolved on the ideal x grid and
+            delta_y and within_threshold have shape (n_points, n_funcs). Unresolved rows are NaN and False.
+        """
+        ideal_y, found = self.x_index.resolve(x, self.values, mode=self.lookup, tolerance=self.tolerance)
+        delta_y = np.abs(np.asarray(y, dtype=self.dtype)[:, None] - ideal_y)
+        return found, delta_y, delta_y <= self.max_deviation
+
+
+def as_points(points):
+    """
+    Convert the points of a classify request to an array of (x, y) pairs.
+
+    Args:
+        points (list): (x, y) pairs.
+
+    Returns:
+        np.ndarray: Array of shape (n_points, 2).
+
+    Raises:
+        ValueError: If the points are not (x, y) pairs, e.g. a flat list of numbers.
+    """
+    points = np.asarray(points, dtype=float)
+    if points.size == 0:
+        return points.reshape(0, 2)
+    if points.ndim != 2 or points.shape[1] != 2:
+        raise ValueError(f"Expected (x, y) pairs, got an array of shape {points.shape}")
+    return points
+
+
+class ClassificationService:
+    """
+    Long-running asyncio server answering classify and refit requests over HTTP, on TCP or a Unix socket.
+
+    Concurrent classify requests are queued and classified together: while one batch runs in the executor, new
+    requests accumulate and are taken as the next batch. Refits build the new classifier in a second
+    single-threaded executor, so classify requests keep being answered by the old classifier until it is swapped
+    in; a batch never sees a half-built classifier.
+
+    Endpoints (JSON bodies):
+        POST /classify  {"points": [[x, y], ...]} -> {"results": [{"x", "y", "found", "ideal_funcs", "delta_y"}]}
+        POST /refit     {} -> {"best_fit": [{"Training Function", "Ideal Function", "SSE"}, ...]}
+        GET  /health    -> {"status", "ideal_funcs", "requests", "batches"}
+
+    Attributes:
+        classifier (Classifier): The classifier answering requests, replaced by refit().
+        requests (int): Number of classify requests answered.
+        batches (int): Number of batches the requests were classified in.
+        latencies (list): Seconds from receiving to answering each classify request.
+    """
+
+    def __init__(self, classifier_factory, max_batch_points=100000):
+        """
+        Args:
+            classifier_factory (callable): Returns a new Classifier; called on start and on every refit.
+            max_batch_points (int): Largest number of test points classified in one batch (default is 100000).
+        """
+        self.classifier_factory = classifier_factory
+        self.max_batch_points = max_batch_points
+        self.classifier = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="classify")
+        self.refit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="refit")
+        self.queue = None
+        self.server = None
+        self.batch_task = None
+        self.connections = set()
+        self.requests = 0
+        self.batches = 0
+        self.latencies = []
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        """
+        Build the classifier and start listening.
+
+        Args:
+            host (str): Host to listen on (default is '127.0.0.1').
+            port (int): TCP port to listen on; 0 picks a free port (default is 8765).
+            unix_path (str, optional): Listen on this Unix socket instead of TCP.
+
+        Returns:
+            asyncio.Server: The listening server.
+        """
+        loop = asyncio.get_running_loop()
+        self.classifier = await loop.run_in_executor(self.refit_executor, self.classifier_factory)
+        self.queue = asyncio.Queue()
+        self.batch_task = asyncio.create_task(self._batch_loop())
+        if unix_path:
+            self.server = await asyncio.start_unix_server(self._handle_connection, path=unix_path)
+        else:
+            self.server = await asyncio.start_server(self._handle_connection, host, port)
+        logging.info(f"Classification service listening on {unix_path or self.server.sockets[0].getsockname()}")
+        return self.server
+
+    async def close(self):
+        """Stop listening, close open connections, finish the batch loop and log a latency summary."""
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.connections):
+                writer.close()
+            await self.server.wait_closed()
+        if self.batch_task is not None:
+            self.batch_task.cancel()
+            try:
+                await self.batch_task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown()
+        self.refit_executor.shutdown()
+        if self.latencies:
+            logging.info(f"Answered {self.requests} classify requests in {self.batches} batches "
+                         f"(mean latency {np.mean(self.latencies) * 1000:.3f} ms, "
+                         f"p99 latency {np.percentile(self.latencies, 99) * 1000:.3f} ms)")
+
+    async def classify(self, points):
+        """
+        Classify test points, batched together with concurrent requests.
+
+        Args:
+            points (list): (x, y) pairs.
+
+        Returns:
+            tuple: (funcs, found, delta_y, within_threshold) with the ideal function names of the classifier that
+            answered and its results for the points, see Classifier.classify.
+
+        Raises:
+            ValueError: If the points are not (x, y) pairs.
+        """
+        points = as_points(points)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((points, future))
+        return await future
+
+    async def refit(self):
+        """
+        Reload the data, select the best ideal functions again and swap in the new classifier.
+
+        Classify requests arriving meanwhile are answered by the previous classifier.
+
+        Returns:
+            Classifier: The new classifier.
+        """
+        classifier = await asyncio.get_running_loop().run_in_executor(self.refit_executor, self.classifier_factory)
+        self.classifier = classifier
+        logging.info(f"Refitted classifier with ideal functions {', '.join(classifier.funcs)}")
+        return classifier
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            while size < self.max_batch_points and not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+                size += len(pending[-1][0])
+
+            points = np.concatenate([item[0] for item in pending]) if len(pending) > 1 else pending[0][0]
+            classifier = self.classifier
+            try:
+                found, delta_y, within = await loop.run_in_executor(self.executor, classifier.classify,
+                                                                    points[:, 0], points[:, 1])
+            except Exception as error:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.batches += 1
+
+            start = 0
+            for item, future in pending:
+                stop = start + len(item)
+                if not future.done():
+                    future.set_result((classifier.funcs, found[start:stop], delta_y[start:stop], within[start:stop]))
+                start = stop
+
+    @staticmethod
+    def _classify_response(points, funcs, found, delta_y, within):
+        results = []
+        for (x, y), point_found, deltas, matches in zip(points.tolist(), found.tolist(), delta_y.tolist(),
+                                                        within.tolist()):
+            results.append({
+                "x": x, "y": y, "found": point_found,
+                "ideal_funcs": [func for func, match in zip(funcs, matches) if match],
+                "delta_y": dict(zip(funcs, deltas)) if point_found else None,
+            })
+        return {"results": results}
+
+    async def _dispatch(self, method, path, body):
+        """Answer one request; returns (status, response object)."""
+        if path == "/health":
+            return 200, {"status": "ok", "ideal_funcs": self.classifier.funcs, "requests": self.requests,
+                         "batches": self.batches}
+        if path not in ("/classify", "/refit"):
+            return 404, {"error": f"Unknown path '{path}'"}
+        if method != "POST":
+            return 405, {"error": f"{path} expects POST"}
+        if path == "/refit":
+            classifier = await self.refit()
+            best_fit = classifier.best_ideal_df.to_dict("records") if classifier.best_ideal_df is not None else None
+            return 200, {"best_fit": best_fit}
+
+        start_time = time.perf_counter()
+        try:
+            points = as_points(json.loads(body)["points"])
+            funcs, found, delta_y, within = await self.classify(points)
+        except (ValueError, KeyError, TypeError) as error:
+            return 400, {"error": f"Expected a JSON body with 'points': [[x, y], ...] ({error})"}
+        response = self._classify_response(points, funcs, found, delta_y, within)
+        self.requests += 1
+        self.latencies.append(time.perf_counter() - start_time)
+        return 200, response
+
+    async def _handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection until the client closes it."""
+        self.connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path = request_line.decode("latin-1").split(" ")[:2]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    status, response = await self._dispatch(method, path, body)
+                except Exception as error:
+                    logging.exception(f"Error while answering {method} {path}")
+                    status, response = 500, {"error": str(error)}
+                payload = json.dumps(response).encode()
+                writer.write(f"HTTP/1.1 {status} {_STATUS[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Client went away or sent a malformed request line
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+
+class ServiceClient:
+    """
+    Minimal asyncio client of the classification service, keeping one HTTP connection open for many requests.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, unix_path=None):
+        """
+        Args:
+            host (str): Host of the service (default is '127.0.0.1').
+            port (int): TCP port of the service (default is 8765).
+            unix_path (str, optional): Connect to this Unix socket instead of TCP.
+        """
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        """
+        Send one request and wait for the response.
+
+        Args:
+            method (str): 'GET' or 'POST'.
+            path (str): Endpoint path, e.g. '/classify'.
+            payload (object, optional): JSON body.
+
+        Returns:
+            tuple: (status, response object).
+        """
+        if self.writer is None:
+            if self.unix_path:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.unix_path)
+            else:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split(b" ")[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    async def classify(self, points):
+        """Classify (x, y) pairs; returns the per-point results of the /classify endpoint."""
+        status, response = await self.request("POST", "/classify", {"points": points})
+        if status != 200:
+            raise ValueError(response.get("error"))
+        return response["results"]
+
+    async def refit(self):
+        """Trigger a refit; returns the new best fit mapping."""
+        return (await self.request("POST", "/refit", {}))[1]["best_fit"]
+
+    async def close(self):
+        """Close the connection."""
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.reader = self.writer = None
+
+
+async def serve(host="127.0.0.1", port=8765, unix_path=None, lookup="exact", tolerance=0.0, ideal_schema="wide",
+                max_batch_points=100000):
+    """
+    Run the classification service on the default database until cancelled.
+
+    Args:
+        host (str): Host to listen on (default is '127.0.0.1').
+        port (int): TCP port to listen on (default is 8765).
+        unix_path (str, optional): Listen on this Unix socket instead of TCP.
+        lookup (str): Lookup mode for test x values, see XIndex.resolve (default is 'exact').
+        tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+        ideal_schema (str): Storage of the ideal functions, 'wide' or 'long' (see ConfigandImport.IDEAL_MODELS).
+        max_batch_points (int): Largest number of test points classified in one batch (default is 100000).
+    """
+    cache = ResultCache()
+    service = ClassificationService(
+        lambda: Classifier.from_database(lookup=lookup, tolerance=tolerance, ideal_schema=ideal_schema, cache=cache),
+        max_batch_points)
+    server = await service.start(host, port, unix_path)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Serve classify and refit requests over a local HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    parser.add_argument("--unix-socket", default=None, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--lookup", choices=["exact", "linear", "cubic"], default="exact",
+                        help="How test x values are resolved on the ideal x grid")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Largest accepted x distance to the closest ideal row in exact mode")
+    parser.add_argument("--ideal-schema", choices=["wide", "long"], default="wide",
+                        help="Read the ideal functions from the wide table or the long per-function table")
+    parser.add_argument("--max-batch-points", type=int, default=100000,
+                        help="Largest number of test points classified in one batch")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix_socket, args.lookup, args.tolerance, args.ideal_schema,
+                          args.max_batch_points))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,262 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, literal_column
+
+# Default location of the cache, relative to the working directory like the database itself
+CACHE_DIR = ".columnar_cache"
+
+# Number of rows hashed at a time by table_fingerprint
+FINGERPRINT_CHUNK_ROWS = 50000
+
+
+def database_signature(session):
+    """
+    Describe the state of the SQLite database file behind a session by modification time and size.
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+
+    Returns:
+        list: [path, mtime_ns, size] entries for the database file and its write-ahead log, or None if the
+        database is not a file (e.g. an in-memory database).
+    """
+    path = session.bind.url.database
+    if not path or path == ":memory:":
+        return None
+    return [[file, os.stat(file).st_mtime_ns, os.stat(file).st_size]
+            for file in [path, path + "-wal"] if os.path.exists(file)]
+
+
+def file_signature(files, use_hash=False):
+    """
+    Describe the state of source files (e.g. the imported CSV files) by modification time and size or content hash.
+
+    Args:
+        files (list): Paths of the source files.
+        use_hash (bool): If True, a SHA-256 of the content is used instead of modification time and size.
+
+    Returns:
+        list: One [path, ...] entry per file.
+    """
+    signature = []
+    for file in files:
+        if use_hash:
+            digest = hashlib.sha256()
+            with open(file, "rb") as handle:
+                for block in iter(lambda: handle.read(1 << 20), b""):
+                    digest.update(block)
+            signature.append([file, digest.hexdigest()])
+        else:
+            signature.append([file, os.stat(file).st_mtime_ns, os.stat(file).st_size])
+    return signature
+
+
+def table_fingerprint(session, model):
+    """
+    Compute a SHA-256 of the content of a table.
+
+    The rows are streamed in rowid order in chunks and hashed as float64 bytes, so any change of a value, even by
+    one ulp, or of the row order changes the fingerprint. Nothing is written to disk.
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+        model (Base): SQLAlchemy model class representing the table.
+
+    Returns:
+        str: The hex digest.
+    """
+    table = model.__table__
+    digest = hashlib.sha256(json.dumps([column.name for column in table.columns]).encode())
+    result = session.execute(select(*table.columns).order_by(literal_column("rowid")))
+    for rows in result.partitions(FINGERPRINT_CHUNK_ROWS):
+        try:
+            digest.update(np.array(rows, dtype=float).tobytes())
+        except (TypeError, ValueError):  # Non-numeric columns
+            digest.update(repr(rows).encode())
+    return digest.hexdigest()
+
+
+def projection_statement(model, columns=None, x_range=None):
+    """
+    Build a SELECT of some columns of a table, optionally restricted to rows with x in a range.
+
+    Args:
+        model (Base): SQLAlchemy model class representing the table.
+        columns (list, optional): Database column names to select, e.g. ['x', 'y36 (ideal func)'] (default is all).
+        x_range (tuple, optional): (low, high) bounds of the 'x' column, both inclusive; None leaves a side open.
+
+    Returns:
+        Select: The statement.
+
+    Raises:
+        KeyError: If a column does not exist in the table.
+    """
+    table = model.__table__
+    statement = select(*_project(table.columns, columns, lambda column: column.name))
+    low, high = x_range or (None, None)
+    if low is not None:
+        statement = statement.where(table.c.x >= low)
+    if high is not None:
+        statement = statement.where(table.c.x <= high)
+    return statement
+
+
+def _project(items, columns, name_of):
+    """Keep the items named in columns, in table order; every requested name must exist."""
+    if columns is None:
+        return list(items)
+    wanted = set(columns)
+    selected = [item for item in items if name_of(item) in wanted]
+    missing = wanted - {name_of(item) for item in selected}
+    if missing:
+        raise KeyError(sorted(missing)[0])
+    return selected
+
+
+def x_range_rows(x, x_range, x_sorted):
+    """Rows with x inside x_range: a slice (no copy) if x is sorted, a boolean mask otherwise."""
+    low, high = x_range
+    if x_sorted:
+        start = 0 if low is None else np.searchsorted(x, low, side="left")
+        stop = len(x) if high is None else np.searchsorted(x, high, side="right")
+        return slice(start, stop)
+    mask = np.ones(len(x), dtype=bool)
+    if low is not None:
+        mask &= x >= low
+    if high is not None:
+        mask &= x <= high
+    return mask
+
+
+def _read_manifest(table_dir):
+    """Return the manifest of a cached table, or None if there is no complete cache entry."""
+    try:
+        with open(os.path.join(table_dir, "manifest.json")) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(table_dir, manifest):
+    """Atomically replace the manifest of a cached table."""
+    path = os.path.join(table_dir, "manifest.json")
+    with open(path + ".tmp", "w") as handle:
+        json.dump(manifest, handle)
+    os.replace(path + ".tmp", path)
+
+
+def _open_columns(table_dir, manifest, columns=None, x_range=None):
+    """Memory-map the requested column files listed in a manifest and select the rows in x_range."""
+    selected = _project(manifest["columns"], columns, lambda column: column["name"])
+    arrays = {column["name"]: np.load(os.path.join(table_dir, column["file"]), mmap_mode="r")
+              for column in selected}
+    if x_range is None:
+        return arrays
+    x_file = next(column["file"] for column in manifest["columns"] if column["name"] == "x")
+    rows = x_range_rows(np.load(os.path.join(table_dir, x_file), mmap_mode="r"), x_range,
+                          manifest.get("x_sorted", False))
+    return {name: array[rows] for name, array in arrays.items()}
+
+
+def _write_columns(table_dir, df, signature, fingerprint):
+    """Store each column of a DataFrame as its own .npy file and write the manifest last."""
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.makedirs(table_dir)
+    columns = []
+    for i, name in enumerate(df.columns):
+        file = f"col_{i:05d}.npy"
+        np.save(os.path.join(table_dir, file), df[name].to_numpy())
+        columns.append({"name": name, "file": file, "dtype": str(df[name].dtype)})
+    # Sorted x values let x-range reads slice the memory maps instead of copying the selected rows
+    x_sorted = "x" in df.columns and bool(np.all(np.diff(df["x"].to_numpy()) >= 0))
+    # The manifest marks the entry as complete, so it is only written once all columns exist
+    _write_manifest(table_dir, {"signature": signature, "fingerprint": fingerprint, "columns": columns,
+                                "x_sorted": x_sorted})
+
+
+def load_cached_arrays(session, model, cache_dir=CACHE_DIR, sources=(), use_hash=False, columns=None, x_range=None):
+    """
+    Load a table as a dictionary of read-only, memory-mapped NumPy column arrays.
+
+    The cache entry is reused as long as the database file and the optional source files are unchanged. If the
+    database file changed (for example because another table was written), a content hash of the table decides
+    whether the entry is still valid, so only real changes to the table trigger a rewrite of the cache files.
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+        model (Base): SQLAlchemy model class representing the table to load.
+        cache_dir (str): Directory holding the cache (default is CACHE_DIR).
+        sources (list): Additional files the table depends on, e.g. the CSV file it was imported from.
+        use_hash (bool): If True, the source files are compared by content hash instead of mtime and size.
+        columns (list, optional): Database column names to return (default is all); only their files are mapped.
+        x_range (tuple, optional): (low, high) inclusive bounds of the 'x' column; rows outside are dropped.
+
+    Returns:
+        dict: Column name to array, in table column order. The arrays are memory maps of the cache files, or
+        in-memory arrays if the table cannot be cached (in-memory database or non-numeric columns).
+
+    Raises:
+        KeyError: If a requested column does not exist in the table.
+    """
+    database = database_signature(session)
+    if database is None:
+        df = pd.read_sql(projection_statement(model, columns, x_range), session.bind)
+        return {name: df[name].to_numpy() for name in df.columns}
+
+    signature = {"database": database, "sources": file_signature(sources, use_hash)}
+    table_dir = os.path.join(cache_dir, model.__tablename__)
+    manifest = _read_manifest(table_dir)
+
+    if manifest is not None and manifest["signature"] == signature:
+        return _open_columns(table_dir, manifest, columns, x_range)
+
+    fingerprint = table_fingerprint(session, model)
+    if manifest is not None and manifest["signature"]["sources"] == signature["sources"] \
+            and manifest["fingerprint"] == fingerprint:
+        # The database file changed but this table did not: refresh the signature and keep the data
+        manifest["signature"] = signature
+        _write_manifest(table_dir, manifest)
+        return _open_columns(table_dir, manifest, columns, x_range)
+
+    logging.info(f"Refreshing columnar cache for {model.__tablename__}")
+    df = pd.read_sql(session.query(model).statement, session.bind)
+    if any(dtype == object for dtype in df.dtypes):
+        df = pd.read_sql(projection_statement(model, columns, x_range), session.bind)
+        return {name: df[name].to_numpy() for name in df.columns}
+    _write_columns(table_dir, df, signature, fingerprint)
+    return _open_columns(table_dir, _read_manifest(table_dir), columns, x_range)
+
+
+def load_cached_df(session, model, cache_dir=CACHE_DIR, sources=(), use_hash=False, columns=None, x_range=None):
+    """
+    Load a table through the columnar cache as a DataFrame that wraps the memory-mapped columns without copying.
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+        model (Base): SQLAlchemy model class representing the table to load.
+        cache_dir (str): Directory holding the cache (default is CACHE_DIR).
+        sources (list): Additional files the table depends on, e.g. the CSV file it was imported from.
+        use_hash (bool): If True, the source files are compared by content hash instead of mtime and size.
+        columns (list, optional): Database column names to return (default is all).
+        x_range (tuple, optional): (low, high) inclusive bounds of the 'x' column; rows outside are dropped.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the data from the specified table.
+    """
+    arrays = load_cached_arrays(session, model, cache_dir, sources, use_hash, columns, x_range)
+    return pd.DataFrame(arrays, copy=False)
+
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """
+    Remove all cached tables.
+
+    Args:
+        cache_dir (str): Directory holding the cache (default is CACHE_DIR).
+    """
+    shutil.rmtree(cache_dir, ignore_errors=True)
@@ -6,10 +6,9 @@ from bokeh.plotting import figure, show, output_file
 from bokeh.palettes import Turbo256
 from bokeh.models import ColumnDataSource, Legend
 from FindIdealFunctions import load_df, session_scope
-from ConfigandImport import Idealfunctions, Testdata, Parent
-
-# Setup Database and Session Manager
-engine, Session = Parent.setup_database()
+from ConfigandImport import Idealfunctions, Testdata
+from ColumnarCache import CACHE_DIR
+from Vizualisationsbokeh import downsampled_source
 
 # Seaborn Plotting Function
 def plotallidealfunctions_seaborn(idealfunctions_df, test_df):
@@ -45,15 +44,16 @@ def plotallidealfunctions_seaborn(idealfunctions_df, test_df):
     plt.show()
 
 # Bokeh Plotting Function
-output_file("bokeh_plot_with_legend.html")
-
-def plotallidealfunctions_bokeh(idealfunctions_df, test_df):
+def plotallidealfunctions_bokeh(idealfunctions_df, test_df, max_points=None):
     '''This function will be used to plot the data using Bokeh
     Input Args:
     idealfunctions_df: data frame containing data points of ideal functions
-    test_df: data frame containing test data points'''
+    test_df: data frame containing test data points
+    max_points: if given, all lines share one source downsampled to about this many points and WebGL is used'''
+    output_file("bokeh_plot_with_legend.html")
     p = figure(title="All Ideal Functions - Bokeh", x_axis_label='X', y_axis_label='Y',
-               width=1200, height=900, tools="pan,wheel_zoom,box_zoom,reset,save")
+               width=1200, height=900, tools="pan,wheel_zoom,box_zoom,reset,save",
+               output_backend="webgl" if max_points else "canvas")
 
     # Set y-axis range
     p.y_range.start = -40
@@ -66,15 +66,20 @@ def plotallidealfunctions_bokeh(idealfunctions_df, test_df):
     # Plot ideal functions
     ideal_func_columns = [col for col in idealfunctions_df.columns if col != "x"]
     legend_items = []
+    if max_points:
+        shared_source = downsampled_source(idealfunctions_df, ideal_func_columns, max_points)
 
     for i, col in enumerate(ideal_func_columns):
         #print(f"Plotting {col}...")
 
         # Create a data source for Bokeh
-        source = ColumnDataSource(data={'x': idealfunctions_df['x'], 'y': idealfunctions_df[col]})
+        if max_points:
+            source, y = shared_source, col
+        else:
+            source, y = ColumnDataSource(data={'x': idealfunctions_df['x'], 'y': idealfunctions_df[col]}), 'y'
 
         # Plot each ideal function with legend_label
-        line = p.line('x', 'y', source=source, legend_label=f'Ideal {col}', color=palette[i], line_dash="dashed", line_width=0.5)
+        line = p.line('x', y, source=source, legend_label=f'Ideal {col}', color=palette[i], line_dash="dashed", line_width=0.5)
         legend_items.append((f'Ideal {col}', [line]))
 
     # Plot test data
@@ -103,16 +108,16 @@ def plotallidealfunctions_bokeh(idealfunctions_df, test_df):
     show(p)  # Show the plot with the legend
 
 
-def main():
+def main(max_points=None):
     """Connect to DB to provide input data for the plots"""
     with session_scope() as session:  # Corrected session_scope usage
         # Load data from the database
-        idealfunctions_df = load_df(session, Idealfunctions)
-        test_df = load_df(session, Testdata)
+        idealfunctions_df = load_df(session, Idealfunctions, cache_dir=CACHE_DIR)
+        test_df = load_df(session, Testdata, cache_dir=CACHE_DIR)
         
         # Measure time for Bokeh plot
         start_time = time.perf_counter()
-        plotallidealfunctions_bokeh(idealfunctions_df, test_df)
+        plotallidealfunctions_bokeh(idealfunctions_df, test_df, max_points)
         print(f"Bokeh plot execution time: {time.perf_counter()- start_time:.6f} seconds")
 
         # Measure time for Seaborn plot
@@ -122,4 +127,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare Bokeh and Seaborn plots of all ideal functions.")
+    parser.add_argument("--plot-points", type=int, default=None,
+                        help="Downsample the Bokeh lines to about this many points and draw them with WebGL")
+    main(parser.parse_args().plot_points)
@@ -1,13 +1,7 @@
 import pandas as pd
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import time
-from ConfigandImport import Idealfunctions
-
-#Set-up DB Session
-engine = create_engine("sqlite:///DataDB_new.db")
-Session = sessionmaker(bind=engine)
-session = Session()
+from ConfigandImport import Idealfunctions, create_db_engine
 
 # Using pandas read_sql with custom SQL query
 def load_data_pandas(session, table_name):
@@ -42,4 +36,9 @@ def compare_loading_times(session, table_name, model):
         print("SQLAlchemy was faster.")
 
 # Execute function
-compare_loading_times(session, 'idealfunctions', Idealfunctions)
+if __name__ == "__main__":
+    #Set-up DB Session
+    engine = create_db_engine("sqlite:///DataDB_new.db")
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    compare_loading_times(session, 'idealfunctions', Idealfunctions)
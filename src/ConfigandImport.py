@@ -1,12 +1,69 @@
-from sqlalchemy import create_engine, Column, Integer, Float
+from sqlalchemy import create_engine, event, make_url, Column, Integer, Float, LargeBinary, insert, inspect, select, \
+    delete
 from sqlalchemy.orm import declarative_base, sessionmaker
+import numpy as np
 import pandas as pd
+import threading
+import time
 
 # Initialize base class for SQLAlchemy models
 Base = declarative_base()  # Base class for all models
-engine = create_engine("sqlite:///DataDB_new.db")  # Create the SQLite database
-Session = sessionmaker(bind=engine)  # Session factory bound to the engine
-session = Session()  # Create a new session
+
+# Connection settings applied to every SQLite connection. WAL lets readers continue while the evaluation writes,
+# busy_timeout makes a second writer wait instead of failing, and the cache and memory map keep hot pages in memory.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # Milliseconds
+    "cache_size": -65536,  # Negative values are KiB, i.e. 64 MiB
+    "mmap_size": 268435456,  # 256 MiB
+    "temp_store": "MEMORY",
+}
+
+# Engines shared by all modules of the process, keyed by connection string and pragmas
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def create_db_engine(db_path="sqlite:///DataDB_new.db", pragmas=None, shared=True):
+    """
+    Creates a pooled engine whose SQLite connections are configured with the given pragmas.
+
+    File databases are shared: every call with the same connection string and pragmas returns the same engine, so
+    the modules of one process reuse one connection pool. In-memory databases always get a new engine, since each
+    of them is a separate database.
+
+    Args:
+        db_path (str): The database connection string (default is 'sqlite:///DataDB_new.db').
+        pragmas (dict, optional): SQLite pragmas to apply to each connection (default is SQLITE_PRAGMAS).
+        shared (bool): Whether to reuse an existing engine for the same database (default is True).
+
+    Returns:
+        Engine: The SQLAlchemy engine.
+    """
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    key = (db_path, tuple(sorted(pragmas.items())))
+    url = make_url(db_path)
+    in_memory = url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+    shared = shared and not in_memory
+    with _engines_lock:
+        if shared and key in _engines:
+            return _engines[key]
+
+        engine = create_engine(db_path)
+        if engine.dialect.name == "sqlite" and pragmas:
+            @event.listens_for(engine, "connect")
+            def apply_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for name, value in pragmas.items():
+                    if name == "journal_mode" and in_memory:
+                        continue  # In-memory databases have no journal file
+                    cursor.execute(f"PRAGMA {name} = {value}")
+                cursor.close()
+
+        if shared:
+            _engines[key] = engine
+        return engine
 
 
 class Parent(Base):
@@ -19,13 +76,16 @@ class Parent(Base):
     __abstract__ = True  # Indicates this is an abstract class, not for table creation.
 
     @classmethod
-    def importcsv(cls, file, session):
+    def importcsv(cls, file, session, bulk=False, chunksize=50000):
         """
         Imports data from a CSV file and inserts it into the database table represented by the calling class.
 
         Args:
             file (str): Path to the CSV file to be imported.
             session (Session): SQLAlchemy session to be used for database operations.
+            bulk (bool): If True, the CSV is read in chunks and each chunk is inserted with a single
+                executemany instead of building one ORM object per row (default is False).
+            chunksize (int): Number of rows read and inserted per batch in bulk mode (default is 50000).
 
         Raises:
             EmptyDataError: If the CSV file is empty.
@@ -34,35 +94,79 @@ class Parent(Base):
             Exception: For all other exceptions, the transaction is rolled back.
         """
         try:
-            dataframe = pd.read_csv(file)
-            for _, row in dataframe.iterrows():
-                entry = cls(**row.to_dict())  # Convert each row into a dictionary and pass it to the class constructor
-                session.add(entry)
+            start_time = time.perf_counter()
+            if bulk:
+                row_count = cls._bulkinsert(file, session, chunksize)
+            else:
+                dataframe = pd.read_csv(file)
+                for _, row in dataframe.iterrows():
+                    entry = cls(**row.to_dict())  # Convert each row into a dictionary and pass it to the class constructor
+                    session.add(entry)
+                row_count = len(dataframe)
             session.commit()  # Commit the session after adding all entries
-            print(f"{file} successfully inserted into {cls.__tablename__}")
+            elapsed = time.perf_counter() - start_time
+            rate = row_count / elapsed if elapsed > 0 else float("inf")
+            print(f"{file} successfully inserted into {cls.__tablename__} ({row_count} rows, {rate:.0f} rows/sec)")
         except pd.errors.EmptyDataError:
             print(f"The file {file} is empty.")
         except pd.errors.ParserError:
             print(f"The file {file} could not be parsed.")
         except KeyError as ke:
+            session.rollback()  # Chunks inserted before the missing column was detected must not be kept
             print(f"Expected column {ke} not found in {file}.")
         except Exception as e:
             session.rollback()  # Rollback the session in case of an error
             print(f"Error importing {file}: {str(e)}")
 
     @classmethod
-    def setup_database(cls, db_path="sqlite:///DataDB_new.db"):
+    def _bulkinsert(cls, file, session, chunksize):
+        """
+        Streams a CSV file into the table in chunks using executemany inserts.
+
+        Only one chunk of the file is held in memory at a time. The transaction is left open so the
+        caller decides whether to commit or roll back.
+
+        Args:
+            file (str): Path to the CSV file to be imported.
+            session (Session): SQLAlchemy session to be used for database operations.
+            chunksize (int): Number of rows read and inserted per batch.
+
+        Returns:
+            int: Number of rows inserted.
+        """
+        autoincrement_column = cls.__table__.autoincrement_column
+        # CSV headers use the mapped attribute names (e.g. 'y1'), not the database column names
+        attributes = [attr.key for attr in inspect(cls).column_attrs
+                      if attr.columns[0] is not autoincrement_column]
+        statement = insert(cls)
+        row_count = 0
+        for chunk in pd.read_csv(file, chunksize=chunksize):
+            missing = [attr for attr in attributes if attr not in chunk.columns]
+            if missing:
+                raise KeyError(missing[0])
+            records = chunk[attributes].to_dict("records")
+            session.execute(statement, records)
+            row_count += len(records)
+        return row_count
+
+    @classmethod
+    def setup_database(cls, db_path="sqlite:///DataDB_new.db", pragmas=None):
         """
         Sets up the database connection and returns the engine and session factory.
 
+        The engine comes from create_db_engine, so it is shared with other modules using the same database. Indexes
+        missing in existing tables, e.g. of databases created by older versions, are added.
+
         Args:
             db_path (str): The database connection string (default is 'sqlite:///DataDB_new.db').
+            pragmas (dict, optional): SQLite pragmas to apply to each connection (default is SQLITE_PRAGMAS).
 
         Returns:
             tuple: A tuple containing the engine and session factory for the database.
         """
         print("Setting up database connection...")
-        engine = create_engine(db_path)
+        engine = create_db_engine(db_path, pragmas)
+        ensure_indexes(engine)
         Session = sessionmaker(bind=engine)  # Create a new session factory bound to the engine
         print("Database connection established.")
         return engine, Session
@@ -105,6 +209,163 @@ for i in range(1, 51):
     setattr(Idealfunctions, f"y{i}", Column(Float, name=f"y{i} (ideal func)"))
 
 
+# Define Idealfunctionarrays table
+class Idealfunctionarrays(Parent):
+    """
+    Represents the 'idealfunctionarrays' table, a long storage of the ideal functions for libraries with more
+    functions than SQLite allows columns per table.
+
+    Each row holds one function as a little-endian float64 array: function_id 0 holds the shared x values and
+    function_id N the values of ideal function yN.
+
+    Attributes:
+        function_id (int): 0 for x, N for ideal function yN (primary key, indexed).
+        values (bytes): The values as a float64 array.
+    """
+    __tablename__ = "idealfunctionarrays"
+    function_id = Column(Integer, primary_key=True, autoincrement=False)
+    values = Column(LargeBinary, nullable=False)
+
+    value_dtype = np.dtype("<f8")
+
+    @classmethod
+    def importcsv(cls, file, session, bulk=True, chunksize=1000):
+        """
+        Imports a wide ideal functions CSV file (x, y1, y2, ...) with one row per function.
+
+        Args:
+            file (str): Path to the CSV file to be imported.
+            session (Session): SQLAlchemy session to be used for database operations.
+            bulk (bool): Ignored; the functions are always inserted in batches.
+            chunksize (int): Number of functions inserted per batch (default is 1000).
+        """
+        super().importcsv(file, session, bulk=True, chunksize=chunksize)
+
+    @classmethod
+    def _bulkinsert(cls, file, session, chunksize):
+        """
+        Converts a wide ideal functions CSV file into function rows and inserts them in batches.
+
+        Args:
+            file (str): Path to the CSV file to be imported.
+            session (Session): SQLAlchemy session to be used for database operations.
+            chunksize (int): Number of functions inserted per batch.
+
+        Returns:
+            int: Number of rows inserted, including the x row.
+        """
+        return cls.insert_df(pd.read_csv(file), session, chunksize)
+
+    @classmethod
+    def insert_df(cls, dataframe, session, chunksize=1000, include_x=True):
+        """
+        Inserts the functions of a wide DataFrame with an 'x' column and 'yN' or 'yN (ideal func)' columns.
+
+        Args:
+            dataframe (pd.DataFrame): The ideal functions in wide layout.
+            session (Session): SQLAlchemy session to be used for database operations.
+            chunksize (int): Number of functions inserted per batch (default is 1000).
+            include_x (bool): Whether to insert the x row; False adds functions on the x values already stored.
+
+        Returns:
+            int: Number of rows inserted, including the x row.
+
+        Raises:
+            KeyError: If the 'x' column is missing.
+        """
+        if include_x and "x" not in dataframe.columns:
+            raise KeyError("x")
+        names = ["x"] * include_x + [name for name in dataframe.columns if name != "x"]
+        statement = insert(cls)
+        for start in range(0, len(names), chunksize):
+            records = [{"function_id": cls.function_id_of(name),
+                        "values": np.ascontiguousarray(dataframe[name].to_numpy(), dtype=cls.value_dtype).tobytes()}
+                       for name in names[start:start + chunksize]]
+            session.execute(statement, records)
+        return len(names)
+
+    @staticmethod
+    def function_id_of(name):
+        """Returns the function_id of a column name: 0 for 'x', N for 'yN' or 'yN (ideal func)'."""
+        return 0 if name == "x" else int(name.split(" ")[0][1:])
+
+    @classmethod
+    def function_ids(cls, session):
+        """Returns the ids of all stored ideal functions in ascending order, without the x row."""
+        return session.scalars(select(cls.function_id).where(cls.function_id > 0).order_by(cls.function_id)).all()
+
+    @classmethod
+    def load_matrix(cls, session, function_ids=None):
+        """
+        Loads ideal functions as one contiguous matrix.
+
+        The matrix is allocated once in column-major order and each function is copied straight from its BLOB
+        into its column, so no intermediate per-function arrays or DataFrames are built.
+
+        Args:
+            session (Session): SQLAlchemy session to be used for database operations.
+            function_ids (list, optional): Ids of the functions to load (default is all).
+
+        Returns:
+            tuple: (x, function_ids, matrix) with matrix of shape (n_points, n_functions) in function_id order.
+
+        Raises:
+            KeyError: If the x row or a requested function is not stored.
+        """
+        query = select(cls.function_id, cls.values).order_by(cls.function_id)
+        if function_ids is not None:
+            query = query.where(cls.function_id.in_(sorted({0, *function_ids})))
+        rows = session.execute(query).all()
+        if not rows or rows[0][0] != 0:
+            raise KeyError("x")
+        loaded_ids = [function_id for function_id, _ in rows[1:]]
+        if function_ids is not None:
+            missing = set(function_ids) - set(loaded_ids)
+            if missing:
+                raise KeyError(f"y{min(missing)}")
+
+        x = np.frombuffer(rows[0][1], dtype=cls.value_dtype).astype(float)
+        matrix = np.empty((len(x), len(loaded_ids)), order="F")
+        for j, (_, values) in enumerate(rows[1:]):
+            matrix[:, j] = np.frombuffer(values, dtype=cls.value_dtype)
+        return x, loaded_ids, matrix
+
+
+# Ideal function tables by schema name: one column per function, or one row per function
+IDEAL_MODELS = {"wide": Idealfunctions, "long": Idealfunctionarrays}
+
+
+def migrate_ideal_functions(session, chunksize=1000):
+    """
+    Copies the ideal functions from the wide 'idealfunctions' table into the long 'idealfunctionarrays' table.
+
+    Earlier contents of the long table are replaced, so the migration can be repeated.
+
+    Args:
+        session (Session): SQLAlchemy session bound to the database.
+        chunksize (int): Number of functions inserted per batch (default is 1000).
+
+    Returns:
+        int: Number of migrated ideal functions.
+
+    Raises:
+        ValueError: If the wide table is empty, so the long table is not replaced with empty functions.
+    """
+    Idealfunctionarrays.__table__.create(session.bind, checkfirst=True)
+    wide_df = pd.read_sql(select(Idealfunctions.__table__).order_by(Idealfunctions.x), session.bind)
+    if wide_df.empty:
+        raise ValueError(f"No ideal functions to migrate in {Idealfunctions.__tablename__}")
+    try:
+        session.execute(delete(Idealfunctionarrays))
+        rows = Idealfunctionarrays.insert_df(wide_df, session, chunksize)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    print(f"Migrated {rows - 1} ideal functions into {Idealfunctionarrays.__tablename__}")
+    return rows - 1
+
+
 # Define Testdata table
 class Testdata(Parent):
     """
@@ -117,20 +378,58 @@ class Testdata(Parent):
     """
     __tablename__ = "testdata"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    x = Column(Float)
+    x = Column(Float, index=True)
     y = Column(Float)
 
 
-# Only run this part when the script is executed directly
-if __name__ == "__main__":
+def ensure_indexes(engine):
+    """
+    Creates the indexes of the models that are missing in tables that already exist in the database.
+
+    Args:
+        engine (Engine): SQLAlchemy engine of the database.
+    """
+    existing_tables = set(inspect(engine).get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name in existing_tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+
+
+def import_all(engine, session, train_file="train.csv", ideal_file="ideal.csv", test_file="test.csv", bulk=True,
+               chunksize=50000, ideal_schema="wide"):
+    """
+    Recreates all tables and imports the training, ideal and test CSV files.
+
+    Args:
+        engine (Engine): SQLAlchemy engine of the target database.
+        session (Session): SQLAlchemy session bound to the engine.
+        train_file (str): Path to the training data CSV file (default is 'train.csv').
+        ideal_file (str): Path to the ideal functions CSV file (default is 'ideal.csv').
+        test_file (str): Path to the test data CSV file (default is 'test.csv').
+        bulk (bool): Whether to use the chunked bulk insert mode of Parent.importcsv (default is True).
+        chunksize (int): Number of rows per batch in bulk mode (default is 50000).
+        ideal_schema (str): 'wide' stores the ideal functions in 'idealfunctions' with one column per function,
+            'long' in 'idealfunctionarrays' with one row per function (default is 'wide').
+    """
     # Drop existing tables and create new ones
     Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
 
     # Import CSV data into the database
-    Trainingdata.importcsv("train.csv", session)
-    Idealfunctions.importcsv("ideal.csv", session)
-    Testdata.importcsv("test.csv", session)
+    Trainingdata.importcsv(train_file, session, bulk=bulk, chunksize=chunksize)
+    if ideal_schema == "long":
+        Idealfunctionarrays.importcsv(ideal_file, session)
+    else:
+        Idealfunctions.importcsv(ideal_file, session, bulk=bulk, chunksize=chunksize)
+    Testdata.importcsv(test_file, session, bulk=bulk, chunksize=chunksize)
+
+
+# Only run this part when the script is executed directly
+if __name__ == "__main__":
+    engine, Session = Parent.setup_database()
+    session = Session()
+    import_all(engine, session)
 
     # Close the session after importing
     session.close()
@@ -1,16 +1,68 @@
-from ConfigandImport import Parent
 import pandas as pd
 import numpy as np
 import logging
-from FindIdealFunctions import session_scope, load_df
+import os
+from sqlalchemy import text
+from FindIdealFunctions import (session_scope, load_df, ideal_columns, create_results_df, get_min_sse_cached,
+                                check_fit_precision)
+from ColumnarCache import CACHE_DIR
+from ResultCache import ResultCache
+from Instrumentation import metrics, add_metrics_arguments, configure_metrics_from_args
+from Rendering import renderer, add_render_arguments, configure_render_from_args
+from Precision import (precision, compare_decisions, add_precision_arguments, configure_precision_from_args,
+                       PRECISION_CHECK_CANDIDATES)
 
-# Logging setup
-logging.basicConfig(level=logging.INFO)
+# Indexes of 'Table 3' by name: lookups by test x value and by assigned ideal function
+TABLE3_INDEXES = {"ix_table3_x": "X (test func)", "ix_table3_ideal_func": "No. of ideal func"}
 
-# Setup Database and Session Manager
-engine, Session = Parent.setup_database()
+# Matching results file without extension; 'binary' writes a .npy file, 'csv' a .csv file, 'both' writes both
+RESULTS_FILE = "Test Data Evaluation"
+RESULTS_FORMATS = ["binary", "csv", "both"]
 
-def calculate_max_deviations(training_df, ideal_df, training_funcs, ideal_funcs):
+# Selected ideal functions as written by FindIdealFunctions, read by default instead of refitting
+BEST_FIT_FILE = "ideal_vs_training.csv"
+
+# One record per (test point, ideal function) pair in the binary results file; the ideal function yN is stored
+# as its number N and 'Test Deviation', which equals 'Delta Y (test func)', is not stored twice
+RESULTS_DTYPE = np.dtype([("ID", "<i8"), ("X (test func)", "<f8"), ("Y (test func)", "<f8"),
+                          ("Delta Y (test func)", "<f8"), ("No. of ideal func", "<i4"), ("Max Deviation", "<f8"),
+                          ("within_threshold", "?")])
+
+def max_deviations_batch(training_array, ideal_array, ideal_indices, training_indices=None, x=None, percentiles=None):
+    """
+    Calculate the maximum deviations of many training/ideal function pairs in one NumPy pass.
+
+    The deviation of a pair at a point is |training - ideal| * sqrt(2), as in calculate_max_deviations.
+    NaN values are ignored. Floating point inputs keep their type, e.g. float32.
+
+    Args:
+        training_array (np.ndarray): Array of shape (n_points, n_training) with one training function per column.
+        ideal_array (np.ndarray): Array of shape (n_points, n_ideal) with one ideal function per column.
+        ideal_indices (array-like): Ideal function column of each pair.
+        training_indices (array-like, optional): Training function column of each pair (default is 0, 1, 2, ...).
+        x (np.ndarray, optional): x value of each point, used to report where the maximum occurs.
+        percentiles (list, optional): Percentiles (0-100) of the deviations to report per pair.
+
+    Returns:
+        dict: 'max_dev' and 'argmax' (row of the maximum) with one value per pair, 'argmax_x' if x is given and
+        'percentiles' of shape (n_pairs, len(percentiles)) if percentiles are given.
+    """
+    ideal_indices = np.asarray(ideal_indices, dtype=np.intp)
+    if training_indices is None:
+        training_indices = np.arange(len(ideal_indices))
+    training_indices = np.asarray(training_indices, dtype=np.intp)
+
+    sqrt2 = np.sqrt(2, dtype=np.result_type(training_array, ideal_array, np.float32))  # float32 stays float32
+    deviations = np.abs(training_array[:, training_indices] - ideal_array[:, ideal_indices]) * sqrt2
+    argmax = np.where(np.isnan(deviations), -np.inf, deviations).argmax(axis=0)
+    result = {"max_dev": np.fmax.reduce(deviations, axis=0), "argmax": argmax}
+    if x is not None:
+        result["argmax_x"] = np.asarray(x)[argmax]
+    if percentiles is not None:
+        result["percentiles"] = np.nanpercentile(deviations, percentiles, axis=0).T
+    return result
+
+def calculate_max_deviations(training_df, ideal_df, training_funcs, ideal_funcs, dtype=None):
     """
     Calculate the maximum deviations between training and ideal functions.
 
@@ -19,25 +71,378 @@ def calculate_max_deviations(training_df, ideal_df, training_funcs, ideal_funcs)
         ideal_df (pd.DataFrame): DataFrame containing ideal function data.
         training_funcs (list): List of training function column names.
         ideal_funcs (list): List of ideal function column names.
+        dtype (type, optional): Floating point type of the computation (default is the configured precision).
 
     Returns:
         dict: A dictionary where keys are ideal function names and values are the maximum deviations.
     """
-    max_devs = {}
+    pairs = []
     for train_func, ideal_func in zip(training_funcs, ideal_funcs):
         ideal_col = f"{ideal_func} (ideal func)"
         train_col = f"{train_func} (training func)"
-        
+
         if train_col in training_df.columns and ideal_col in ideal_df.columns:
-            deviations = np.abs(training_df[train_col] - ideal_df[ideal_col]) * np.sqrt(2)
-            max_devs[ideal_func] = deviations.max()
-            logging.info(f"Max deviation for {ideal_func} with {train_func}: {max_devs[ideal_func]}")
+            pairs.append((train_func, ideal_func, train_col, ideal_col))
         else:
             logging.warning(f"Missing columns for {train_col} or {ideal_col}.")
-    
+
+    max_devs = {}
+    if pairs:
+        train_cols = list(dict.fromkeys(pair[2] for pair in pairs))
+        ideal_cols = list(dict.fromkeys(pair[3] for pair in pairs))
+        dtype = precision.dtype if dtype is None else dtype
+        batch = max_deviations_batch(training_df[train_cols].to_numpy(dtype=dtype),
+                                     ideal_df[ideal_cols].to_numpy(dtype=dtype),
+                                     [ideal_cols.index(pair[3]) for pair in pairs],
+                                     [train_cols.index(pair[2]) for pair in pairs])
+        for (train_func, ideal_func, _, _), max_dev in zip(pairs, batch["max_dev"]):
+            max_devs[ideal_func] = max_dev
+            logging.info(f"Max deviation for {ideal_func} with {train_func}: {max_dev}")
+
     return max_devs
 
-def match_test_to_ideal(test_data_df, ideal_functions_df, max_devs, ideal_funcs, session):
+class XIndex:
+    """
+    Sorted index over the x values of the ideal functions, built once and used to look up many test points.
+
+    Test points are resolved with a binary search, or in constant time when the x values form a uniform grid.
+
+    Attributes:
+        order (np.ndarray): Row positions of the ideal functions sorted by x.
+        sorted_x (np.ndarray): The x values in sorted order.
+        step (float or None): The grid spacing if the x values are uniformly spaced, otherwise None.
+    """
+
+    def __init__(self, x_values):
+        """
+        Args:
+            x_values (array-like): The x value of each ideal function row.
+        """
+        x_values = np.asarray(x_values, dtype=float)
+        self.order = np.argsort(x_values, kind="stable")  # Stable, so duplicate x values keep their first row
+        self.sorted_x = x_values[self.order]
+        self.step = None
+        if len(self.sorted_x) > 2:
+            spacing = np.diff(self.sorted_x)
+            step = (self.sorted_x[-1] - self.sorted_x[0]) / (len(self.sorted_x) - 1)
+            if step > 0 and np.allclose(spacing, step, rtol=1e-6, atol=0):
+                self.step = step
+
+    def _nearest(self, x_query):
+        """Return the sorted position of the grid point closest to each query value."""
+        last = len(self.sorted_x) - 1
+        if self.step is not None:
+            return np.clip(np.rint((x_query - self.sorted_x[0]) / self.step), 0, last).astype(np.intp)
+        pos = np.minimum(np.searchsorted(self.sorted_x, x_query, side="left"), last)
+        below = np.maximum(pos - 1, 0)
+        closer_below = np.abs(x_query - self.sorted_x[below]) < np.abs(self.sorted_x[pos] - x_query)
+        return np.where(closer_below, below, pos)
+
+    def _bracket(self, x_query):
+        """Return the sorted position i with sorted_x[i] <= x < sorted_x[i + 1] for each query value."""
+        last = len(self.sorted_x) - 2
+        if self.step is not None:
+            pos = np.clip(np.floor((x_query - self.sorted_x[0]) / self.step), 0, last).astype(np.intp)
+            # Correct off-by-one results caused by rounding in the division
+            pos = np.where((self.sorted_x[pos] > x_query) & (pos > 0), pos - 1, pos)
+            return np.where((self.sorted_x[pos + 1] <= x_query) & (pos < last), pos + 1, pos)
+        return np.clip(np.searchsorted(self.sorted_x, x_query, side="right") - 1, 0, last)
+
+    def locate(self, x_query, tolerance=0.0):
+        """
+        Find the ideal function row closest to each query value within a tolerance.
+
+        Args:
+            x_query (array-like): The x values to look up.
+            tolerance (float): Largest accepted distance between a query value and the ideal x (default is exact).
+
+        Returns:
+            np.ndarray: The row position for each query value, or -1 where no row is close enough.
+        """
+        x_query = np.asarray(x_query, dtype=float)
+        if len(self.sorted_x) == 0:
+            return np.full(len(x_query), -1)
+        pos = self._nearest(x_query)
+        found = np.abs(self.sorted_x[pos] - x_query) <= tolerance
+        return np.where(found, self.order[pos], -1)
+
+    def resolve(self, x_query, values, mode="exact", tolerance=0.0):
+        """
+        Look up or interpolate the ideal function values at each query value.
+
+        Args:
+            x_query (array-like): The x values to look up.
+            values (np.ndarray): Array of shape (n_rows, n_funcs) with the ideal function values in row order.
+            mode (str): 'exact' takes the closest row within the tolerance, 'linear' and 'cubic' interpolate
+                between the neighbouring grid points. Query values outside the grid are not resolved.
+            tolerance (float): Largest accepted distance to the closest row in 'exact' mode.
+
+        Returns:
+            tuple: (resolved, found) where resolved has shape (n_queries, n_funcs) and found is a boolean mask
+            of the query values that could be resolved. Unresolved rows are NaN. Floating point values keep their
+            type, e.g. float32.
+        """
+        x_query = np.asarray(x_query, dtype=float)
+        values = np.asarray(values)
+        if values.dtype.kind != "f":
+            values = values.astype(float)
+        resolved = np.full((len(x_query), values.shape[1]), np.nan, dtype=values.dtype)
+
+        if mode == "exact" or len(self.sorted_x) < 2:
+            rows = self.locate(x_query, tolerance)
+            found = rows >= 0
+            resolved[found] = values[rows[found]]
+            return resolved, found
+        if mode not in ("linear", "cubic"):
+            raise ValueError(f"Unknown lookup mode '{mode}'.")
+
+        found = (x_query >= self.sorted_x[0]) & (x_query <= self.sorted_x[-1])
+        x_in = x_query[found]
+        sorted_values = values[self.order]
+        pos = self._bracket(x_in)
+
+        if mode == "cubic" and len(self.sorted_x) >= 4:
+            # Lagrange polynomial through the two grid points on either side of each query value
+            start = np.clip(pos - 1, 0, len(self.sorted_x) - 4)
+            nodes = self.sorted_x[start[:, None] + np.arange(4)]
+            weights = np.ones((len(x_in), 4))
+            for m in range(4):
+                for n in range(4):
+                    if m != n:
+                        weights[:, m] *= (x_in - nodes[:, n]) / (nodes[:, m] - nodes[:, n])
+            resolved[found] = sum(weights[:, m, None] * sorted_values[start + m] for m in range(4))
+        else:
+            x0, x1 = self.sorted_x[pos], self.sorted_x[pos + 1]
+            t = np.divide(x_in - x0, x1 - x0, out=np.zeros_like(x_in), where=x1 > x0)
+            resolved[found] = sorted_values[pos] + t[:, None] * (sorted_values[pos + 1] - sorted_values[pos])
+        return resolved, found
+
+def compute_matches(test_data_df, ideal_functions_df, max_devs, ideal_funcs, lookup="exact", tolerance=0.0, x_index=None,
+                    dtype=None):
+    """
+    Compute the deviation of each test point from each ideal function without writing any output.
+
+    Args:
+        test_data_df (pd.DataFrame): DataFrame containing test data with 'ID', 'x' and 'y' columns.
+        ideal_functions_df (pd.DataFrame): DataFrame containing ideal functions.
+        max_devs (dict): Dictionary containing the maximum deviations for each ideal function.
+        ideal_funcs (list): List of ideal function names.
+        lookup (str): Lookup mode for test x values, see XIndex.resolve (default is 'exact').
+        tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+        x_index (XIndex, optional): Prebuilt index over ideal_functions_df['x'], built here if not given.
+        dtype (type, optional): Floating point type of the y values and deviations (default is the configured
+            precision).
+
+    Returns:
+        pd.DataFrame: One row per (test point, ideal function) pair, ordered by test point.
+    """
+    if x_index is None:
+        x_index = XIndex(ideal_functions_df['x'].values)
+    dtype = precision.dtype if dtype is None else dtype
+
+    # Look up the ideal function row of every test point at once
+    funcs = [func for func in ideal_funcs if f"{func} (ideal func)" in ideal_functions_df.columns]
+    ideal_y, matched = x_index.resolve(
+        test_data_df['x'].values, ideal_functions_df[[f"{func} (ideal func)" for func in funcs]].to_numpy(dtype=dtype),
+        mode=lookup, tolerance=tolerance)
+
+    return results_frame(test_data_df['ID'].values[matched], test_data_df['x'].values[matched],
+                         test_data_df['y'].to_numpy(dtype=dtype)[matched], ideal_y[matched], funcs, max_devs)
+
+def results_frame(ids, x_test, y_test, ideal_y, funcs, max_devs):
+    """
+    Build the matching results from the resolved ideal function values of the matched test points.
+
+    Args:
+        ids (np.ndarray): IDs of the matched test points.
+        x_test (np.ndarray): x values of the matched test points.
+        y_test (np.ndarray): y values of the matched test points.
+        ideal_y (np.ndarray): Array of shape (n_tests, n_funcs) with the ideal function values at each test point.
+        funcs (list): Ideal function names, one per column of ideal_y.
+        max_devs (dict): Dictionary containing the maximum deviations for each ideal function.
+
+    Returns:
+        pd.DataFrame: One row per (test point, ideal function) pair, ordered by test point. 'No. of ideal func'
+        is categorical and 'within_threshold' boolean.
+    """
+    max_deviation = max_deviation_array(max_devs, funcs)
+    delta_y, within_threshold = threshold_deviations(y_test, ideal_y, max_deviation)
+    return assemble_results(ids, x_test, y_test, delta_y, within_threshold, funcs, max_deviation)
+
+def max_deviation_array(max_devs, funcs):
+    """
+    Arrange the maximum deviations in the column order of the ideal function values.
+
+    Args:
+        max_devs (dict): Dictionary containing the maximum deviations for each ideal function.
+        funcs (list): Ideal function names, one per column.
+
+    Returns:
+        np.ndarray: One threshold per function; functions without a maximum deviation get infinity.
+    """
+    return np.array([max_devs.get(func, float('inf')) for func in funcs], dtype=float)
+
+def threshold_deviations(y_test, ideal_y, max_deviation):
+    """
+    Calculate the deviation of every test point from every ideal function and compare it with the thresholds.
+
+    Args:
+        y_test (np.ndarray): y values of the test points.
+        ideal_y (np.ndarray): Array of shape (n_tests, n_funcs) with the ideal function values at each test point.
+        max_deviation (np.ndarray): Threshold of each function, see max_deviation_array.
+
+    Returns:
+        tuple: (delta_y, within_threshold), both of shape (n_tests, n_funcs).
+    """
+    delta_y = np.abs(y_test[:, None] - ideal_y)
+    return delta_y, delta_y <= max_deviation
+
+def assemble_results(ids, x_test, y_test, delta_y, within_threshold, funcs, max_deviation):
+    """
+    Lay out computed deviations as the matching results, one row per (test point, ideal function) pair.
+
+    Args:
+        ids (np.ndarray): IDs of the matched test points.
+        x_test (np.ndarray): x values of the matched test points.
+        y_test (np.ndarray): y values of the matched test points.
+        delta_y (np.ndarray): Deviations of shape (n_tests, n_funcs), see threshold_deviations.
+        within_threshold (np.ndarray): Threshold decisions of shape (n_tests, n_funcs).
+        funcs (list): Ideal function names, one per column.
+        max_deviation (np.ndarray): Threshold of each function.
+
+    Returns:
+        pd.DataFrame: The results as returned by results_frame.
+    """
+    # The ideal function of each row is stored as a small integer code into the distinct function names
+    categories = list(dict.fromkeys(funcs))
+    codes = np.array([categories.index(func) for func in funcs], dtype=np.int8 if len(categories) < 128 else np.int16)
+
+    n_funcs = len(funcs)
+    return pd.DataFrame({
+        "ID": np.repeat(ids, n_funcs),
+        "X (test func)": np.repeat(x_test, n_funcs),
+        "Y (test func)": np.repeat(y_test, n_funcs),
+        "Delta Y (test func)": delta_y.ravel(),
+        "No. of ideal func": pd.Categorical.from_codes(np.tile(codes, len(ids)), categories=categories),
+        "Test Deviation": delta_y.ravel(),
+        "Max Deviation": np.tile(max_deviation, len(ids)),
+        "within_threshold": within_threshold.ravel()
+    })
+
+def results_records(results_df):
+    """
+    Pack matching results into one preallocated structured array for the binary results file.
+
+    Args:
+        results_df (pd.DataFrame): DataFrame returned by compute_matches.
+
+    Returns:
+        np.ndarray: Array with dtype RESULTS_DTYPE and one record per row.
+    """
+    records = np.empty(len(results_df), dtype=RESULTS_DTYPE)
+    for name in RESULTS_DTYPE.names:
+        if name != "No. of ideal func":
+            records[name] = results_df[name].to_numpy()
+    funcs = pd.Categorical(results_df["No. of ideal func"])
+    numbers = np.array([int(func[1:]) for func in funcs.categories], dtype=np.int32)  # 'y36' -> 36
+    records["No. of ideal func"] = numbers[funcs.codes]
+    return records
+
+def write_results(results_df, file=RESULTS_FILE + ".npy", append=False):
+    """
+    Write matching results to a binary results file.
+
+    The file holds one or more consecutive .npy records arrays; appending adds another array, so results can be
+    written batch by batch without rewriting the file.
+
+    Args:
+        results_df (pd.DataFrame): DataFrame returned by compute_matches.
+        file (str): Path of the results file (default is 'Test Data Evaluation.npy').
+        append (bool): If True, the results are appended to an existing file instead of replacing it.
+    """
+    with open(file, "ab" if append else "wb") as handle:
+        np.save(handle, results_records(results_df))
+
+def read_results(file=RESULTS_FILE + ".npy"):
+    """
+    Read a binary results file written by write_results.
+
+    Args:
+        file (str): Path of the results file (default is 'Test Data Evaluation.npy').
+
+    Returns:
+        pd.DataFrame: The matching results with the same columns as compute_matches returns.
+    """
+    arrays = []
+    with open(file, "rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        while handle.tell() < size:
+            arrays.append(np.load(handle).astype(RESULTS_DTYPE))  # Files written before have '<i2' numbers
+    records = np.concatenate(arrays) if arrays else np.empty(0, dtype=RESULTS_DTYPE)
+
+    numbers = np.unique(records["No. of ideal func"])
+    results_df = pd.DataFrame({name: records[name] for name in RESULTS_DTYPE.names})
+    results_df["No. of ideal func"] = pd.Categorical.from_codes(
+        np.searchsorted(numbers, records["No. of ideal func"]), categories=[f"y{number}" for number in numbers])
+    results_df.insert(5, "Test Deviation", results_df["Delta Y (test func)"])
+    return results_df
+
+def export_results(results_df, session, append=False, results_format="binary"):
+    """
+    Write the matching results to the results file and the points within threshold to 'Table 3'.
+
+    Args:
+        results_df (pd.DataFrame): DataFrame returned by compute_matches.
+        session (Session): SQLAlchemy session for database operations.
+        append (bool): If True, the results are appended to existing outputs instead of replacing them.
+        results_format (str): One of RESULTS_FORMATS (default is 'binary', see write_results).
+
+    Returns:
+        pd.DataFrame: The exported 'Table 3' rows.
+    """
+    if results_format not in RESULTS_FORMATS:
+        raise ValueError(f"Unknown results format '{results_format}', expected one of {', '.join(RESULTS_FORMATS)}")
+    if results_format != "csv":
+        write_results(results_df, RESULTS_FILE + ".npy", append)
+    if results_format != "binary":
+        file = RESULTS_FILE + ".csv"
+        results_df.to_csv(file, mode="a" if append else "w", header=not (append and os.path.exists(file)))
+
+    filtered_results = results_df[results_df["within_threshold"] == True]
+    columns_to_export = ["X (test func)", "Y (test func)", "Delta Y (test func)", "No. of ideal func"]
+    filtered_results[columns_to_export].to_sql('Table 3', con=session.bind,
+                                               if_exists='append' if append else 'replace', index=False)
+    # Replacing the table drops its indexes, so they are (re)created after every export
+    with session.bind.begin() as connection:
+        for name, column in TABLE3_INDEXES.items():
+            connection.execute(text(f'CREATE INDEX IF NOT EXISTS "{name}" ON "Table 3" ("{column}")'))
+    return filtered_results[columns_to_export]
+
+def calculate_max_deviations_cached(training_df, ideal_df, training_funcs, ideal_funcs, cache, dtype=None):
+    """
+    Calculate calculate_max_deviations, reusing an earlier result if the paired columns are unchanged.
+
+    Args:
+        training_df (pd.DataFrame): DataFrame containing training function data.
+        ideal_df (pd.DataFrame): DataFrame containing ideal function data.
+        training_funcs (list): List of training function column names.
+        ideal_funcs (list): List of ideal function column names.
+        cache (ResultCache): Cache of earlier results, keyed on a content hash of the paired columns.
+        dtype (type, optional): Floating point type of the computation (default is the configured precision).
+
+    Returns:
+        dict: A dictionary where keys are ideal function names and values are the maximum deviations.
+    """
+    train_cols = [col for col in (f"{func} (training func)" for func in training_funcs) if col in training_df.columns]
+    ideal_cols = [col for col in (f"{func} (ideal func)" for func in ideal_funcs) if col in ideal_df.columns]
+    dtype = precision.dtype if dtype is None else dtype
+    inputs = (training_df[train_cols], ideal_df[ideal_cols], tuple(training_funcs), tuple(ideal_funcs),
+              np.dtype(dtype).name)
+    return cache.cached("calculate_max_deviations", inputs,
+                        lambda: calculate_max_deviations(training_df, ideal_df, training_funcs, ideal_funcs, dtype))
+
+def match_test_to_ideal(test_data_df, ideal_functions_df, max_devs, ideal_funcs, session, lookup="exact", tolerance=0.0,
+                        workers=1, shard_size=100000, results_format="binary", dtype=None):
     """
     Match test data to the ideal functions based on deviation thresholds.
 
@@ -47,89 +452,233 @@ def match_test_to_ideal(test_data_df, ideal_functions_df, max_devs, ideal_funcs,
         max_devs (dict): Dictionary containing the maximum deviations for each ideal function.
         ideal_funcs (list): List of ideal function names.
         session (Session): SQLAlchemy session for database operations.
+        lookup (str): How test x values are resolved on the ideal x grid: 'exact', 'linear' or 'cubic'
+            (see XIndex.resolve, default is 'exact').
+        tolerance (float): Largest accepted x distance to the closest ideal row in 'exact' mode (default is 0).
+        workers (int): Number of worker processes; above 1 the test data is sharded across a process pool
+            (see ParallelMatching.compute_matches_parallel, default is 1).
+        shard_size (int): Number of test points per worker task (default is 100000).
+        results_format (str): Format of the results file, see export_results (default is 'binary').
+        dtype (type, optional): Floating point type of the y values and deviations (default is the configured
+            precision); see check_match_precision for the comparison against float64.
 
     Returns:
         pd.DataFrame: DataFrame containing the matching results between test data and ideal functions.
     """
-    results = []
     test_data_df['ID'] = range(1, len(test_data_df) + 1)  # Assign an ID to each test point
 
-    for _, test_row in test_data_df.iterrows():
-        x_test = test_row['x']
-        y_test = test_row['y']
-        
-        for ideal_func in ideal_funcs:
-            ideal_col = f"{ideal_func} (ideal func)"
-            if ideal_col in ideal_functions_df.columns:
-                ideal_y_value = ideal_functions_df.loc[ideal_functions_df['x'] == x_test, ideal_col].values
-                if len(ideal_y_value) > 0:
-                    delta_y = abs(y_test - ideal_y_value[0])
-                    max_deviation = max_devs.get(ideal_func, float('inf'))
-                    within_threshold = delta_y <= max_deviation
-
-                    results.append({
-                        "ID": test_row['ID'],
-                        "X (test func)": x_test,
-                        "Y (test func)": y_test,
-                        "Delta Y (test func)": delta_y,
-                        "No. of ideal func": ideal_func,
-                        "Test Deviation": delta_y,
-                        "Max Deviation": max_deviation,
-                        "within_threshold": within_threshold
-                    })
-
-    results_df = pd.DataFrame(results)
-    results_df.to_csv("Test Data vs Ideal Function.csv")
+    with metrics.stage("match", rows=len(test_data_df)):
+        if workers > 1:
+            from ParallelMatching import compute_matches_parallel
+            results_df = compute_matches_parallel(test_data_df, ideal_functions_df, max_devs, ideal_funcs, lookup,
+                                                  tolerance, workers=workers, shard_size=shard_size, dtype=dtype)
+        else:
+            results_df = compute_matches(test_data_df, ideal_functions_df, max_devs, ideal_funcs, lookup, tolerance,
+                                         dtype=dtype)
     logging.info("Finished matching test data to ideal functions.")
-    
-    filtered_results = results_df[results_df["within_threshold"] == True]
-    columns_to_export = ["X (test func)", "Y (test func)", "Delta Y (test func)", "No. of ideal func"]
-    filtered_results[columns_to_export].to_sql('Table 3', con=session.bind, if_exists='replace', index=False)
-    results_df.to_csv("Test Data Evaluation.csv")
-    print(filtered_results[columns_to_export])
+
+    with metrics.stage("db_export", rows=len(results_df)):
+        table3_df = export_results(results_df, session, results_format=results_format)
+    print(table3_df)
     logging.info("Exported results to 'Table 3' in the database.")
-    
+
     return results_df
 
-def main():
+def evaluate(session, test_data_df, ideal_functions_df, training_data_df, best_ideal_df, cache=None, lookup="exact",
+             tolerance=0.0, workers=1, shard_size=100000, results_format="binary", max_devs=None):
+    """
+    Calculate the deviation thresholds of the selected ideal functions, match the test data and plot the results.
+
+    Args:
+        session (Session): SQLAlchemy session for database operations.
+        test_data_df (pd.DataFrame): DataFrame containing test data.
+        ideal_functions_df (pd.DataFrame): DataFrame containing ideal functions.
+        training_data_df (pd.DataFrame): DataFrame containing training function data.
+        best_ideal_df (pd.DataFrame): Best ideal function per training function, as returned by FindIdealFunctions.fit.
+        cache (ResultCache, optional): Cache of earlier max deviation results.
+        lookup (str): Lookup mode for test x values, see match_test_to_ideal (default is 'exact').
+        tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+        workers (int): Number of worker processes used for matching (default is 1).
+        shard_size (int): Number of test points per worker task (default is 100000).
+        results_format (str): Format of the results file, see export_results (default is 'binary').
+        max_devs (dict, optional): Precomputed maximum deviations, e.g. from IncrementalFit; calculated if not given.
+
+    Returns:
+        pd.DataFrame: DataFrame containing the matching results between test data and ideal functions.
+    """
+    training_funcs = best_ideal_df["Training Function"].tolist()
+    ideal_funcs = best_ideal_df["Ideal Function"].tolist()
+
+    # Calculate maximum deviations
+    if max_devs is None:
+        with metrics.stage("compute", rows=len(training_data_df)):
+            if cache is not None:
+                max_devs = calculate_max_deviations_cached(training_data_df, ideal_functions_df, training_funcs,
+                                                           ideal_funcs, cache)
+            else:
+                max_devs = calculate_max_deviations(training_data_df, ideal_functions_df, training_funcs, ideal_funcs)
+
+    # Match test data to ideal functions
+    results_df = match_test_to_ideal(test_data_df, ideal_functions_df, max_devs, ideal_funcs, session,
+                                     lookup=lookup, tolerance=tolerance, workers=workers, shard_size=shard_size,
+                                     results_format=results_format)
+
+    if not renderer.enabled:
+        return results_df
+
+    # Get rows within the threshold
+    within_threshold_df = results_df[results_df['within_threshold'] == True]
+
+    # Filter out rows outside the threshold
+    outside_df = results_df[~results_df['ID'].isin(within_threshold_df['ID'])]
+    outside_threshold_df = outside_df.drop_duplicates(subset="ID", keep='first')
+    outside_threshold_df['No. of ideal func'] = "Not matched"
+
+    logging.info("Plotting data...")
+    with metrics.stage("plot"):
+        from Vizualisationsbokeh import plot_ideal_functions_with_bands_bokeh, plot_ideal_function_counts, create_table3
+
+        # Plot visualizations using Bokeh; in 'file' mode they are written in the background
+        renderer.submit(plot_ideal_functions_with_bands_bokeh, ideal_functions_df, ideal_funcs, max_devs,
+                        within_threshold_df, outside_threshold_df, max_points=renderer.max_points)
+        renderer.submit(plot_ideal_function_counts, results_df)
+        renderer.submit(create_table3, results_df)
+
+    return results_df
+
+def check_match_precision(session, ideal_model, best_ideal_df, results_df, lookup="exact", tolerance=0.0):
+    """
+    Recompute the maximum deviations and the matching of the selected ideal functions in float64 and flag every
+    within_threshold decision that differs from the reduced precision results.
+
+    Only the training data, the test data and the selected ideal functions are read again, in float64.
+
+    Args:
+        session (Session): SQLAlchemy session for database operations.
+        ideal_model (Base): Idealfunctions or Idealfunctionarrays.
+        best_ideal_df (pd.DataFrame): Best ideal function per training function, as returned by FindIdealFunctions.fit.
+        results_df (pd.DataFrame): Reduced precision matching results, as returned by match_test_to_ideal.
+        lookup (str): Lookup mode the results were matched with (default is 'exact').
+        tolerance (float): x tolerance the results were matched with (default is 0).
+
+    Returns:
+        pd.DataFrame: The flipped decisions as returned by Precision.compare_decisions.
+    """
+    from ConfigandImport import Trainingdata, Testdata
+    training_funcs = best_ideal_df["Training Function"].tolist()
+    ideal_funcs = best_ideal_df["Ideal Function"].tolist()
+
+    test_data_df = load_df(session, Testdata, cache_dir=CACHE_DIR, dtype=np.float64)
+    test_data_df['ID'] = range(1, len(test_data_df) + 1)  # The same IDs as assigned by match_test_to_ideal
+    ideal_functions_df = load_df(session, ideal_model, cache_dir=CACHE_DIR, columns=ideal_columns(ideal_funcs),
+                                 dtype=np.float64)
+    training_data_df = load_df(session, Trainingdata, cache_dir=CACHE_DIR, dtype=np.float64)
+
+    max_devs = calculate_max_deviations(training_data_df, ideal_functions_df, training_funcs, ideal_funcs, np.float64)
+    reference_df = compute_matches(test_data_df, ideal_functions_df, max_devs, ideal_funcs, lookup, tolerance,
+                                   dtype=np.float64)
+    flipped = compare_decisions(results_df, reference_df)
+    logging.info(f"Checked the {precision.mode} matching against float64: {len(flipped)} decisions changed")
+    return flipped
+
+def main(lookup="exact", tolerance=0.0, workers=1, shard_size=100000, session_factory=None,
+         best_fit_file=BEST_FIT_FILE, ideal_schema="wide", results_format="binary", incremental=False, verify_incremental=False):
     """
     Main function to execute the workflow for loading data, calculating deviations, matching test data to ideal functions,
     and visualizing the results.
+
+    Args:
+        lookup (str): Lookup mode for test x values, see match_test_to_ideal (default is 'exact').
+        tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+        workers (int): Number of worker processes used for matching (default is 1).
+        shard_size (int): Number of test points per worker task (default is 100000).
+        session_factory (sessionmaker, optional): Session factory to use instead of the module's default database.
+        best_fit_file (str, optional): CSV file with the selected ideal functions, as written by FindIdealFunctions
+            (default is ideal_vs_training.csv). Only the selected ideal function columns are loaded. If None, the
+            selection is computed from all ideal functions, through the result cache.
+        ideal_schema (str): Storage of the ideal functions, 'wide' or 'long' (see ConfigandImport.IDEAL_MODELS).
+        results_format (str): Format of the results file, see export_results (default is 'binary').
+        incremental (bool): If True, the selection and the maximum deviations come from the persisted accumulator
+            of IncrementalFit, which only processes appended rows and functions, instead of best_fit_file.
+        verify_incremental (bool): If True, the incremental state is checked against a full recomputation and
+            rebuilt if they differ.
+
+    In reduced precision (see Precision.PrecisionMode) the selection and the within_threshold decisions are
+    checked against float64.
     """
-    with session_scope() as session:
-        from ConfigandImport import Trainingdata, Testdata, Idealfunctions
-        
+    with session_scope(session_factory) as session:
+        from ConfigandImport import Trainingdata, Testdata, IDEAL_MODELS
+        ideal_model = IDEAL_MODELS[ideal_schema]
+        cache = ResultCache()
+        best_ideal_df = pd.read_csv(best_fit_file) if best_fit_file and not incremental else None
+        min_sse = None
+
         # Load data from the database
-        test_data_df = load_df(session, Testdata)
-        ideal_functions_df = load_df(session, Idealfunctions)
-        training_data_df = load_df(session, Trainingdata)
-        
-        # Load the best ideal functions from CSV
-        best_ideal_df = pd.read_csv("ideal_vs_training.csv")
-        training_funcs = best_ideal_df["Training Function"].tolist()
-        ideal_funcs = best_ideal_df["Ideal Function"].tolist()
-        
-        # Calculate maximum deviations
-        max_devs = calculate_max_deviations(training_data_df, ideal_functions_df, training_funcs, ideal_funcs)
-        
-        # Match test data to ideal functions
-        results_df = match_test_to_ideal(test_data_df, ideal_functions_df, max_devs, ideal_funcs, session)
-        
-        # Get rows within the threshold
-        within_threshold_df = results_df[results_df['within_threshold'] == True]
-        
-        # Filter out rows outside the threshold
-        outside_df = results_df[~results_df['ID'].isin(within_threshold_df['ID'])]
-        outside_threshold_df = outside_df.drop_duplicates(subset="ID", keep='first')
-        outside_threshold_df['No. of ideal func'] = "Not matched"
-        
-        logging.info("Plotting data...")
-        from Vizualisationsbokeh import plot_ideal_functions_with_bands_bokeh, plot_ideal_function_counts, create_table3
-        
-        # Plot visualizations using Bokeh
-        plot_ideal_functions_with_bands_bokeh(ideal_functions_df, ideal_funcs, max_devs, within_threshold_df, outside_threshold_df)
-        plot_ideal_function_counts(results_df)
-        create_table3(results_df)
+        with metrics.stage("load") as stage:
+            test_data_df = load_df(session, Testdata, cache_dir=CACHE_DIR)
+            columns = ideal_columns(best_ideal_df["Ideal Function"]) if best_ideal_df is not None else None
+            ideal_functions_df = load_df(session, ideal_model, cache_dir=CACHE_DIR, columns=columns)
+            training_data_df = load_df(session, Trainingdata, cache_dir=CACHE_DIR)
+            stage.add_rows(len(test_data_df) + len(ideal_functions_df) + len(training_data_df))
+
+        max_devs = None
+        if incremental:
+            from IncrementalFit import fit_incremental, fit_state_file
+            with metrics.stage("compute", rows=len(training_data_df)):
+                accumulator = fit_incremental(training_data_df, ideal_functions_df,
+                                              fit_state_file(session, ideal_model), verify=verify_incremental)
+                best_ideal_df = create_results_df(accumulator.min_sse())
+                max_devs = accumulator.max_deviations(best_ideal_df["Training Function"],
+                                                      best_ideal_df["Ideal Function"])
+        elif best_ideal_df is None:
+            # Select the best ideal functions; the cache only recomputes them if the training or ideal data changed
+            with metrics.stage("compute", rows=len(training_data_df)):
+                top_k = PRECISION_CHECK_CANDIDATES if precision.checked else 1
+                min_sse = get_min_sse_cached(training_data_df, ideal_functions_df, cache, top_k)
+                best_ideal_df = create_results_df(min_sse)
+
+        results_df = evaluate(session, test_data_df, ideal_functions_df, training_data_df, best_ideal_df, cache,
+                              lookup=lookup, tolerance=tolerance, workers=workers, shard_size=shard_size,
+                              results_format=results_format, max_devs=max_devs)
+
+        if precision.checked:
+            with metrics.stage("precision_check"):
+                if min_sse is not None:
+                    check_fit_precision(session, ideal_model, min_sse)
+                check_match_precision(session, ideal_model, best_ideal_df, results_df, lookup, tolerance)
+    with metrics.stage("render"):
+        renderer.wait()
+    metrics.finish()
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Match the test data to the selected ideal functions.")
+    parser.add_argument("--lookup", choices=["exact", "linear", "cubic"], default="exact",
+                        help="How test x values are resolved on the ideal x grid")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Largest accepted x distance to the closest ideal row in exact mode")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes used for matching")
+    parser.add_argument("--shard-size", type=int, default=100000, help="Number of test points per worker task")
+    parser.add_argument("--best-fit", default=BEST_FIT_FILE,
+                        help="Read the selected ideal functions from this CSV and load only their columns")
+    parser.add_argument("--refit", action="store_true",
+                        help="Select the ideal functions from all of them instead of reading --best-fit")
+    parser.add_argument("--ideal-schema", choices=["wide", "long"], default="wide",
+                        help="Read the ideal functions from the wide table or the long per-function table")
+    parser.add_argument("--results-format", choices=RESULTS_FORMATS, default="binary",
+                        help="Write the matching results as 'Test Data Evaluation.npy', as CSV, or both")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process rows and ideal functions appended since the last incremental run")
+    parser.add_argument("--verify-incremental", action="store_true",
+                        help="Check the incremental state against a full recomputation and rebuild it if they differ")
+    add_metrics_arguments(parser)
+    add_render_arguments(parser)
+    add_precision_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics_from_args(args)
+    configure_render_from_args(args)
+    configure_precision_from_args(args)
+    main(args.lookup, args.tolerance, args.workers, args.shard_size, best_fit_file=None if args.refit else args.best_fit,
+         ideal_schema=args.ideal_schema, results_format=args.results_format, incremental=args.incremental,
+         verify_incremental=args.verify_incremental)
@@ -1,28 +1,49 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
 import pandas as pd
 import numpy as np
 import logging
 from contextlib import contextmanager
-from ConfigandImport import Trainingdata, Idealfunctions, Parent
-from Vizualisationsbokeh import plot_training_vs_ideal_bokeh
+from ConfigandImport import Trainingdata, Idealfunctionarrays, IDEAL_MODELS, Parent
+from ColumnarCache import CACHE_DIR, load_cached_df, projection_statement, x_range_rows
+from ResultCache import ResultCache
+from Instrumentation import metrics, add_metrics_arguments, configure_metrics_from_args
+from Rendering import renderer, add_render_arguments, configure_render_from_args
+from Precision import (precision, compare_selection, add_precision_arguments, configure_precision_from_args,
+                       PRECISION_CHECK_CANDIDATES)
 
-# Set up logging for the script
-logging.basicConfig(level=logging.INFO)
+# SSE values below this fraction of ||a||^2 + ||b||^2 are recomputed directly in sse_matrix; in float32 the
+# fraction is raised to SSE_CANCELLATION_EPS_FACTOR machine epsilons
+SSE_CANCELLATION_TOLERANCE = 1e-6
+SSE_CANCELLATION_EPS_FACTOR = 1000
 
-# Database setup using Parent class
-engine, Session = Parent.setup_database()
+# Session factory of the default database, created on first use so that importing this module opens no connection
+_default_session_factory = None
+
+def default_session_factory():
+    """
+    Return the session factory of the default database, setting up the connection on first use.
+
+    Returns:
+        sessionmaker: The session factory.
+    """
+    global _default_session_factory
+    if _default_session_factory is None:
+        _, _default_session_factory = Parent.setup_database()
+    return _default_session_factory
 
 @contextmanager
-def session_scope():
+def session_scope(session_factory=None):
     """
     Provide a transactional scope around a series of database operations.
+
+    Args:
+        session_factory (sessionmaker, optional): Session factory to use instead of the module's default database.
     
     Yields:
         session (Session): A session object that is committed if operations succeed,
         or rolled back if an exception occurs.
     """
-    session = Session()  # Create a new session
+    session = (session_factory or default_session_factory())()  # Create a new session
     try:
         yield session  # Make the session available within the context
         session.commit()  # Commit the transaction on success
@@ -32,46 +53,328 @@ def session_scope():
     finally:
         session.close()  # Ensure session is always closed to release resources
 
-def load_df(session, model):
+def load_df(session, model, cache_dir=None, columns=None, x_range=None, dtype=None):
     """
     Load data from a SQLAlchemy model into a Pandas DataFrame.
 
     Args:
         session (Session): Active SQLAlchemy session to interact with the database.
         model (Base): SQLAlchemy model class representing the table to load.
+        cache_dir (str, optional): If given, the table is served from the columnar cache in this directory
+            (see ColumnarCache.load_cached_df) instead of being read through SQL on every call.
+        columns (list, optional): Database column names to load, e.g. ['x', 'y36 (ideal func)'] (default is all).
+            The projection is applied in the SQL query or by mapping only those cache files.
+        x_range (tuple, optional): (low, high) inclusive bounds of the 'x' column; None leaves a side open.
+        dtype (type, optional): Floating point type of the function columns (default is the configured precision,
+            see Precision.PrecisionMode). 'x' is always float64.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing the data from the specified table. Ideal functions stored in the long
+        Idealfunctionarrays table are returned in the wide layout of Idealfunctions.
+
+    Raises:
+        KeyError: If a requested column does not exist in the table.
+    """
+    if issubclass(model, Idealfunctionarrays):
+        return load_ideal_arrays_df(session, columns, x_range, dtype)
+    if cache_dir is not None:
+        return precision.cast(load_cached_df(session, model, cache_dir, columns=columns, x_range=x_range), dtype)
+    if columns is None and x_range is None:
+        return precision.cast(pd.read_sql(session.query(model).statement, session.bind), dtype)
+    return precision.cast(pd.read_sql(projection_statement(model, columns, x_range), session.bind), dtype)
+
+
+def load_ideal_arrays_df(session, columns=None, x_range=None, dtype=None):
+    """
+    Load ideal functions from the long Idealfunctionarrays table into the wide layout of Idealfunctions.
+
+    The functions are backed by a single column-major matrix that the DataFrame wraps without copying.
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+        columns (list, optional): Column names to load, e.g. ['x', 'y36 (ideal func)'] (default is all).
+        x_range (tuple, optional): (low, high) inclusive bounds of the 'x' column; None leaves a side open.
+        dtype (type, optional): Floating point type of the functions (default is the configured precision).
+
+    Returns:
+        pd.DataFrame: DataFrame with 'x' and 'yN (ideal func)' columns in function order.
+    """
+    function_ids = None
+    if columns is not None:
+        function_ids = [Idealfunctionarrays.function_id_of(column) for column in columns if column != "x"]
+    x, function_ids, matrix = Idealfunctionarrays.load_matrix(session, function_ids)
+    if x_range is not None:
+        rows = x_range_rows(x, x_range, bool(np.all(np.diff(x) >= 0)))
+        x, matrix = x[rows], matrix[rows]
+    matrix = matrix.astype(precision.dtype if dtype is None else dtype, order="F", copy=False)
+    ideal_df = pd.DataFrame(matrix, columns=[f"y{function_id} (ideal func)" for function_id in function_ids],
+                            copy=False)
+    ideal_df.insert(0, "x", x)
+    return ideal_df
+
+
+def ideal_columns(ideal_funcs):
+    """
+    List the columns of the Idealfunctions table needed for the given ideal functions.
+
+    Args:
+        ideal_funcs (list): Ideal function names, e.g. ['y36', 'y11'].
+
+    Returns:
+        list: 'x' followed by the distinct ideal function columns, e.g. ['x', 'y36 (ideal func)', 'y11 (ideal func)'].
+    """
+    return ["x"] + list(dict.fromkeys(f"{func} (ideal func)" for func in ideal_funcs))
+
+
+def sse_matrix(training_array, ideal_array):
+    """
+    Calculate the Sum of Squared Errors (SSE) between every training function and every ideal function in one pass.
+
+    The matrix is built from the identity ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b, so the pairwise work is a
+    single matrix product. Entries that are small compared to the norms lose precision to cancellation and are
+    recomputed directly. The matrix has the floating point type of the inputs.
+
+    Args:
+        training_array (np.ndarray): Array of shape (n_points, n_training) with one training function per column.
+        ideal_array (np.ndarray): Array of shape (n_points, n_ideal) with one ideal function per column.
+
+    Returns:
+        np.ndarray: Array of shape (n_training, n_ideal) with the SSE of each training/ideal pair.
+    """
+    training_sq = np.einsum("ij,ij->j", training_array, training_array)  # ||a||^2 per training function
+    ideal_sq = np.einsum("ij,ij->j", ideal_array, ideal_array)  # ||b||^2 per ideal function
+    scale = training_sq[:, None] + ideal_sq[None, :]
+    sse = scale - 2.0 * (training_array.T @ ideal_array)
+
+    # Fall back to the direct sum where cancellation makes the identity unreliable
+    tolerance = max(SSE_CANCELLATION_TOLERANCE, SSE_CANCELLATION_EPS_FACTOR * float(np.finfo(sse.dtype).eps))
+    rows, cols = np.nonzero(sse <= scale * tolerance)
+    if len(rows):
+        sse[rows, cols] = exact_sse(training_array, ideal_array, rows, cols)
+    return sse
+
+def exact_sse(training_array, ideal_array, training_idx, ideal_idx):
+    """
+    Calculate the SSE directly for selected training/ideal pairs.
+
+    Args:
+        training_array (np.ndarray): Array of shape (n_points, n_training) with the training functions.
+        ideal_array (np.ndarray): Array of shape (n_points, n_ideal) with the ideal functions.
+        training_idx (np.ndarray): Column indices into training_array.
+        ideal_idx (np.ndarray): Column indices into ideal_array, paired with training_idx.
+
+    Returns:
+        np.ndarray: The SSE of each selected pair.
+    """
+    return np.sum((training_array[:, training_idx] - ideal_array[:, ideal_idx]) ** 2, axis=0)
+
+def top_k_sse(training_array, ideal_array, k=1):
+    """
+    Find the k ideal functions with the lowest SSE for each training function.
+
+    The returned SSE values are recomputed directly, so they do not carry the rounding error of the matrix identity.
+    Ties are resolved in favour of the ideal function with the lower index.
+
+    Args:
+        training_array (np.ndarray): Array of shape (n_points, n_training) with the training functions.
+        ideal_array (np.ndarray): Array of shape (n_points, n_ideal) with the ideal functions.
+        k (int): Number of candidates to return per training function.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the data from the specified table.
+        tuple: (sse, indices), both of shape (n_training, k) and sorted by ascending SSE.
+    """
+    sse = sse_matrix(training_array, ideal_array)
+    k = min(k, sse.shape[1])
+    if k < sse.shape[1]:
+        candidates = np.sort(np.argpartition(sse, k - 1, axis=1)[:, :k], axis=1)
+    else:
+        candidates = np.tile(np.arange(sse.shape[1]), (sse.shape[0], 1))
+
+    training_idx = np.repeat(np.arange(sse.shape[0]), k)
+    candidate_sse = exact_sse(training_array, ideal_array, training_idx, candidates.ravel()).reshape(candidates.shape)
+    order = np.argsort(candidate_sse, axis=1, kind="stable")
+    return np.take_along_axis(candidate_sse, order, axis=1), np.take_along_axis(candidates, order, axis=1)
+
+def get_sse_matrix(training_df, ideal_df, dtype=None):
     """
-    return pd.read_sql(session.query(model).statement, session.bind)
+    Calculate the full SSE matrix between the training functions and all ideal functions.
 
-def get_min_sse(training_df, ideal_df):
+    Args:
+        training_df (pd.DataFrame): DataFrame containing the training functions (y1 to y4).
+        ideal_df (pd.DataFrame): DataFrame containing all the ideal functions.
+        dtype (type, optional): Floating point type of the computation (default is the configured precision).
+
+    Returns:
+        pd.DataFrame: SSE values with one row per training function (y1 to y4) and one column per ideal function.
+    """
+    dtype = precision.dtype if dtype is None else dtype
+    training_array = training_df.iloc[:, 1:5].to_numpy(dtype=dtype)
+    ideal_array = ideal_df.iloc[:, 1:].to_numpy(dtype=dtype)
+    return pd.DataFrame(sse_matrix(training_array, ideal_array),
+                        index=[f"y{j+1}" for j in range(training_array.shape[1])],
+                        columns=[f"y{i+1}" for i in range(ideal_array.shape[1])])
+
+def get_min_sse(training_df, ideal_df, top_k=1, dtype=None):
     """
     Calculate the minimum Sum of Squared Errors (SSE) between each training function and all ideal functions.
 
     Args:
         training_df (pd.DataFrame): DataFrame containing the training functions (y1 to y4).
         ideal_df (pd.DataFrame): DataFrame containing all the ideal functions.
+        top_k (int): Number of best candidates to keep per training function (default is 1).
+        dtype (type, optional): Floating point type of the computation (default is the configured precision).
+            In float32 the selection can differ from float64 for near ties; see check_fit_precision.
 
     Returns:
         dict: A dictionary with the minimum SSE and corresponding ideal function for each training function.
+        If top_k is greater than 1, each entry also holds a 'candidates' list of (ideal_func, sse) tuples.
     """
-    min_sse = {f"y{j}": {"ideal_func": None, "min_sse": float("inf")} for j in range(1, 5)}
-    
-    training_array = training_df.iloc[:, 1:5].values  # Extract values for y1 to y4 (training functions)
-    ideal_array = ideal_df.iloc[:, 1:].values  # Extract values for all ideal functions
-    
-    num_training_funcs = training_array.shape[1]  # Number of training functions
-    num_ideal_funcs = ideal_array.shape[1]  # Number of ideal functions
-    
-    for j in range(num_training_funcs):  # Iterate over all training functions (y1 to y4)
-        for i in range(num_ideal_funcs):  # Iterate over all ideal functions
-            sse = np.sum((training_array[:, j] - ideal_array[:, i]) ** 2)  # Calculate SSE
-            if sse < min_sse[f"y{j+1}"]["min_sse"]:
-                min_sse[f"y{j+1}"] = {"ideal_func": f"y{i+1}", "min_sse": sse}  # Update min SSE if a lower value is found
+    dtype = precision.dtype if dtype is None else dtype
+    training_array = training_df.iloc[:, 1:5].to_numpy(dtype=dtype)  # Extract values for y1 to y4 (training functions)
+    ideal_array = ideal_df.iloc[:, 1:].to_numpy(dtype=dtype)  # Extract values for all ideal functions
+
+    best_sse, best_idx = top_k_sse(training_array, ideal_array, top_k)
+    return format_min_sse(best_sse, best_idx, top_k)
+
+def get_min_sse_cached(training_df, ideal_df, cache, top_k=1, dtype=None):
+    """
+    Calculate get_min_sse, reusing an earlier result if the training and ideal values are unchanged.
+
+    Args:
+        training_df (pd.DataFrame): DataFrame containing the training functions (y1 to y4).
+        ideal_df (pd.DataFrame): DataFrame containing all the ideal functions.
+        cache (ResultCache): Cache of earlier results, keyed on a content hash of the input arrays.
+        top_k (int): Number of best candidates to keep per training function (default is 1).
+        dtype (type, optional): Floating point type of the computation (default is the configured precision).
+
+    Returns:
+        dict: The same structure as returned by get_min_sse.
+    """
+    dtype = precision.dtype if dtype is None else dtype
+    inputs = (training_df.iloc[:, 1:5].values, ideal_df.iloc[:, 1:].values, top_k, np.dtype(dtype).name)
+    return cache.cached("get_min_sse", inputs, lambda: get_min_sse(training_df, ideal_df, top_k, dtype))
+
+def format_min_sse(best_sse, best_idx, top_k=1):
+    """
+    Convert top-k SSE arrays into the dictionary returned by get_min_sse.
+
+    Args:
+        best_sse (np.ndarray): Array of shape (n_training, k) with the sorted SSE values.
+        best_idx (np.ndarray): Array of shape (n_training, k) with the matching ideal function indices.
+        top_k (int): Number of candidates requested per training function.
 
+    Returns:
+        dict: A dictionary with the minimum SSE and corresponding ideal function for each training function.
+    """
+    min_sse = {}
+    for j in range(best_sse.shape[0]):
+        if best_sse.shape[1] == 0:  # No ideal functions to compare against
+            min_sse[f"y{j+1}"] = {"ideal_func": None, "min_sse": float("inf")}
+            continue
+        min_sse[f"y{j+1}"] = {"ideal_func": f"y{best_idx[j, 0] + 1}", "min_sse": best_sse[j, 0]}
+        if top_k > 1:
+            min_sse[f"y{j+1}"]["candidates"] = [(f"y{i + 1}", sse) for i, sse in zip(best_idx[j], best_sse[j])]
     return min_sse
 
+def iter_ideal_blocks(session, model, block_size):
+    """
+    Read the ideal functions from the database a block of columns at a time.
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+        model (Base): SQLAlchemy model class of the ideal functions table.
+        block_size (int): Maximum number of ideal function columns read per query.
+
+    Yields:
+        tuple: (start, block) where start is the index of the first ideal function in the block and block is
+        an array of shape (n_points, <= block_size).
+    """
+    if issubclass(model, Idealfunctionarrays):
+        function_ids = Idealfunctionarrays.function_ids(session)
+        for start in range(0, len(function_ids), block_size):
+            yield start, Idealfunctionarrays.load_matrix(session, function_ids[start:start + block_size])[2]
+        return
+
+    columns = [column for column in model.__table__.columns if column.name != "x"]
+    for start in range(0, len(columns), block_size):
+        rows = session.execute(select(*columns[start:start + block_size])).all()
+        yield start, np.array(rows, dtype=float).reshape(len(rows), -1)
+
+def iter_ideal_blocks_npy(path, block_size):
+    """
+    Read the ideal functions from a memory-mapped .npy file a block of columns at a time.
+
+    The file holds the ideal function values without the x column, one function per column (see save_ideal_npy).
+
+    Args:
+        path (str): Path to the .npy file.
+        block_size (int): Maximum number of ideal function columns loaded into memory at once.
+
+    Yields:
+        tuple: (start, block) as in iter_ideal_blocks.
+    """
+    ideal_array = np.load(path, mmap_mode="r")
+    for start in range(0, ideal_array.shape[1], block_size):
+        yield start, np.array(ideal_array[:, start:start + block_size], dtype=float)
+
+def save_ideal_npy(ideal_df, path):
+    """
+    Save the ideal functions (without x) as a column-major .npy file for iter_ideal_blocks_npy.
+
+    Args:
+        ideal_df (pd.DataFrame): DataFrame containing x and all the ideal functions.
+        path (str): Destination path of the .npy file.
+    """
+    np.save(path, np.asfortranarray(ideal_df.iloc[:, 1:].values, dtype=float))
+
+def get_min_sse_streaming(training_df, ideal_blocks, top_k=1, dtype=None):
+    """
+    Calculate the minimum SSE like get_min_sse, but from ideal functions delivered in blocks of columns.
+
+    Only the current block and the running top-k per training function are kept in memory.
+
+    Args:
+        training_df (pd.DataFrame): DataFrame containing the training functions (y1 to y4).
+        ideal_blocks (iterable): (start, block) tuples as produced by iter_ideal_blocks or iter_ideal_blocks_npy.
+        top_k (int): Number of best candidates to keep per training function (default is 1).
+        dtype (type, optional): Floating point type of the computation (default is the configured precision).
+
+    Returns:
+        dict: The same structure as returned by get_min_sse.
+    """
+    dtype = precision.dtype if dtype is None else dtype
+    training_array = training_df.iloc[:, 1:5].to_numpy(dtype=dtype)
+    best_sse = np.empty((training_array.shape[1], 0), dtype=dtype)
+    best_idx = np.empty((training_array.shape[1], 0), dtype=np.intp)
+
+    for start, block in ideal_blocks:
+        block_sse, block_idx = top_k_sse(training_array, block.astype(dtype, copy=False), top_k)
+        # Earlier blocks come first so ties keep the lower ideal function index
+        merged_sse = np.hstack([best_sse, block_sse])
+        merged_idx = np.hstack([best_idx, block_idx + start])
+        order = np.argsort(merged_sse, axis=1, kind="stable")[:, :top_k]
+        best_sse = np.take_along_axis(merged_sse, order, axis=1)
+        best_idx = np.take_along_axis(merged_idx, order, axis=1)
+        logging.info(f"Searched ideal functions {start + 1} to {start + block.shape[1]}")
+
+    return format_min_sse(best_sse, best_idx, top_k)
+
+def fit(training_df, ideal_df, cache=None):
+    """
+    Select the best ideal function for each training function.
+
+    Args:
+        training_df (pd.DataFrame): DataFrame containing the training functions (y1 to y4).
+        ideal_df (pd.DataFrame): DataFrame containing all the ideal functions.
+        cache (ResultCache, optional): Cache of earlier results; the SSE search is skipped if the inputs are unchanged.
+
+    Returns:
+        pd.DataFrame: DataFrame summarizing the best ideal functions for each training function and their SSE values.
+    """
+    if cache is not None:
+        return create_results_df(get_min_sse_cached(training_df, ideal_df, cache))
+    return create_results_df(get_min_sse(training_df, ideal_df))
+
 def create_results_df(min_sse):
     """
     Create a DataFrame from the minimum SSE results.
@@ -87,24 +390,177 @@ def create_results_df(min_sse):
         for func, result in min_sse.items()
     ])
 
-def main():
+def precision_candidates(min_sse):
+    """
+    List the candidate ideal functions of each training function kept by a reduced precision search.
+
+    Args:
+        min_sse (dict): Result of the search as returned by get_min_sse, with 'candidates' if top_k was greater than 1.
+
+    Returns:
+        dict: Training function name to the names of its candidate ideal functions.
+    """
+    return {func: [name for name, _ in result.get("candidates", [(result["ideal_func"], result["min_sse"])])]
+            for func, result in min_sse.items() if result["ideal_func"] is not None}
+
+def rescore_candidates(training_df, ideal_df, candidates):
+    """
+    Select the best of the candidate ideal functions of each training function again by their float64 SSE.
+
+    Args:
+        training_df (pd.DataFrame): DataFrame containing the training functions, in float64.
+        ideal_df (pd.DataFrame): DataFrame containing at least the candidate ideal functions, in float64.
+        candidates (dict): Candidates of each training function as returned by precision_candidates.
+
+    Returns:
+        dict: The float64 selection in the structure returned by get_min_sse.
+    """
+    reference = {}
+    for func, funcs in candidates.items():
+        training = training_df[f"{func} (training func)"].to_numpy(dtype=np.float64)
+        scored = [(float(np.sum((training - ideal_df[f"{name} (ideal func)"].to_numpy(dtype=np.float64)) ** 2)),
+                   int(name[1:]), name) for name in funcs]
+        sse, _, name = min(scored)  # Ties go to the lower function number, as in top_k_sse
+        reference[func] = {"ideal_func": name, "min_sse": sse}
+    return reference
+
+def check_fit_precision(session, ideal_model, min_sse):
+    """
+    Re-score the reduced precision candidates of each training function in float64 and flag changed selections.
+
+    Only the training data and the candidate ideal functions are read again, in float64. A float64 best function
+    outside the candidates of the reduced precision search is not detected, so keep several candidates per
+    training function (see Precision.PRECISION_CHECK_CANDIDATES).
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+        ideal_model (Base): Idealfunctions or Idealfunctionarrays.
+        min_sse (dict): Result of the reduced precision search as returned by get_min_sse, with 'candidates' if
+            top_k was greater than 1.
+
+    Returns:
+        list: The changed selections as returned by Precision.compare_selection.
+    """
+    candidates = precision_candidates(min_sse)
+    names = [name for funcs in candidates.values() for name in funcs]
+    training_df = load_df(session, Trainingdata, cache_dir=CACHE_DIR, dtype=np.float64)
+    ideal_df = load_df(session, ideal_model, cache_dir=CACHE_DIR, columns=ideal_columns(names), dtype=np.float64)
+
+    reference = rescore_candidates(training_df, ideal_df, candidates)
+    changed = compare_selection(create_results_df(min_sse), create_results_df(reference))
+    logging.info(f"Checked the {precision.mode} selection against float64: {len(changed)} changed")
+    return changed
+
+def main(block_size=None, session_factory=None, ideal_schema="wide", use_index=False, incremental=False,
+         verify_incremental=False, verify_index=False):
     """
     Main function to manage the workflow of loading data, calculating minimum SSE, and plotting the results.
+
+    Args:
+        block_size (int, optional): If given, the ideal functions are streamed from the database in blocks of
+            this many columns instead of being loaded as one DataFrame.
+        session_factory (sessionmaker, optional): Session factory to use instead of the module's default database.
+        ideal_schema (str): Storage of the ideal functions, 'wide' or 'long' (see ConfigandImport.IDEAL_MODELS).
+        use_index (bool): If True, the best ideal functions are found with the persistent IdealIndex, which only
+            reads the ideal functions it cannot rule out.
+        incremental (bool): If True, the SSE of every pair is kept in a persisted accumulator that only processes
+            rows and ideal functions appended since the last run (see IncrementalFit). The accumulator needs the whole
+            library, so it cannot be combined with block_size or use_index.
+        verify_incremental (bool): If True, the incremental state is checked against a full recomputation and
+            rebuilt if they differ.
+        verify_index (bool): If True and use_index is set, every ideal function is read and re-embedded in the index
+            if its values changed since it was indexed (see IdealIndex.sync_index).
+
+    In reduced precision (see Precision.PrecisionMode) the full and streaming searches keep
+    PRECISION_CHECK_CANDIDATES candidates per training function and the selection is checked against float64. The
+    index search always runs in float64 (see IdealIndex.get_min_sse_indexed).
+
+    Raises:
+        ValueError: If incremental or verify_incremental is combined with block_size or use_index.
     """
-    with session_scope() as session:  # Ensure transactional scope for database operations
+    if (incremental or verify_incremental) and (block_size or use_index):
+        raise ValueError("The incremental fit cannot be combined with a block size or the index")
+    ideal_model = IDEAL_MODELS[ideal_schema]
+    load_all = not (block_size or use_index)
+    top_k = PRECISION_CHECK_CANDIDATES if precision.checked else 1
+    min_sse = None
+    with session_scope(session_factory) as session:  # Ensure transactional scope for database operations
         # Load data from the database
-        training_df = load_df(session, Trainingdata)
-        ideal_df = load_df(session, Idealfunctions)
-        
+        with metrics.stage("load") as stage:
+            training_df = load_df(session, Trainingdata, cache_dir=CACHE_DIR,
+                                  dtype=np.float64 if use_index else None)
+            if load_all:
+                ideal_df = load_df(session, ideal_model, cache_dir=CACHE_DIR)
+                stage.add_rows(len(ideal_df))
+            stage.add_rows(len(training_df))
+
         # Calculate the minimum SSE between training and ideal functions
-        min_sse = get_min_sse(training_df, ideal_df)
-        
-        # Create a DataFrame of the results and save it to a CSV file
-        best_ideal_df = create_results_df(min_sse)
-        best_ideal_df.to_csv("ideal_vs_training.csv", index=False)
-        
+        with metrics.stage("compute", rows=len(training_df)):
+            if load_all and incremental:
+                from IncrementalFit import fit_incremental, fit_state_file
+                accumulator = fit_incremental(training_df, ideal_df, fit_state_file(session, ideal_model),
+                                              verify=verify_incremental)
+                best_ideal_df = create_results_df(accumulator.min_sse())
+            elif load_all:
+                min_sse = get_min_sse_cached(training_df, ideal_df, ResultCache(), top_k)
+                best_ideal_df = create_results_df(min_sse)
+            elif use_index:
+                from IdealIndex import sync_index, get_min_sse_indexed, fetch_ideal_functions
+                best_ideal_df = create_results_df(get_min_sse_indexed(
+                    training_df, sync_index(session, ideal_model, verify=verify_index),
+                    lambda ids: fetch_ideal_functions(session, ideal_model, ids)))
+            else:
+                min_sse = get_min_sse_streaming(training_df, iter_ideal_blocks(session, ideal_model, block_size),
+                                                top_k)
+                best_ideal_df = create_results_df(min_sse)
+            if not load_all and renderer.enabled:
+                # Only the selected ideal functions are needed for the plot
+                ideal_df = load_df(session, ideal_model, columns=ideal_columns(best_ideal_df["Ideal Function"]))
+
+        if precision.checked and min_sse is not None:
+            with metrics.stage("precision_check"):
+                check_fit_precision(session, ideal_model, min_sse)
+
+        # Save the results to a CSV file
+        with metrics.stage("export", rows=len(best_ideal_df)):
+            best_ideal_df.to_csv("ideal_vs_training.csv", index=False)
+
         # Visualize the results using Bokeh
-        plot_training_vs_ideal_bokeh(training_df, ideal_df, best_ideal_df)
+        if renderer.enabled:
+            with metrics.stage("plot"):
+                from Vizualisationsbokeh import plot_training_vs_ideal_bokeh  # Bokeh is only loaded when plotting
+                renderer.submit(plot_training_vs_ideal_bokeh, training_df, ideal_df, best_ideal_df,
+                                max_points=renderer.max_points)
+    with metrics.stage("render"):
+        renderer.wait()
+    metrics.finish()
 
 if __name__ == "__main__":
-    main()
+    # Set up logging for the script
+    logging.basicConfig(level=logging.INFO)
+    import argparse
+    parser = argparse.ArgumentParser(description="Find the best ideal function for each training function.")
+    parser.add_argument("--block-size", type=int, default=None,
+                        help="Stream the ideal functions in blocks of this many columns")
+    parser.add_argument("--ideal-schema", choices=["wide", "long"], default="wide",
+                        help="Read the ideal functions from the wide table or the long per-function table")
+    parser.add_argument("--index", action="store_true",
+                        help="Search with the persistent ideal function index, reading only unpruned functions")
+    parser.add_argument("--verify-index", action="store_true",
+                        help="Re-read every ideal function and re-embed those whose values changed since indexing")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process rows and ideal functions appended since the last incremental run "
+                             "(not with --block-size or --index)")
+    parser.add_argument("--verify-incremental", action="store_true",
+                        help="Check the incremental state against a full recomputation and rebuild it if they differ")
+    add_metrics_arguments(parser)
+    add_render_arguments(parser)
+    add_precision_arguments(parser)
+    args = parser.parse_args()
+    if (args.incremental or args.verify_incremental) and (args.block_size or args.index):
+        parser.error("--incremental and --verify-incremental cannot be combined with --block-size or --index")
+    configure_metrics_from_args(args)
+    configure_render_from_args(args)
+    configure_precision_from_args(args)
+    main(args.block_size, ideal_schema=args.ideal_schema, use_index=args.index, incremental=args.incremental,
+         verify_incremental=args.verify_incremental, verify_index=args.verify_index)
@@ -0,0 +1,394 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from ConfigandImport import Idealfunctionarrays
+from FindIdealFunctions import load_df, ideal_columns, format_min_sse
+
+# Default location of the index, relative to the working directory like the database itself
+INDEX_DIR = ".ideal_index"
+
+# Lower bounds are relaxed by this fraction of ||a||^2 + ||b||^2 before pruning, to absorb rounding errors
+LOWER_BOUND_SLACK = 1e-9
+
+# Arrays of an index stored as .npy files; the digests are hex SHA-256 strings of the function values
+INDEX_ARRAYS = ["basis", "function_ids", "embeddings", "residual_norms", "digests"]
+DIGEST_DTYPE = "<U64"
+
+# Number of indexed functions sync_index re-reads and compares with their digests to detect a reimport
+SYNC_SAMPLE_FUNCTIONS = 8
+
+
+class IdealIndex:
+    """
+    Index over the ideal function library that finds the exact minimum-SSE ideal function while only reading the
+    values of a short list of candidates.
+
+    Every function b is stored as its projection e_b = Q^T b onto an orthonormal basis Q of a few principal
+    components, plus the norm of the remainder r_b = b - Q e_b. Since the projection and the remainder are
+    orthogonal, ||a - b||^2 = ||e_a - e_b||^2 + ||r_a - r_b||^2 >= ||e_a - e_b||^2 + (||r_a|| - ||r_b||)^2, a lower
+    bound on the SSE computed from dims + 1 numbers per function. Candidates are verified in ascending order of
+    their bound until the bound exceeds the best exact SSE found.
+
+    The basis is fixed once built, so functions added later are embedded without touching the indexed ones. The
+    bounds are only valid for the values a function was embedded with, so every function keeps a digest of them
+    and the index keeps a digest of the x values (see sync_index).
+
+    Attributes:
+        basis (np.ndarray): Orthonormal basis of shape (n_points, dims).
+        function_ids (np.ndarray): Function number N of each indexed function yN.
+        embeddings (np.ndarray): Projection of each indexed function, shape (n_functions, dims).
+        residual_norms (np.ndarray): Norm of the part of each indexed function outside the basis.
+        digests (np.ndarray): Digest of the values of each indexed function, see function_digests.
+        x_digest (str or None): Digest of the x values the functions are defined on.
+        verified (int): Number of ideal function columns read by the last search.
+    """
+
+    def __init__(self, basis, function_ids=None, embeddings=None, residual_norms=None, digests=None,
+                 x_digest=None):
+        """
+        Args:
+            basis (np.ndarray): Orthonormal basis of shape (n_points, dims).
+            function_ids (np.ndarray, optional): Function numbers of already indexed functions.
+            embeddings (np.ndarray, optional): Their projections, shape (n_functions, dims).
+            residual_norms (np.ndarray, optional): Their residual norms.
+            digests (np.ndarray, optional): Digests of their values.
+            x_digest (str, optional): Digest of the x values.
+        """
+        self.basis = basis
+        self.function_ids = np.empty(0, dtype=np.int64) if function_ids is None else function_ids
+        self.embeddings = np.empty((0, basis.shape[1])) if embeddings is None else embeddings
+        self.residual_norms = np.empty(0) if residual_norms is None else residual_norms
+        self.digests = np.empty(0, dtype=DIGEST_DTYPE) if digests is None else digests
+        self.x_digest = x_digest
+        self.verified = 0
+
+    @classmethod
+    def build(cls, ideal_array, function_ids=None, dims=16, sample_size=2048):
+        """
+        Choose the basis from the leading principal directions of the ideal functions and index them.
+
+        Args:
+            ideal_array (np.ndarray): Array of shape (n_points, n_functions) with one ideal function per column.
+            function_ids (array-like, optional): Function number of each column (default is 1, 2, 3, ...).
+            dims (int): Number of basis vectors (default is 16).
+            sample_size (int): Largest number of evenly spaced columns the basis is computed from (default is 2048).
+
+        Returns:
+            IdealIndex: The index.
+        """
+        ideal_array = np.asarray(ideal_array, dtype=float)
+        sample = ideal_array[:, np.linspace(0, ideal_array.shape[1] - 1, min(sample_size, ideal_array.shape[1]),
+                                            dtype=np.intp)]
+        basis = np.linalg.svd(sample, full_matrices=False)[0][:, :min(dims, *sample.shape)]
+        index = cls(np.ascontiguousarray(basis))
+        index.add(ideal_array, function_ids)
+        return index
+
+    def __len__(self):
+        return len(self.function_ids)
+
+    @property
+    def n_points(self):
+        """Number of x values the indexed functions are defined on."""
+        return self.basis.shape[0]
+
+    def embed(self, array):
+        """
+        Project functions onto the basis.
+
+        Args:
+            array (np.ndarray): Array of shape (n_points, n) with one function per column.
+
+        Returns:
+            tuple: (embeddings of shape (n, dims), residual norms of shape (n,)).
+
+        Raises:
+            ValueError: If the functions are not defined on n_points values.
+        """
+        array = np.asarray(array, dtype=float)
+        if array.shape[0] != self.n_points:
+            raise ValueError(f"Functions have {array.shape[0]} points, the index was built on {self.n_points}")
+        embeddings = self.basis.T @ array
+        residual_norms = np.linalg.norm(array - self.basis @ embeddings, axis=0)
+        return embeddings.T, residual_norms
+
+    def add(self, ideal_array, function_ids=None):
+        """
+        Index further ideal functions without changing the basis.
+
+        Args:
+            ideal_array (np.ndarray): Array of shape (n_points, n) with the new functions.
+            function_ids (array-like, optional): Function number of each column (default continues after the
+                highest indexed number).
+        """
+        if function_ids is None:
+            first = int(self.function_ids.max()) + 1 if len(self.function_ids) else 1
+            function_ids = np.arange(first, first + ideal_array.shape[1])
+        embeddings, residual_norms = self.embed(ideal_array)
+        self.function_ids = np.concatenate([self.function_ids, np.asarray(function_ids, dtype=np.int64)])
+        self.embeddings = np.vstack([self.embeddings, embeddings])
+        self.residual_norms = np.concatenate([self.residual_norms, residual_norms])
+        self.digests = np.concatenate([self.digests, function_digests(ideal_array)])
+
+    def remove(self, function_ids):
+        """
+        Drop functions from the index, e.g. before re-adding them with changed values.
+
+        Args:
+            function_ids (array-like): Function numbers to drop; numbers that are not indexed are ignored.
+        """
+        keep = ~np.isin(self.function_ids, np.asarray(function_ids, dtype=np.int64))
+        self.function_ids = self.function_ids[keep]
+        self.embeddings = self.embeddings[keep]
+        self.residual_norms = self.residual_norms[keep]
+        self.digests = self.digests[keep]
+
+    def lower_bounds(self, function):
+        """
+        Calculate a lower bound of the SSE between a function and every indexed ideal function.
+
+        Args:
+            function (np.ndarray): Values of one function on the ideal x grid.
+
+        Returns:
+            np.ndarray: One lower bound per indexed function.
+        """
+        (embedding,), (residual_norm,) = self.embed(np.asarray(function, dtype=float)[:, None])
+        projected = np.einsum("ij,ij->i", self.embeddings - embedding, self.embeddings - embedding)
+        return projected + (self.residual_norms - residual_norm) ** 2
+
+    def search(self, training_array, fetch, top_k=1, batch_size=64):
+        """
+        Find the k ideal functions with the lowest SSE for each training function.
+
+        Ties are resolved in favour of the lower function number, as in FindIdealFunctions.top_k_sse.
+
+        Args:
+            training_array (np.ndarray): Array of shape (n_points, n_training) with the training functions.
+            fetch (callable): Returns the values of the given function numbers as an array of shape
+                (n_points, len(function_ids)); only called for candidates that cannot be pruned.
+            top_k (int): Number of candidates to return per training function (default is 1).
+            batch_size (int): Number of candidates verified per fetch (default is 64).
+
+        Returns:
+            tuple: (sse, function_ids), both of shape (n_training, k) and sorted by ascending SSE.
+
+        Raises:
+            ValueError: If the training functions are not defined on the n_points values of the index.
+        """
+        training_array = np.asarray(training_array, dtype=float)
+        k = min(top_k, len(self))
+        best_sse = np.empty((training_array.shape[1], k))
+        best_ids = np.empty((training_array.shape[1], k), dtype=np.int64)
+        fetched = {}
+        if k == 0:
+            return best_sse, best_ids
+        norms_sq = np.einsum("ij,ij->i", self.embeddings, self.embeddings) + self.residual_norms ** 2
+
+        for j in range(training_array.shape[1]):
+            function = training_array[:, j]
+            slack = LOWER_BOUND_SLACK * (function @ function + norms_sq)
+            bounds = self.lower_bounds(function) - slack
+            order = np.lexsort((self.function_ids, bounds))
+            candidate_sse, candidate_ids = [], []
+
+            for start in range(0, len(order), batch_size):
+                positions = order[start:start + batch_size]
+                if len(candidate_sse) >= k:
+                    kth_best = np.partition(candidate_sse, k - 1)[k - 1]
+                    positions = positions[bounds[positions] <= kth_best]
+                    if not len(positions):
+                        break
+                ids = self.function_ids[positions]
+                missing = [function_id for function_id in ids.tolist() if function_id not in fetched]
+                if missing:
+                    fetched.update(zip(missing, fetch(missing).T))
+                values = np.column_stack([fetched[function_id] for function_id in ids.tolist()])
+                candidate_sse.extend(np.sum((function[:, None] - values) ** 2, axis=0).tolist())
+                candidate_ids.extend(ids.tolist())
+
+            candidate_sse, candidate_ids = np.array(candidate_sse), np.array(candidate_ids, dtype=np.int64)
+            ranked = np.lexsort((candidate_ids, candidate_sse))[:k]
+            best_sse[j], best_ids[j] = candidate_sse[ranked], candidate_ids[ranked]
+
+        self.verified = len(fetched)
+        logging.info(f"Verified {self.verified} of {len(self)} ideal functions")
+        return best_sse, best_ids
+
+    def save(self, directory=INDEX_DIR):
+        """
+        Write the index to a directory of .npy files and a manifest.
+
+        Args:
+            directory (str): Destination directory (default is INDEX_DIR).
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "manifest.json"), "w") as handle:
+            json.dump({"n_points": self.n_points, "dims": self.basis.shape[1], "functions": len(self),
+                       "x_digest": self.x_digest}, handle)
+
+    @classmethod
+    def load(cls, directory=INDEX_DIR):
+        """
+        Read an index written by save().
+
+        Args:
+            directory (str): Directory of the index (default is INDEX_DIR).
+
+        Returns:
+            IdealIndex or None: The index, or None if the directory holds no complete index.
+        """
+        try:
+            with open(os.path.join(directory, "manifest.json")) as handle:
+                manifest = json.load(handle)
+            arrays = {name: np.load(os.path.join(directory, f"{name}.npy")) for name in INDEX_ARRAYS}
+        except (OSError, ValueError):
+            return None
+        if manifest.get("n_points") != arrays["basis"].shape[0] \
+                or not len(arrays["function_ids"]) == len(arrays["digests"]) == manifest["functions"]:
+            return None
+        return cls(**arrays, x_digest=manifest.get("x_digest"))
+
+
+def function_digests(ideal_array):
+    """
+    Compute a SHA-256 of the float64 values of each function.
+
+    Args:
+        ideal_array (np.ndarray): Array of shape (n_points, n) with one function per column.
+
+    Returns:
+        np.ndarray: One hex digest per column.
+    """
+    ideal_array = np.asarray(ideal_array, dtype=float)
+    return np.array([hashlib.sha256(np.ascontiguousarray(ideal_array[:, i]).tobytes()).hexdigest()
+                     for i in range(ideal_array.shape[1])], dtype=DIGEST_DTYPE)
+
+
+def ideal_function_ids(session, model):
+    """
+    List the function numbers N of the ideal functions yN stored in a table.
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+        model (Base): Idealfunctions or Idealfunctionarrays.
+
+    Returns:
+        list: The function numbers in ascending order.
+    """
+    if issubclass(model, Idealfunctionarrays):
+        return list(model.function_ids(session))
+    return sorted(Idealfunctionarrays.function_id_of(column.name) for column in model.__table__.columns
+                  if column.name != "x")
+
+
+def fetch_ideal_functions(session, model, function_ids):
+    """
+    Read the values of selected ideal functions from the database, in float64 whatever the configured precision.
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+        model (Base): Idealfunctions or Idealfunctionarrays.
+        function_ids (list): Function numbers N of the ideal functions yN to read.
+
+    Returns:
+        np.ndarray: Array of shape (n_points, len(function_ids)) in the order of function_ids.
+    """
+    names = [f"y{function_id}" for function_id in function_ids]
+    ideal_df = load_df(session, model, columns=ideal_columns(names), dtype=np.float64)
+    return ideal_df[[f"{name} (ideal func)" for name in names]].to_numpy(dtype=float)
+
+
+def sync_index(session, model, directory=INDEX_DIR, dims=16, block_size=4096, verify=False):
+    """
+    Load the index from disk and bring it up to date with the ideal functions in the database, or build it if missing.
+
+    Only functions missing from the index are read and embedded, and deleted ones are dropped. Two cheap checks
+    catch a reimport: if the x values changed, e.g. after importing a different ideal.csv, the index is rebuilt,
+    and if any of SYNC_SAMPLE_FUNCTIONS evenly spaced indexed functions changed, all functions are compared with
+    their digests. A function rewritten in place that is not sampled is only found with verify, which reads all
+    functions. Each table has its own index in a subdirectory named after it.
+
+    Args:
+        session (Session): Active SQLAlchemy session to interact with the database.
+        model (Base): Idealfunctions or Idealfunctionarrays.
+        directory (str): Parent directory of the index (default is INDEX_DIR).
+        dims (int): Number of basis vectors of a new index (default is 16).
+        block_size (int): Number of functions read from the database at a time (default is 4096).
+        verify (bool): If True, every function is read and re-embedded if its values changed (default is False).
+
+    Returns:
+        IdealIndex or None: The up-to-date index, or None if there are no ideal functions.
+    """
+    directory = os.path.join(directory, model.__tablename__)
+    index = IdealIndex.load(directory)
+    function_ids = ideal_function_ids(session, model)
+    x_digest = str(function_digests(load_df(session, model, columns=["x"])[["x"]].to_numpy(dtype=float))[0])
+    if index is not None and index.x_digest != x_digest:
+        logging.info("The x values of the ideal functions changed; rebuilding the index")
+        index = None
+    indexed = dict(zip(index.function_ids.tolist(), index.digests.tolist())) if index is not None else {}
+
+    if indexed and not verify:
+        existing = [function_id for function_id in function_ids if function_id in indexed]
+        sample = [existing[i] for i in np.unique(np.linspace(0, len(existing) - 1, SYNC_SAMPLE_FUNCTIONS,
+                                                             dtype=np.intp))] if existing else []
+        if sample and function_digests(fetch_ideal_functions(session, model, sample)).tolist() != \
+                [indexed[function_id] for function_id in sample]:
+            logging.info("Sampled ideal functions changed since they were indexed; checking all of them")
+            verify = True
+    candidates = function_ids if verify else [function_id for function_id in function_ids
+                                              if function_id not in indexed]
+
+    updated = 0
+    for start in range(0, len(candidates), block_size):
+        block_ids = candidates[start:start + block_size]
+        block = fetch_ideal_functions(session, model, block_ids)
+        digests = function_digests(block)
+        stale = [i for i, (function_id, digest) in enumerate(zip(block_ids, digests))
+                 if indexed.get(function_id) != digest]
+        if not stale:
+            continue
+        stale_ids = [block_ids[i] for i in stale]
+        if index is None:
+            index = IdealIndex.build(block[:, stale], stale_ids, dims)
+        else:
+            index.remove(stale_ids)
+            index.add(block[:, stale], stale_ids)
+        updated += len(stale)
+
+    deleted = set(indexed) - set(function_ids)
+    if index is not None and deleted:
+        index.remove(sorted(deleted))
+    if index is not None and (updated or deleted or index.x_digest != x_digest):
+        index.x_digest = x_digest
+        index.save(directory)
+        logging.info(f"Indexed {updated} new or changed and dropped {len(deleted)} deleted ideal functions "
+                     f"({len(index)} in total)")
+    return index if index is not None and len(index) else None
+
+
+def get_min_sse_indexed(training_df, index, fetch, top_k=1):
+    """
+    Calculate the minimum SSE like get_min_sse, reading only the ideal functions the index cannot rule out.
+
+    The search always runs in float64, as the lower bounds prune with a slack (LOWER_BOUND_SLACK) far below the
+    rounding error of float32, and only the few verified functions are read, so a reduced precision mode would save
+    little. Its selection therefore needs no check against float64.
+
+    Args:
+        training_df (pd.DataFrame): DataFrame containing the training functions (y1 to y4).
+        index (IdealIndex): Index over the ideal functions.
+        fetch (callable): Returns the values of the given function numbers, see IdealIndex.search.
+        top_k (int): Number of best candidates to keep per training function (default is 1).
+
+    Returns:
+        dict: The same structure as returned by get_min_sse.
+    """
+    training_array = training_df.iloc[:, 1:5].to_numpy(dtype=np.float64)
+    best_sse, best_ids = index.search(training_array, fetch, top_k)
+    return format_min_sse(best_sse, best_ids - 1, top_k)  # format_min_sse names index i as y{i + 1}
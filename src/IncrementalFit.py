@@ -0,0 +1,295 @@
+import os
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+# Directory of the accumulator states, one file per database and ideal function table, relative to the working
+# directory like the database itself
+FIT_STATE_DIR = ".fit_state"
+
+# Number of evenly spaced accumulated rows hashed into the signature of the state, see FitAccumulator.signature
+SIGNATURE_SAMPLE_ROWS = 16
+
+
+class FitAccumulator:
+    """
+    Running SSE and maximum deviation of every (training function, ideal function) pair, updated as rows or ideal
+    functions are appended instead of recomputing everything.
+
+    Both quantities decompose over rows: the SSE is a sum and the maximum deviation a maximum of per-row terms,
+    so appended x rows only add their own terms, and an appended ideal function only needs its own column.
+    Rows are identified by their x value; rows present in both the training data and the ideal functions count.
+    A signature of a sample of the accumulated values detects rows that were reimported since (see update).
+
+    Attributes:
+        training_funcs (list): Training function names, e.g. 'y1'.
+        ideal_funcs (list): Ideal function names in the order they were added, e.g. 'y42'.
+        x (np.ndarray): x values of the accumulated rows.
+        sse (np.ndarray): SSE of each pair, shape (n_training, n_ideal).
+        max_dev (np.ndarray): Maximum deviation |training - ideal| * sqrt(2) of each pair, shape (n_training, n_ideal).
+        signature (str or None): Signature of the training and ideal values the state was accumulated from.
+    """
+
+    def __init__(self, training_funcs=(), ideal_funcs=(), x=None, sse=None, max_dev=None, signature=None):
+        self.training_funcs = list(training_funcs)
+        self.ideal_funcs = list(ideal_funcs)
+        self.x = np.empty(0) if x is None else x
+        shape = (len(self.training_funcs), len(self.ideal_funcs))
+        self.sse = np.zeros(shape) if sse is None else sse
+        self.max_dev = np.full(shape, np.nan) if max_dev is None else max_dev
+        self.signature = signature
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an accumulator written by save().
+
+        Args:
+            path (str): Path of the state file, see fit_state_file.
+
+        Returns:
+            FitAccumulator or None: The accumulator, or None if the file is missing or unreadable.
+        """
+        try:
+            with np.load(path) as state:
+                return cls(state["training_funcs"].tolist(), state["ideal_funcs"].tolist(), state["x"], state["sse"],
+                           state["max_dev"], str(state["signature"]))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def save(self, path):
+        """
+        Write the accumulator state; the file is replaced atomically.
+
+        Args:
+            path (str): Path of the state file, see fit_state_file.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as handle:
+            np.savez(handle, training_funcs=np.array(self.training_funcs, dtype=str),
+                     ideal_funcs=np.array(self.ideal_funcs, dtype=str), x=self.x, sse=self.sse, max_dev=self.max_dev,
+                     signature=np.array(self.signature or "", dtype=str))
+        os.replace(path + ".tmp", path)
+
+    def _accumulated_values(self, training_df, ideal_df, x=None):
+        """Return the values at rows x (default is the accumulated rows) and functions, or None if some are gone."""
+        x = self.x if x is None else x
+        ideal_names = {column.split(" ")[0]: column for column in ideal_df.columns[1:]}
+        training_positions = pd.Index(training_df["x"].values).get_indexer(x)
+        ideal_positions = pd.Index(ideal_df["x"].values).get_indexer(x)
+        if (training_positions < 0).any() or (ideal_positions < 0).any() \
+                or any(name not in ideal_names for name in self.ideal_funcs):
+            return None
+        columns = [ideal_names[name] for name in self.ideal_funcs]
+        return (training_df.iloc[training_positions, 1:].values.astype(float),
+                ideal_df[columns].values[ideal_positions].astype(float, copy=False))
+
+    def content_signature(self, training_df, ideal_df):
+        """
+        Compute a SHA-256 of the number of accumulated rows and of the values SIGNATURE_SAMPLE_ROWS evenly spaced
+        accumulated rows have in the given data.
+
+        The cost does not grow with the number of accumulated rows. A reimport changes the sampled values; a
+        single row changed in place may not, which verify detects.
+
+        Args:
+            training_df (pd.DataFrame): DataFrame with 'x' and the training functions.
+            ideal_df (pd.DataFrame): DataFrame with 'x' and the ideal functions.
+
+        Returns:
+            str or None: The hex digest, or None if sampled rows or accumulated functions are missing from the data.
+        """
+        sample = self.x[np.unique(np.linspace(0, len(self.x) - 1, SIGNATURE_SAMPLE_ROWS, dtype=np.intp))] \
+            if len(self.x) else self.x
+        values = self._accumulated_values(training_df, ideal_df, sample)
+        if values is None:
+            return None
+        digest = hashlib.sha256(np.array([len(self.x)], dtype=np.int64).tobytes())
+        digest.update(np.asarray(sample, dtype=float).tobytes())
+        for array in values:
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _pair_terms(training_array, ideal_array):
+        """Return the SSE and maximum deviation contributed by some rows, each of shape (n_training, n_ideal)."""
+        sse = np.empty((training_array.shape[1], ideal_array.shape[1]))
+        max_dev = np.empty_like(sse)
+        for j in range(training_array.shape[1]):  # One training function at a time keeps memory at rows x ideal
+            deviations = np.abs(ideal_array - training_array[:, j:j + 1])
+            sse[j] = np.einsum("ij,ij->j", deviations, deviations)
+            max_dev[j] = np.fmax.reduce(deviations, axis=0, initial=np.nan) * np.sqrt(2)
+        return sse, max_dev
+
+    def add_functions(self, names, training_array, ideal_array):
+        """
+        Add ideal functions, given at the accumulated rows.
+
+        Args:
+            names (list): Names of the new ideal functions.
+            training_array (np.ndarray): Training functions at the rows in self.x, shape (n_rows, n_training).
+            ideal_array (np.ndarray): New ideal functions at the rows in self.x, shape (n_rows, len(names)).
+        """
+        sse, max_dev = self._pair_terms(training_array, ideal_array)
+        self.ideal_funcs += list(names)
+        self.sse = np.hstack([self.sse, sse])
+        self.max_dev = np.hstack([self.max_dev, max_dev])
+
+    def add_rows(self, x, training_array, ideal_array):
+        """
+        Add rows for all known functions.
+
+        Args:
+            x (np.ndarray): x values of the new rows.
+            training_array (np.ndarray): Training functions at the new rows, shape (n_rows, n_training).
+            ideal_array (np.ndarray): All known ideal functions at the new rows, in the order of self.ideal_funcs.
+        """
+        sse, max_dev = self._pair_terms(training_array, ideal_array)
+        self.x = np.concatenate([self.x, x])
+        self.sse += sse
+        self.max_dev = np.fmax(self.max_dev, max_dev)
+
+    def update(self, training_df, ideal_df):
+        """
+        Bring the accumulator up to date with the current data, computing only the appended rows and functions.
+
+        A different set of training functions, or sampled accumulated rows whose values differ from the ones they
+        were accumulated with (e.g. after a reimport, see content_signature), start the accumulation from scratch.
+
+        Args:
+            training_df (pd.DataFrame): DataFrame with 'x' and the training functions ('y1 (training func)', ...).
+            ideal_df (pd.DataFrame): DataFrame with 'x' and the ideal functions ('y1 (ideal func)', ...).
+
+        Returns:
+            tuple: (number of new rows, number of new ideal functions).
+        """
+        training_funcs = [column.split(" ")[0] for column in training_df.columns[1:]]
+        if training_funcs == self.training_funcs and self.content_signature(training_df, ideal_df) != self.signature:
+            logging.warning("Accumulated rows changed since the last run; starting the accumulation from scratch")
+            self.__init__(training_funcs)
+        elif training_funcs != self.training_funcs:
+            self.__init__(training_funcs)
+        ideal_names = {column.split(" ")[0]: column for column in ideal_df.columns[1:]}
+        known_funcs = set(self.ideal_funcs)
+        new_funcs = [name for name in ideal_names if name not in known_funcs]
+
+        training_rows = pd.Index(training_df["x"].values)
+        ideal_rows = pd.Index(ideal_df["x"].values)
+        if new_funcs and len(self.x):
+            new_columns = [ideal_names[name] for name in new_funcs]
+            self.add_functions(new_funcs,
+                               training_df.iloc[training_rows.get_indexer(self.x), 1:].values.astype(float),
+                               ideal_df[new_columns].values[ideal_rows.get_indexer(self.x)])
+        elif new_funcs:
+            self.add_functions(new_funcs, np.empty((0, len(training_funcs))), np.empty((0, len(new_funcs))))
+
+        # Rows in both tables that have not been accumulated yet
+        ideal_positions = ideal_rows.get_indexer(training_df["x"].values)
+        new_rows = (ideal_positions >= 0) & ~np.isin(training_df["x"].values, self.x)
+        if new_rows.any():
+            columns = [ideal_names[name] for name in self.ideal_funcs]
+            self.add_rows(training_df["x"].values[new_rows], training_df.iloc[:, 1:].values[new_rows].astype(float),
+                          ideal_df[columns].values[ideal_positions[new_rows]])
+        self.signature = self.content_signature(training_df, ideal_df)
+        return int(new_rows.sum()), len(new_funcs)
+
+    def min_sse(self):
+        """
+        Select the ideal function with the lowest SSE for each training function.
+
+        Returns:
+            dict: The same structure as returned by FindIdealFunctions.get_min_sse.
+        """
+        min_sse = {}
+        for j, func in enumerate(self.training_funcs):
+            if not self.ideal_funcs:
+                min_sse[func] = {"ideal_func": None, "min_sse": float("inf")}
+                continue
+            best = int(np.argmin(self.sse[j]))
+            min_sse[func] = {"ideal_func": self.ideal_funcs[best], "min_sse": self.sse[j, best]}
+        return min_sse
+
+    def max_deviations(self, training_funcs, ideal_funcs):
+        """
+        Look up the maximum deviations of the given pairs.
+
+        Args:
+            training_funcs (list): List of training function names.
+            ideal_funcs (list): List of ideal function names.
+
+        Returns:
+            dict: The same structure as returned by EvaluateTestData.calculate_max_deviations.
+        """
+        max_devs = {}
+        for train_func, ideal_func in zip(training_funcs, ideal_funcs):
+            if train_func in self.training_funcs and ideal_func in self.ideal_funcs:
+                max_devs[ideal_func] = self.max_dev[self.training_funcs.index(train_func),
+                                                    self.ideal_funcs.index(ideal_func)]
+            else:
+                logging.warning(f"Missing columns for {train_func} or {ideal_func}.")
+        return max_devs
+
+    def verify(self, training_df, ideal_df, rtol=1e-9):
+        """
+        Check the accumulated state against a full recomputation over the accumulated rows.
+
+        Args:
+            training_df (pd.DataFrame): DataFrame with 'x' and the training functions.
+            ideal_df (pd.DataFrame): DataFrame with 'x' and the ideal functions.
+            rtol (float): Accepted relative difference of the SSE values (default is 1e-9).
+
+        Returns:
+            bool: True if the SSE and maximum deviations match.
+        """
+        values = self._accumulated_values(training_df, ideal_df)
+        if values is None:
+            return False
+        sse, max_dev = self._pair_terms(*values)
+        return bool(np.allclose(self.sse, sse, rtol=rtol, atol=0)
+                    and np.allclose(self.max_dev, max_dev, rtol=rtol, atol=0, equal_nan=True))
+
+
+def fit_state_file(session, ideal_model, directory=FIT_STATE_DIR):
+    """
+    Return the path of the accumulator state of a database and ideal function table.
+
+    Args:
+        session (Session): Active SQLAlchemy session of the database.
+        ideal_model (Base): Idealfunctions or Idealfunctionarrays.
+        directory (str): Directory of the states (default is FIT_STATE_DIR).
+
+    Returns:
+        str: The path, named after the table and a hash of the absolute database path.
+    """
+    database = session.bind.url.database or ":memory:"
+    if database != ":memory:":
+        database = os.path.abspath(database)
+    key = hashlib.sha256(database.encode()).hexdigest()[:16]
+    return os.path.join(directory, f"{ideal_model.__tablename__}_{key}.npz")
+
+
+def fit_incremental(training_df, ideal_df, state_file, verify=False):
+    """
+    Update the persisted accumulator with the appended rows and ideal functions and save it again.
+
+    Args:
+        training_df (pd.DataFrame): DataFrame with 'x' and the training functions.
+        ideal_df (pd.DataFrame): DataFrame with 'x' and the ideal functions.
+        state_file (str): Path of the accumulator state, see fit_state_file.
+        verify (bool): Check the result against a full recomputation and rebuild the state if they differ,
+            e.g. after rows were changed in place.
+
+    Returns:
+        FitAccumulator: The up-to-date accumulator; see min_sse() and max_deviations().
+    """
+    accumulator = FitAccumulator.load(state_file) or FitAccumulator()
+    new_rows, new_funcs = accumulator.update(training_df, ideal_df)
+    logging.info(f"Accumulated {new_rows} new rows and {new_funcs} new ideal functions "
+                 f"({len(accumulator.x)} rows, {len(accumulator.ideal_funcs)} ideal functions in total)")
+    if verify and not accumulator.verify(training_df, ideal_df):
+        logging.warning("Accumulated fit state differs from a full recomputation; rebuilding it")
+        accumulator = FitAccumulator()
+        accumulator.update(training_df, ideal_df)
+    accumulator.save(state_file)
+    return accumulator
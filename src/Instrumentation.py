@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import logging
+import cProfile
+import tracemalloc
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident set size of the current process.
+
+    Returns:
+        int or None: Peak RSS in bytes, or None if the platform does not report it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes, macOS bytes
+
+
+class _NullStage:
+    """Stage returned while metrics are disabled; every operation is a no-op."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_rows(self, rows):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Measures one pipeline stage: wall time, row count, peak RSS and optional cProfile/tracemalloc data."""
+
+    def __init__(self, metrics, name, rows):
+        self.metrics = metrics
+        self.name = name
+        self.rows = rows
+        self.profiler = None
+
+    def add_rows(self, rows):
+        """Add to the number of rows processed by the stage."""
+        self.rows = (self.rows or 0) + rows
+
+    def __enter__(self):
+        if "tracemalloc" in self.metrics.profile:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        if "cprofile" in self.metrics.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start_time
+        record = {"stage": self.name, "seconds": seconds, "rows": self.rows, "peak_rss_bytes": peak_rss_bytes(),
+                  "failed": exc_type is not None}
+        if self.profiler is not None:
+            self.profiler.disable()
+            os.makedirs(self.metrics.profile_dir, exist_ok=True)
+            record["profile_file"] = os.path.join(self.metrics.profile_dir, f"{self.name}.prof")
+            self.profiler.dump_stats(record["profile_file"])
+        if "tracemalloc" in self.metrics.profile and tracemalloc.is_tracing():
+            record["tracemalloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        self.metrics.record(record)
+        return False
+
+
+class Metrics:
+    """
+    Collects per-stage metrics of a pipeline run and writes them as structured logs and a Prometheus text file.
+
+    While disabled, stage() returns a shared no-op object, so instrumented code pays only for one attribute check.
+
+    Attributes:
+        enabled (bool): Whether stages are measured.
+        prometheus_file (str or None): Path the Prometheus text output is written to by finish().
+        profile (set): Optional profilers to run per stage: 'cprofile' and/or 'tracemalloc'.
+        profile_dir (str): Directory for the cProfile output files.
+        records (list): One dictionary per measured stage.
+    """
+
+    def __init__(self, enabled=False, prometheus_file=None, profile=(), profile_dir="profiles"):
+        self.configure(enabled, prometheus_file, profile, profile_dir)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create the metrics from the environment.
+
+        IDEAL_METRICS=1 enables the measurements, IDEAL_METRICS_FILE sets the Prometheus output file,
+        IDEAL_PROFILE takes a comma-separated list of 'cprofile' and 'tracemalloc' and IDEAL_PROFILE_DIR the
+        directory for the cProfile files.
+
+        Returns:
+            Metrics: The configured metrics.
+        """
+        return cls(enabled=os.environ.get("IDEAL_METRICS", "") not in ("", "0"),
+                   prometheus_file=os.environ.get("IDEAL_METRICS_FILE"),
+                   profile=[name for name in os.environ.get("IDEAL_PROFILE", "").split(",") if name],
+                   profile_dir=os.environ.get("IDEAL_PROFILE_DIR", "profiles"))
+
+    def configure(self, enabled=True, prometheus_file=None, profile=(), profile_dir="profiles"):
+        """
+        Enable or disable the measurements, e.g. from a command line flag.
+
+        Args:
+            enabled (bool): Whether stages are measured.
+            prometheus_file (str, optional): Path the Prometheus text output is written to by finish().
+            profile (iterable): Optional profilers to run per stage: 'cprofile' and/or 'tracemalloc'.
+            profile_dir (str): Directory for the cProfile output files.
+        """
+        self.enabled = enabled
+        self.prometheus_file = prometheus_file
+        self.profile = {name.strip().lower() for name in profile}
+        self.profile_dir = profile_dir
+        self.records = []
+
+    def stage(self, name, rows=None):
+        """
+        Measure a block of code as a named stage.
+
+        Args:
+            name (str): Stage name, e.g. 'load', 'compute', 'db_export' or 'plot'.
+            rows (int, optional): Number of rows processed; can also be added inside the block with add_rows().
+
+        Returns:
+            A context manager.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, rows)
+
+    def record(self, record):
+        """Store a stage record and emit it as a structured log line."""
+        self.records.append(record)
+        logging.info(f"metrics {json.dumps(record)}")
+
+    def prometheus_text(self):
+        """
+        Format the collected stages in the Prometheus text exposition format.
+
+        Repeated stages are summed (seconds, rows) or maximised (memory).
+
+        Returns:
+            str: The metrics text.
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {"seconds": 0.0, "rows": 0, "count": 0, "tracemalloc": None})
+            total["seconds"] += record["seconds"]
+            total["rows"] += record["rows"] or 0
+            total["count"] += 1
+            if record.get("tracemalloc_peak_bytes") is not None:
+                total["tracemalloc"] = max(total["tracemalloc"] or 0, record["tracemalloc_peak_bytes"])
+
+        lines = ["# HELP pipeline_stage_seconds Wall time spent in a pipeline stage.",
+                 "# TYPE pipeline_stage_seconds gauge"]
+        lines += [f'pipeline_stage_seconds{{stage="{stage}"}} {total["seconds"]:.6f}' for stage, total in totals.items()]
+        lines += ["# HELP pipeline_stage_rows Rows processed by a pipeline stage.",
+                  "# TYPE pipeline_stage_rows gauge"]
+        lines += [f'pipeline_stage_rows{{stage="{stage}"}} {total["rows"]}' for stage, total in totals.items()]
+        lines += ["# HELP pipeline_stage_runs Number of times a pipeline stage ran.",
+                  "# TYPE pipeline_stage_runs gauge"]
+        lines += [f'pipeline_stage_runs{{stage="{stage}"}} {total["count"]}' for stage, total in totals.items()]
+        traced = {stage: total["tracemalloc"] for stage, total in totals.items() if total["tracemalloc"] is not None}
+        if traced:
+            lines += ["# HELP pipeline_stage_tracemalloc_peak_bytes Peak Python allocations during a stage.",
+                      "# TYPE pipeline_stage_tracemalloc_peak_bytes gauge"]
+            lines += [f'pipeline_stage_tracemalloc_peak_bytes{{stage="{stage}"}} {peak}' for stage, peak in traced.items()]
+        rss = peak_rss_bytes()
+        if rss is not None:
+            lines += ["# HELP pipeline_peak_rss_bytes Peak resident set size of the process.",
+                      "# TYPE pipeline_peak_rss_bytes gauge", f"pipeline_peak_rss_bytes {rss}"]
+        return "\n".join(lines) + "\n"
+
+    def finish(self):
+        """Write the Prometheus text file if metrics are enabled and a file is configured."""
+        if self.enabled and self.prometheus_file:
+            with open(self.prometheus_file, "w") as handle:
+                handle.write(self.prometheus_text())
+            logging.info(f"Metrics written to {self.prometheus_file}")
+
+
+# Process-wide metrics used by the pipeline modules
+metrics = Metrics.from_env()
+
+
+def add_metrics_arguments(parser):
+    """
+    Add the --metrics, --metrics-file and --profile options to an argparse parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser of an entry point.
+    """
+    parser.add_argument("--metrics", action="store_true", help="Measure per-stage time, rows and memory")
+    parser.add_argument("--metrics-file", default=None, help="Write the metrics in Prometheus text format")
+    parser.add_argument("--profile", nargs="+", choices=["cprofile", "tracemalloc"], default=[],
+                        help="Profilers to run around every stage (implies --metrics)")
+
+
+def configure_metrics_from_args(args):
+    """
+    Enable the process-wide metrics if requested on the command line; environment settings are kept otherwise.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments of a parser set up with add_metrics_arguments.
+    """
+    if args.metrics or args.metrics_file or args.profile:
+        metrics.configure(True, args.metrics_file or metrics.prometheus_file, args.profile or metrics.profile,
+                          metrics.profile_dir)
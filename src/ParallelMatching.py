@@ -0,0 +1,124 @@
+import os
+import tempfile
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from Precision import precision
+from EvaluateTestData import XIndex, compute_matches, max_deviation_array, threshold_deviations, assemble_results
+
+# Memory-mapped arrays of the current worker process, set up once by _init_worker
+_shared = {}
+
+
+def _init_worker(directory, lookup, tolerance, max_deviation):
+    """
+    Attach a worker process to the memory-mapped input and output arrays.
+
+    Args:
+        directory (str): Directory holding the .npy files written by compute_matches_parallel.
+        lookup (str): Lookup mode for test x values, see XIndex.resolve.
+        tolerance (float): x tolerance for the 'exact' lookup mode.
+        max_deviation (np.ndarray): Threshold of each ideal function, see max_deviation_array.
+    """
+    def attach(name, mode="r"):
+        return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+
+    _shared.update(
+        x_index=XIndex(attach("ideal_x")),
+        ideal_values=attach("ideal_values"),
+        test_x=attach("test_x"),
+        test_y=attach("test_y"),
+        delta_y=attach("delta_y", "r+"),
+        within_threshold=attach("within_threshold", "r+"),
+        found=attach("found", "r+"),
+        lookup=lookup,
+        tolerance=tolerance,
+        max_deviation=max_deviation,
+    )
+
+
+def _match_shard(start, stop):
+    """
+    Resolve the ideal function values of the test points in rows start to stop, compare their deviations with the
+    thresholds and write the deviations and decisions to the outputs.
+
+    Args:
+        start (int): First test row of the shard.
+        stop (int): Test row after the last one of the shard.
+
+    Returns:
+        int: Number of test points processed.
+    """
+    ideal_y, found = _shared["x_index"].resolve(_shared["test_x"][start:stop], _shared["ideal_values"],
+                                                mode=_shared["lookup"], tolerance=_shared["tolerance"])
+    delta_y, within_threshold = threshold_deviations(_shared["test_y"][start:stop], ideal_y, _shared["max_deviation"])
+    _shared["delta_y"][start:stop] = delta_y
+    _shared["within_threshold"][start:stop] = within_threshold
+    _shared["found"][start:stop] = found
+    return stop - start
+
+
+def compute_matches_parallel(test_data_df, ideal_functions_df, max_devs, ideal_funcs, lookup="exact", tolerance=0.0,
+                             workers=None, shard_size=100000, tmp_dir=None, dtype=None):
+    """
+    Compute the same results as compute_matches, with the test points sharded across a process pool.
+
+    The ideal functions and test points are written once to memory-mapped .npy files that every worker maps,
+    so tasks only carry their row range. Workers resolve the ideal function values, compute the deviations and
+    threshold decisions of their shard and write them into shared output arrays at the rows of the shard, which
+    keeps the results ordered by test ID regardless of completion order. The parent only lays out the results.
+
+    Args:
+        test_data_df (pd.DataFrame): DataFrame containing test data with 'ID', 'x' and 'y' columns.
+        ideal_functions_df (pd.DataFrame): DataFrame containing ideal functions.
+        max_devs (dict): Dictionary containing the maximum deviations for each ideal function.
+        ideal_funcs (list): List of ideal function names.
+        lookup (str): Lookup mode for test x values, see XIndex.resolve (default is 'exact').
+        tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+        workers (int, optional): Number of worker processes (default is the number of CPUs).
+        shard_size (int): Number of test points per task (default is 100000).
+        tmp_dir (str, optional): Directory for the memory-mapped files, e.g. a tmpfs mount.
+        dtype (type, optional): Floating point type of the y values and deviations (default is the configured
+            precision); the memory-mapped files are written in it.
+
+    Returns:
+        pd.DataFrame: One row per (test point, ideal function) pair, ordered by test point.
+    """
+    workers = workers or os.cpu_count()
+    dtype = precision.dtype if dtype is None else dtype
+    if workers <= 1 or len(test_data_df) <= shard_size:
+        return compute_matches(test_data_df, ideal_functions_df, max_devs, ideal_funcs, lookup, tolerance, dtype=dtype)
+
+    funcs = [func for func in ideal_funcs if f"{func} (ideal func)" in ideal_functions_df.columns]
+    max_deviation = max_deviation_array(max_devs, funcs)
+    n_tests = len(test_data_df)
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+        def create(name, array=None, dtype=float, shape=None):
+            path = os.path.join(directory, f"{name}.npy")
+            if array is not None:
+                np.save(path, np.ascontiguousarray(array, dtype=dtype))
+                return None
+            return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+        create("ideal_x", ideal_functions_df["x"].values)
+        create("ideal_values", ideal_functions_df[[f"{func} (ideal func)" for func in funcs]].values, dtype=dtype)
+        create("test_x", test_data_df["x"].values)
+        create("test_y", test_data_df["y"].values, dtype=dtype)
+        delta_y = create("delta_y", dtype=dtype, shape=(n_tests, len(funcs)))
+        within_threshold = create("within_threshold", dtype=bool, shape=(n_tests, len(funcs)))
+        found = create("found", dtype=bool, shape=(n_tests,))
+
+        shards = [(start, min(start + shard_size, n_tests)) for start in range(0, n_tests, shard_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(directory, lookup, tolerance, max_deviation)) as executor:
+            processed = sum(executor.map(_match_shard, *zip(*shards)))
+        logging.info(f"Matched {processed} test points in {len(shards)} shards on {workers} workers")
+
+        found = np.array(found)  # Copy out of the memory maps before the files are removed
+        delta_y = np.array(delta_y[found])
+        within_threshold = np.array(within_threshold[found])
+
+    return assemble_results(test_data_df["ID"].values[found], test_data_df["x"].values[found],
+                            test_data_df["y"].to_numpy(dtype=dtype)[found], delta_y, within_threshold, funcs,
+                            max_deviation)
@@ -0,0 +1,207 @@
+import logging
+from ConfigandImport import Parent, Trainingdata, Testdata, IDEAL_MODELS, import_all, migrate_ideal_functions
+from FindIdealFunctions import session_scope, load_df, get_min_sse_cached, create_results_df, check_fit_precision
+from ColumnarCache import CACHE_DIR
+from ResultCache import ResultCache
+from Instrumentation import metrics, add_metrics_arguments, configure_metrics_from_args
+from Rendering import renderer, add_render_arguments, configure_render_from_args
+from Precision import precision, add_precision_arguments, configure_precision_from_args, PRECISION_CHECK_CANDIDATES
+
+DEFAULT_DB = "sqlite:///DataDB_new.db"
+
+
+def run_all(session_factory, engine, train_file="train.csv", ideal_file="ideal.csv", test_file="test.csv",
+            skip_import=False, lookup="exact", tolerance=0.0, workers=1, shard_size=100000, ideal_schema="wide",
+            results_format="binary"):
+    """
+    Run import, fit and evaluation in one process.
+
+    Every table is loaded from the database once and the DataFrames are handed from stage to stage in memory;
+    ideal_vs_training.csv is still written as an output but is not read back. In reduced precision (see
+    Precision.PrecisionMode) the selection and the within_threshold decisions are checked against float64.
+
+    Args:
+        session_factory (sessionmaker): Session factory bound to the engine.
+        engine (Engine): SQLAlchemy engine shared by all stages.
+        train_file (str): Path to the training data CSV file (default is 'train.csv').
+        ideal_file (str): Path to the ideal functions CSV file (default is 'ideal.csv').
+        test_file (str): Path to the test data CSV file (default is 'test.csv').
+        skip_import (bool): Use the tables already in the database instead of importing the CSV files.
+        lookup (str): Lookup mode for test x values, see EvaluateTestData.match_test_to_ideal (default is 'exact').
+        tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+        workers (int): Number of worker processes used for matching (default is 1).
+        shard_size (int): Number of test points per worker task (default is 100000).
+        ideal_schema (str): Storage of the ideal functions, 'wide' or 'long' (see ConfigandImport.IDEAL_MODELS).
+        results_format (str): Format of the results file, see EvaluateTestData.export_results (default is 'binary').
+
+    Returns:
+        tuple: (best_ideal_df, results_df).
+    """
+    from EvaluateTestData import evaluate, check_match_precision
+
+    ideal_model = IDEAL_MODELS[ideal_schema]
+    with session_scope(session_factory) as session:
+        if not skip_import:
+            with metrics.stage("import"):
+                import_all(engine, session, train_file, ideal_file, test_file, ideal_schema=ideal_schema)
+
+        with metrics.stage("load") as stage:
+            training_df = load_df(session, Trainingdata, cache_dir=CACHE_DIR)
+            ideal_df = load_df(session, ideal_model, cache_dir=CACHE_DIR)
+            test_df = load_df(session, Testdata, cache_dir=CACHE_DIR)
+            stage.add_rows(len(training_df) + len(ideal_df) + len(test_df))
+
+        cache = ResultCache()
+        with metrics.stage("compute", rows=len(training_df)):
+            min_sse = get_min_sse_cached(training_df, ideal_df, cache,
+                                         PRECISION_CHECK_CANDIDATES if precision.checked else 1)
+            best_ideal_df = create_results_df(min_sse)
+
+        with metrics.stage("export", rows=len(best_ideal_df)):
+            best_ideal_df.to_csv("ideal_vs_training.csv", index=False)
+
+        if renderer.enabled:
+            with metrics.stage("plot"):
+                from Vizualisationsbokeh import plot_training_vs_ideal_bokeh
+                renderer.submit(plot_training_vs_ideal_bokeh, training_df, ideal_df, best_ideal_df,
+                                max_points=renderer.max_points)
+
+        results_df = evaluate(session, test_df, ideal_df, training_df, best_ideal_df, cache, lookup=lookup,
+                              tolerance=tolerance, workers=workers, shard_size=shard_size,
+                              results_format=results_format)
+
+        if precision.checked:
+            with metrics.stage("precision_check"):
+                check_fit_precision(session, ideal_model, min_sse)
+                check_match_precision(session, ideal_model, best_ideal_df, results_df, lookup, tolerance)
+    with metrics.stage("render"):
+        renderer.wait()
+    metrics.finish()
+    return best_ideal_df, results_df
+
+
+def build_parser():
+    """
+    Create the command line parser with the import, migrate, fit, evaluate, run-all and batch subcommands.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Find the ideal functions for the training data and evaluate the test data.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Database connection string")
+    parser.add_argument("--ideal-schema", choices=["wide", "long"], default="wide",
+                        help="Store and read the ideal functions in the wide table (one column per function) or the "
+                             "long table (one row per function)")
+    add_metrics_arguments(parser)
+    add_render_arguments(parser)
+    add_precision_arguments(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_csv_arguments(command):
+        command.add_argument("--train", default="train.csv", help="Training data CSV file")
+        command.add_argument("--ideal", default="ideal.csv", help="Ideal functions CSV file")
+        command.add_argument("--test", default="test.csv", help="Test data CSV file")
+
+    def add_evaluate_arguments(command):
+        command.add_argument("--lookup", choices=["exact", "linear", "cubic"], default="exact",
+                             help="How test x values are resolved on the ideal x grid")
+        command.add_argument("--tolerance", type=float, default=0.0,
+                             help="Largest accepted x distance to the closest ideal row in exact mode")
+        command.add_argument("--workers", type=int, default=1, help="Number of worker processes used for matching")
+        command.add_argument("--shard-size", type=int, default=100000, help="Number of test points per worker task")
+        command.add_argument("--results-format", choices=["binary", "csv", "both"], default="binary",
+                             help="Write the matching results as 'Test Data Evaluation.npy', as CSV, or both")
+
+    add_csv_arguments(commands.add_parser("import", help="Import the CSV files into the database"))
+    commands.add_parser("migrate", help="Copy the ideal functions from the wide table into the long table")
+    fit_command = commands.add_parser("fit", help="Select the best ideal function for each training function")
+    fit_command.add_argument("--block-size", type=int, default=None,
+                             help="Stream the ideal functions from the database in blocks of this many columns")
+    fit_command.add_argument("--index", action="store_true",
+                             help="Search with the persistent ideal function index, reading only unpruned functions")
+    fit_command.add_argument("--verify-index", action="store_true",
+                             help="Re-read every ideal function and re-embed those whose values changed since indexing")
+    fit_command.add_argument("--incremental", action="store_true",
+                             help="Only process rows and ideal functions appended since the last incremental run "
+                                  "(not with --block-size or --index)")
+    fit_command.add_argument("--verify-incremental", action="store_true",
+                             help="Check the incremental state against a full recomputation and rebuild it if they differ")
+    evaluate_command = commands.add_parser("evaluate", help="Match the test data to the selected ideal functions")
+    add_evaluate_arguments(evaluate_command)
+    evaluate_command.add_argument("--best-fit", default="ideal_vs_training.csv",
+                                  help="Read the selected ideal functions from this CSV and load only their columns")
+    evaluate_command.add_argument("--refit", action="store_true",
+                                  help="Select the ideal functions from all of them instead of reading --best-fit")
+    evaluate_command.add_argument("--incremental", action="store_true",
+                                  help="Only process rows and ideal functions appended since the last incremental run")
+    evaluate_command.add_argument("--verify-incremental", action="store_true",
+                                  help="Check the incremental state against a full recomputation and rebuild it if they differ")
+    run_all_command = commands.add_parser("run-all", help="Import, fit and evaluate in one process")
+    add_csv_arguments(run_all_command)
+    add_evaluate_arguments(run_all_command)
+    run_all_command.add_argument("--skip-import", action="store_true",
+                                 help="Use the tables already in the database instead of importing the CSV files")
+    batch_command = commands.add_parser("batch", help="Fit and evaluate many training/test datasets in one pass")
+    batch_command.add_argument("--datasets", required=True,
+                               help="Directory with one subdirectory (train.csv, test.csv) per dataset")
+    batch_command.add_argument("--lookup", choices=["exact", "linear", "cubic"], default="exact",
+                               help="How test x values are resolved on the ideal x grid")
+    batch_command.add_argument("--tolerance", type=float, default=0.0,
+                               help="Largest accepted x distance to the closest ideal row in exact mode")
+    return parser
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+
+    Args:
+        argv (list, optional): Command line arguments (default is sys.argv).
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "fit" and (args.incremental or args.verify_incremental) and (args.block_size or args.index):
+        parser.error("--incremental and --verify-incremental cannot be combined with --block-size or --index")
+    configure_metrics_from_args(args)
+    configure_render_from_args(args)
+    configure_precision_from_args(args)
+    engine, Session = Parent.setup_database(args.db)
+    try:
+        if args.command == "import":
+            session = Session()
+            try:
+                import_all(engine, session, args.train, args.ideal, args.test, ideal_schema=args.ideal_schema)
+            finally:
+                session.close()
+        elif args.command == "migrate":
+            session = Session()
+            try:
+                migrate_ideal_functions(session)
+            finally:
+                session.close()
+        elif args.command == "fit":
+            import FindIdealFunctions
+            FindIdealFunctions.main(args.block_size, session_factory=Session, ideal_schema=args.ideal_schema,
+                                    use_index=args.index, incremental=args.incremental,
+                                    verify_incremental=args.verify_incremental, verify_index=args.verify_index)
+        elif args.command == "evaluate":
+            import EvaluateTestData
+            EvaluateTestData.main(args.lookup, args.tolerance, args.workers, args.shard_size, session_factory=Session,
+                                  best_fit_file=None if args.refit else args.best_fit, ideal_schema=args.ideal_schema,
+                                  results_format=args.results_format, incremental=args.incremental,
+                                  verify_incremental=args.verify_incremental)
+        elif args.command == "batch":
+            import BatchDatasets
+            BatchDatasets.main(args.datasets, session_factory=Session, lookup=args.lookup, tolerance=args.tolerance,
+                               ideal_schema=args.ideal_schema)
+        else:
+            run_all(Session, engine, args.train, args.ideal, args.test, args.skip_import, args.lookup,
+                    args.tolerance, args.workers, args.shard_size, args.ideal_schema, args.results_format)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
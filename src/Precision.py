@@ -0,0 +1,160 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+# Floating point types the function values can be loaded and computed in; 'x' always stays float64
+PRECISIONS = {"float64": np.float64, "float32": np.float32}
+
+# Number of best reduced-precision candidates per training function that are re-scored in float64 by the check
+PRECISION_CHECK_CANDIDATES = 8
+
+
+class PrecisionMode:
+    """
+    Floating point precision of the function values, shared by the loading, fitting and matching stages.
+
+    float32 halves the memory of the ideal function library and the bandwidth of the SSE search, at about seven
+    significant digits. With the check enabled, the entry points re-run the decisions that matter in float64 on the
+    few functions involved and flag every selected ideal function or within_threshold decision that changed.
+
+    Attributes:
+        mode (str): One of PRECISIONS.
+        check (bool): Whether reduced precision results are compared against float64.
+    """
+
+    def __init__(self, mode="float64", check=True):
+        self.configure(mode, check)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create the precision mode from the environment.
+
+        IDEAL_PRECISION sets the mode and IDEAL_PRECISION_CHECK=0 disables the float64 comparison.
+
+        Returns:
+            PrecisionMode: The configured precision mode.
+        """
+        return cls(mode=os.environ.get("IDEAL_PRECISION", "float64"),
+                   check=os.environ.get("IDEAL_PRECISION_CHECK", "1") != "0")
+
+    def configure(self, mode="float64", check=True):
+        """
+        Change the precision, e.g. from a command line flag.
+
+        Args:
+            mode (str): One of PRECISIONS.
+            check (bool): Whether reduced precision results are compared against float64.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{mode}', expected one of {', '.join(PRECISIONS)}")
+        self.mode = mode
+        self.check = check
+
+    @property
+    def dtype(self):
+        """NumPy type of the function values."""
+        return PRECISIONS[self.mode]
+
+    @property
+    def reduced(self):
+        """Whether the function values are held in less than float64."""
+        return self.dtype != np.float64
+
+    @property
+    def checked(self):
+        """Whether the reduced precision results have to be compared against float64."""
+        return self.reduced and self.check
+
+    def cast(self, df, dtype=None):
+        """
+        Convert the floating point function columns of a DataFrame; 'x' keeps its precision for the row lookups.
+
+        Args:
+            df (pd.DataFrame): DataFrame as loaded from a table.
+            dtype (type, optional): Target type (default is the configured precision).
+
+        Returns:
+            pd.DataFrame: The DataFrame itself if nothing changes, otherwise a converted copy.
+        """
+        dtype = np.dtype(self.dtype if dtype is None else dtype)
+        columns = [column for column in df.columns
+                   if column != "x" and df[column].dtype.kind == "f" and df[column].dtype != dtype]
+        if not columns:
+            return df
+        return df.astype(dict.fromkeys(columns, dtype))
+
+
+# Process-wide precision used by the pipeline modules
+precision = PrecisionMode.from_env()
+
+
+def compare_selection(best_ideal_df, reference_best_df):
+    """
+    Flag training functions whose selected ideal function differs from the float64 selection.
+
+    Args:
+        best_ideal_df (pd.DataFrame): Selection in reduced precision, as returned by FindIdealFunctions.fit.
+        reference_best_df (pd.DataFrame): Selection in float64 with the same columns.
+
+    Returns:
+        list: (training function, reduced precision ideal function, float64 ideal function) of every change.
+    """
+    reference = dict(zip(reference_best_df["Training Function"], reference_best_df["Ideal Function"]))
+    changed = [(train_func, ideal_func, reference[train_func])
+               for train_func, ideal_func in zip(best_ideal_df["Training Function"], best_ideal_df["Ideal Function"])
+               if train_func in reference and ideal_func != reference[train_func]]
+    for train_func, ideal_func, reference_func in changed:
+        logging.warning(f"{precision.mode} selected {ideal_func} for {train_func}, float64 selects {reference_func}")
+    return changed
+
+
+def compare_decisions(results_df, reference_results_df):
+    """
+    Flag test points whose within_threshold decision differs from the float64 decision.
+
+    Args:
+        results_df (pd.DataFrame): Matching results in reduced precision, as returned by compute_matches.
+        reference_results_df (pd.DataFrame): Matching results of the same test points in float64.
+
+    Returns:
+        pd.DataFrame: 'ID', 'No. of ideal func', 'Delta Y (test func)', 'Max Deviation' and 'within_threshold' of
+        every flipped decision, with the float64 values suffixed ' (float64)'.
+    """
+    keys = ["ID", "No. of ideal func"]
+    columns = ["Delta Y (test func)", "Max Deviation", "within_threshold"]
+    merged = pd.merge(results_df[keys + columns].astype({"No. of ideal func": str}),
+                      reference_results_df[keys + columns].astype({"No. of ideal func": str}),
+                      on=keys, suffixes=("", " (float64)"))
+    flipped = merged[merged["within_threshold"] != merged["within_threshold (float64)"]].reset_index(drop=True)
+    if len(flipped):
+        logging.warning(f"{precision.mode} changed {len(flipped)} of {len(merged)} within_threshold decisions "
+                        f"relative to float64")
+    return flipped
+
+
+def add_precision_arguments(parser):
+    """
+    Add the --precision and --no-precision-check options to an argparse parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser of an entry point.
+    """
+    parser.add_argument("--precision", choices=list(PRECISIONS), default=None,
+                        help="Floating point type of the function values (default: IDEAL_PRECISION or 'float64')")
+    parser.add_argument("--no-precision-check", action="store_true",
+                        help="Do not compare float32 selections and threshold decisions against float64")
+
+
+def configure_precision_from_args(args):
+    """
+    Apply the precision options of the command line; environment settings are kept for options not given.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments of a parser set up with add_precision_arguments.
+    """
+    precision.configure(args.precision or precision.mode, precision.check and not args.no_precision_check)
@@ -0,0 +1,143 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# 'none' skips the plots, 'file' only writes the HTML/PNG artifacts, 'interactive' also opens them
+RENDER_MODES = ["none", "file", "interactive"]
+
+
+class Renderer:
+    """
+    Runs the plot functions of Vizualisationsbokeh according to the render mode.
+
+    In 'file' mode the artifacts are written on a background thread pool, so compute stages do not wait on
+    rendering; wait() blocks until all of them are written. 'interactive' plots are drawn on the calling thread,
+    since GUI windows and browsers are opened from there.
+
+    Attributes:
+        mode (str): One of RENDER_MODES.
+        workers (int): Number of background threads in 'file' mode; 0 renders on the calling thread.
+        max_points (int or None): Points per line of the downsampled WebGL Bokeh plots; None draws every row.
+    """
+
+    def __init__(self, mode="interactive", workers=2, max_points=None):
+        self.executor = None
+        self.pending = []
+        self.configure(mode, workers, max_points)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create the renderer from the environment.
+
+        IDEAL_RENDER sets the render mode, IDEAL_RENDER_WORKERS the number of background threads and
+        IDEAL_PLOT_POINTS the points per line of the downsampled Bokeh plots.
+
+        Returns:
+            Renderer: The configured renderer.
+        """
+        max_points = os.environ.get("IDEAL_PLOT_POINTS")
+        return cls(mode=os.environ.get("IDEAL_RENDER", "interactive"),
+                   workers=int(os.environ.get("IDEAL_RENDER_WORKERS", "2")),
+                   max_points=int(max_points) if max_points else None)
+
+    def configure(self, mode="interactive", workers=2, max_points=None):
+        """
+        Change the render mode, e.g. from a command line flag. Pending plots are finished first.
+
+        Args:
+            mode (str): One of RENDER_MODES.
+            workers (int): Number of background threads in 'file' mode; 0 renders on the calling thread.
+            max_points (int, optional): Points per line of the downsampled WebGL Bokeh plots; None draws every row.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode '{mode}', expected one of {', '.join(RENDER_MODES)}")
+        self.wait()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.mode = mode
+        self.workers = workers
+        self.max_points = max_points
+
+    @property
+    def enabled(self):
+        """Whether plots are rendered at all; callers can skip preparing plot data otherwise."""
+        return self.mode != "none"
+
+    def submit(self, plot, *args, **kwargs):
+        """
+        Render a plot according to the mode.
+
+        Args:
+            plot (callable): Plot function accepting an 'interactive' keyword argument.
+            *args: Positional arguments of the plot function.
+            **kwargs: Keyword arguments of the plot function.
+
+        Returns:
+            Future or None: The pending render in 'file' mode with background threads, None otherwise.
+        """
+        if not self.enabled:
+            return None
+        if self.mode == "interactive" or self.workers <= 0:
+            self._render(plot, args, kwargs)
+            return None
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+        future = self.executor.submit(self._render, plot, args, kwargs)
+        self.pending.append(future)
+        return future
+
+    def _render(self, plot, args, kwargs):
+        start_time = time.perf_counter()
+        plot(*args, interactive=self.mode == "interactive", **kwargs)
+        logging.info(f"Rendered {plot.__name__} in {time.perf_counter() - start_time:.3f} s")
+
+    def wait(self):
+        """
+        Block until all pending plots are written.
+
+        Raises:
+            Exception: The first error raised by a pending plot, after all of them have finished.
+        """
+        pending, self.pending = self.pending, []
+        errors = [future.exception() for future in pending]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            raise errors[0]
+
+
+# Process-wide renderer used by the pipeline modules
+renderer = Renderer.from_env()
+
+
+def add_render_arguments(parser):
+    """
+    Add the --render, --render-workers and --plot-points options to an argparse parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser of an entry point.
+    """
+    parser.add_argument("--render", choices=RENDER_MODES, default=None,
+                        help="Skip the plots, only write them to files, or also open them (default: IDEAL_RENDER or "
+                             "'interactive')")
+    parser.add_argument("--render-workers", type=int, default=None,
+                        help="Background threads writing plot files in 'file' mode (0 renders inline)")
+    parser.add_argument("--plot-points", type=int, default=None,
+                        help="Downsample the Bokeh lines to about this many points and draw them with WebGL")
+
+
+def configure_render_from_args(args):
+    """
+    Apply the render options of the command line; environment settings are kept for options not given.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments of a parser set up with add_render_arguments.
+    """
+    renderer.configure(args.render or renderer.mode,
+                       renderer.workers if args.render_workers is None else args.render_workers,
+                       args.plot_points or renderer.max_points)
@@ -0,0 +1,161 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+# Default location of the on-disk results, relative to the working directory like the database itself
+RESULT_CACHE_DIR = ".result_cache"
+
+
+def content_hash(*parts):
+    """
+    Compute a SHA-256 over the content of arrays, DataFrames and plain values.
+
+    DataFrames contribute their column names, dtypes and values, arrays their dtype, shape and bytes, so two inputs
+    only share a hash if they hold the same data.
+
+    Args:
+        *parts: Arrays, DataFrames or values with a stable repr (str, int, float, tuple, ...).
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            digest.update(repr(list(part.columns)).encode())
+            for name in part.columns:
+                array = np.ascontiguousarray(part[name].to_numpy())
+                digest.update(f"{array.dtype}{array.shape}".encode())
+                digest.update(array.tobytes() if array.dtype != object else repr(array.tolist()).encode())
+        elif isinstance(part, np.ndarray):
+            array = np.ascontiguousarray(part)
+            digest.update(f"{array.dtype}{array.shape}".encode())
+            digest.update(array.tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"|")  # Separator, so that concatenated parts cannot collide
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Least-recently-used cache of computed results, kept in memory and backed by pickle files on disk.
+
+    Attributes:
+        cache_dir (str or None): Directory of the on-disk entries, or None for a memory-only cache.
+        max_entries (int): Maximum number of entries kept in memory and on disk.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that had to compute the result.
+    """
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_entries=64):
+        """
+        Args:
+            cache_dir (str, optional): Directory of the on-disk entries (default is RESULT_CACHE_DIR), or None to
+                keep entries in memory only.
+            max_entries (int): Maximum number of entries kept in memory and on disk (default is 64).
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._last_touch = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _touch(self, path):
+        """Set the modification time of an entry file, which tracks recency on disk, to a strictly increasing value."""
+        self._last_touch = max(time.time_ns(), self._last_touch + 1)
+        os.utime(path, ns=(self._last_touch, self._last_touch))
+
+    def get(self, key):
+        """
+        Look up a result and mark it as most recently used.
+
+        Args:
+            key (str): Cache key, usually from content_hash.
+
+        Returns:
+            tuple: (found, value).
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return True, self.entries[key]
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as handle:
+                    value = pickle.load(handle)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return False, None
+            self._touch(self._path(key))
+            self._remember(key, value)
+            return True, value
+        return False, None
+
+    def put(self, key, value):
+        """
+        Store a result in memory and on disk, evicting the least recently used entries beyond max_entries.
+
+        Args:
+            key (str): Cache key, usually from content_hash.
+            value: Any picklable result.
+        """
+        self._remember(key, value)
+        if self.cache_dir is None:
+            return
+        with open(self._path(key) + ".tmp", "wb") as handle:
+            pickle.dump(value, handle)
+        os.replace(self._path(key) + ".tmp", self._path(key))
+        self._touch(self._path(key))
+
+        files = [os.path.join(self.cache_dir, file) for file in os.listdir(self.cache_dir) if file.endswith(".pkl")]
+        if len(files) > self.max_entries:
+            files.sort(key=lambda file: os.stat(file).st_mtime_ns)
+            for file in files[:len(files) - self.max_entries]:
+                os.remove(file)
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def cached(self, name, inputs, compute):
+        """
+        Return the cached result of a computation, computing and storing it if the inputs have not been seen.
+
+        Args:
+            name (str): Name of the computation; part of the key so different computations never share entries.
+            inputs (tuple): Everything the result depends on (arrays, DataFrames and parameters).
+            compute (callable): Function without arguments that computes the result.
+
+        Returns:
+            The cached or freshly computed result.
+        """
+        key = content_hash(name, *inputs)
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            logging.info(f"Result cache hit for {name}")
+            return value
+        self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        """Remove all entries from memory and disk."""
+        self.entries.clear()
+        if self.cache_dir is not None:
+            for file in os.listdir(self.cache_dir):
+                if file.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, file))
@@ -0,0 +1,301 @@
+import os
+import sys
+import time
+import logging
+import pandas as pd
+import numpy as np
+from FindIdealFunctions import session_scope, load_df, fit, ideal_columns
+from ColumnarCache import CACHE_DIR
+from EvaluateTestData import (XIndex, RESULTS_FILE, BEST_FIT_FILE, calculate_max_deviations_cached, compute_matches,
+                              export_results, read_results)
+from ResultCache import ResultCache
+
+
+class StreamingEvaluator:
+    """
+    Classifies test points arriving in micro-batches against ideal functions that stay in memory.
+
+    The ideal functions, their x index and the maximum deviations are prepared once. Each batch is matched and
+    appended to 'Table 3' and the results file.
+
+    Attributes:
+        next_id (int): ID assigned to the next incoming test point.
+        latencies (list): Processing time in seconds of each batch.
+    """
+
+    def __init__(self, ideal_functions_df, ideal_funcs, max_devs, session, lookup="exact", tolerance=0.0, first_id=1,
+                 results_format="binary", first_row=0):
+        """
+        Args:
+            ideal_functions_df (pd.DataFrame): DataFrame containing ideal functions.
+            ideal_funcs (list): List of the selected ideal function names.
+            max_devs (dict): Dictionary containing the maximum deviations for each ideal function.
+            session (Session): SQLAlchemy session for database operations.
+            lookup (str): Lookup mode for test x values, see XIndex.resolve (default is 'exact').
+            tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+            first_id (int): ID of the first test point, to continue the numbering of an earlier run (default is 1).
+            results_format (str): Format of the results file, see EvaluateTestData.export_results (default is 'binary').
+            first_row (int): Row number of the first result in the CSV file, to continue an earlier run (default is 0).
+        """
+        columns = ["x"] + [f"{func} (ideal func)" for func in ideal_funcs
+                           if f"{func} (ideal func)" in ideal_functions_df.columns]
+        self.ideal_functions_df = ideal_functions_df[columns]  # Keep only the selected functions resident
+        self.ideal_funcs = ideal_funcs
+        self.max_devs = max_devs
+        self.session = session
+        self.lookup = lookup
+        self.tolerance = tolerance
+        self.results_format = results_format
+        self.x_index = XIndex(self.ideal_functions_df["x"].values)
+        self.next_id = first_id
+        self.next_row = first_row
+        self.latencies = []
+
+    def process_batch(self, batch_df):
+        """
+        Match one batch of test points and append the results to the outputs.
+
+        Args:
+            batch_df (pd.DataFrame): DataFrame with 'x' and 'y' columns.
+
+        Returns:
+            pd.DataFrame: The matching results of the batch.
+        """
+        start_time = time.perf_counter()
+        batch_df = batch_df[["x", "y"]].copy()
+        batch_df["ID"] = range(self.next_id, self.next_id + len(batch_df))
+
+        results_df = compute_matches(batch_df, self.ideal_functions_df, self.max_devs, self.ideal_funcs,
+                                     self.lookup, self.tolerance, x_index=self.x_index)
+        results_df.index += self.next_row  # Keep the CSV row numbers continuous across batches
+        export_results(results_df, self.session, append=True, results_format=self.results_format)
+
+        self.next_id += len(batch_df)
+        self.next_row += len(results_df)
+        latency = time.perf_counter() - start_time
+        self.latencies.append(latency)
+        logging.info(f"Batch of {len(batch_df)} test points classified in {latency * 1000:.2f} ms "
+                     f"({int(results_df['within_threshold'].sum())} matches within threshold)")
+        return results_df
+
+    def run(self, batches):
+        """
+        Process batches until the source is exhausted and log a latency summary.
+
+        Args:
+            batches (iterable): Iterable of DataFrames with 'x' and 'y' columns.
+        """
+        points = 0
+        start_time = time.perf_counter()
+        for batch_df in batches:
+            if len(batch_df):
+                self.process_batch(batch_df)
+                points += len(batch_df)
+        if self.latencies:
+            elapsed = time.perf_counter() - start_time
+            logging.info(f"Processed {points} test points in {len(self.latencies)} batches "
+                         f"(mean latency {np.mean(self.latencies) * 1000:.2f} ms, "
+                         f"p95 latency {np.percentile(self.latencies, 95) * 1000:.2f} ms, "
+                         f"{points / elapsed:.0f} points/sec)")
+
+
+def results_position(results_format="binary"):
+    """
+    Find where an earlier run left off in the results file, so that appended results continue its numbering.
+
+    Args:
+        results_format (str): Format of the results file, see EvaluateTestData.export_results (default is 'binary').
+
+    Returns:
+        tuple: (first_id, first_row), the ID of the next test point and the number of results already written;
+        (1, 0) if there is no results file yet.
+    """
+    if results_format != "csv" and os.path.exists(RESULTS_FILE + ".npy"):
+        ids = read_results(RESULTS_FILE + ".npy")["ID"]
+    elif results_format != "binary" and os.path.exists(RESULTS_FILE + ".csv"):
+        ids = pd.read_csv(RESULTS_FILE + ".csv", usecols=["ID"])["ID"]
+    else:
+        return 1, 0
+    return (int(ids.max()) + 1 if len(ids) else 1), len(ids)
+
+
+def iter_point_batches(points, batch_size):
+    """
+    Group (x, y) tuples from any iterable or generator into micro-batches.
+
+    Args:
+        points (iterable): Iterable of (x, y) tuples.
+        batch_size (int): Maximum number of test points per batch.
+
+    Yields:
+        pd.DataFrame: Batches with 'x' and 'y' columns.
+    """
+    batch = []
+    for point in points:
+        batch.append(point)
+        if len(batch) >= batch_size:
+            yield pd.DataFrame(batch, columns=["x", "y"], dtype=float)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=["x", "y"], dtype=float)
+
+
+def parse_lines(lines):
+    """
+    Parse 'x,y' text lines into (x, y) tuples, skipping headers and malformed lines.
+
+    Args:
+        lines (iterable): Iterable of text lines.
+
+    Yields:
+        tuple: (x, y) as floats.
+    """
+    for line in lines:
+        fields = line.strip().split(",")
+        if len(fields) < 2:
+            continue
+        try:
+            yield float(fields[0]), float(fields[1])
+        except ValueError:
+            if fields[0].strip() != "x":  # The CSV header is expected and skipped silently
+                logging.warning(f"Skipping malformed test data line: {line.strip()}")
+
+
+def tail_lines(file, poll_interval=0.5, idle_timeout=None):
+    """
+    Follow a growing file and yield lines as they are appended, like 'tail -f'.
+
+    An empty string is yielded whenever no new data is available, so that callers can flush partial batches.
+
+    Args:
+        file (str): Path to the file to follow.
+        poll_interval (float): Seconds to wait before checking the file for new data again.
+        idle_timeout (float, optional): Stop after this many seconds without new data (default is to follow forever).
+
+    Yields:
+        str: Complete lines, or '' when the end of the file has been reached.
+    """
+    idle_since = time.monotonic()
+    with open(file) as handle:
+        pending = ""
+        while True:
+            chunk = handle.readline()
+            if chunk:
+                pending += chunk
+                if pending.endswith("\n"):
+                    yield pending
+                    pending = ""
+                idle_since = time.monotonic()
+                continue
+            yield ""
+            if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                if pending:
+                    yield pending
+                return
+            time.sleep(poll_interval)
+
+
+def iter_tail_batches(file, batch_size, poll_interval=0.5, idle_timeout=None):
+    """
+    Build micro-batches from lines appended to a file, flushing partial batches when the writer pauses.
+
+    Args:
+        file (str): Path to the CSV file to follow.
+        batch_size (int): Maximum number of test points per batch.
+        poll_interval (float): Seconds between checks for new data.
+        idle_timeout (float, optional): Stop after this many seconds without new data.
+
+    Yields:
+        pd.DataFrame: Batches with 'x' and 'y' columns.
+    """
+    batch = []
+    for line in tail_lines(file, poll_interval, idle_timeout):
+        if line:
+            batch.extend(parse_lines([line]))
+        if batch and (len(batch) >= batch_size or not line):
+            yield pd.DataFrame(batch, columns=["x", "y"], dtype=float)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=["x", "y"], dtype=float)
+
+
+def main(source="-", batch_size=1000, follow=False, poll_interval=0.5, idle_timeout=None, lookup="exact",
+         tolerance=0.0, results_format="binary", first_id=None, session_factory=None, best_fit_file=BEST_FIT_FILE,
+         ideal_schema="wide"):
+    """
+    Load the selected ideal functions once and classify test points from stdin or a file in micro-batches.
+
+    Args:
+        source (str): Path of a CSV file with 'x,y' lines, or '-' for stdin (default).
+        batch_size (int): Maximum number of test points per batch.
+        follow (bool): Keep following the file for appended lines, like 'tail -f'.
+        poll_interval (float): Seconds between checks for new data when following a file.
+        idle_timeout (float, optional): Stop following after this many seconds without new data.
+        lookup (str): Lookup mode for test x values, see XIndex.resolve (default is 'exact').
+        tolerance (float): x tolerance for the 'exact' lookup mode (default is 0).
+        results_format (str): Format of the results file, see EvaluateTestData.export_results (default is 'binary').
+        first_id (int, optional): ID of the first test point (default is to continue after the highest ID in the
+            existing results file, see results_position).
+        session_factory (sessionmaker, optional): Session factory to use instead of the module's default database.
+        best_fit_file (str, optional): CSV file with the selected ideal functions, as written by FindIdealFunctions
+            (default is ideal_vs_training.csv). Only the selected ideal function columns are loaded. If None, the
+            selection is computed from all ideal functions, through the result cache.
+        ideal_schema (str): Storage of the ideal functions, 'wide' or 'long' (see ConfigandImport.IDEAL_MODELS).
+    """
+    with session_scope(session_factory) as session:
+        from ConfigandImport import Trainingdata, IDEAL_MODELS
+        cache = ResultCache()
+        best_ideal_df = pd.read_csv(best_fit_file) if best_fit_file else None
+
+        # Load everything that stays resident for the lifetime of the stream
+        columns = ideal_columns(best_ideal_df["Ideal Function"]) if best_ideal_df is not None else None
+        ideal_functions_df = load_df(session, IDEAL_MODELS[ideal_schema], cache_dir=CACHE_DIR, columns=columns)
+        training_data_df = load_df(session, Trainingdata, cache_dir=CACHE_DIR)
+        if best_ideal_df is None:
+            best_ideal_df = fit(training_data_df, ideal_functions_df, cache)
+        training_funcs = best_ideal_df["Training Function"].tolist()
+        ideal_funcs = best_ideal_df["Ideal Function"].tolist()
+        max_devs = calculate_max_deviations_cached(training_data_df, ideal_functions_df, training_funcs, ideal_funcs,
+                                                   cache)
+
+        # The results are appended, so the IDs continue after those of earlier runs
+        next_id, first_row = results_position(results_format)
+        evaluator = StreamingEvaluator(ideal_functions_df, ideal_funcs, max_devs, session, lookup, tolerance,
+                                       first_id=next_id if first_id is None else first_id,
+                                       results_format=results_format, first_row=first_row)
+        if source == "-":
+            batches = iter_point_batches(parse_lines(sys.stdin), batch_size)
+        elif follow:
+            batches = iter_tail_batches(source, batch_size, poll_interval, idle_timeout)
+        else:
+            batches = (chunk[["x", "y"]] for chunk in pd.read_csv(source, chunksize=batch_size))
+        evaluator.run(batches)
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Classify a continuous stream of test points in micro-batches.")
+    parser.add_argument("source", nargs="?", default="-", help="CSV file with x,y test points, or '-' for stdin")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Maximum number of test points per batch")
+    parser.add_argument("--follow", action="store_true", help="Follow the file for appended lines")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between checks for new data")
+    parser.add_argument("--idle-timeout", type=float, default=None, help="Stop after this many idle seconds")
+    parser.add_argument("--lookup", choices=["exact", "linear", "cubic"], default="exact",
+                        help="How test x values are resolved on the ideal x grid")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Largest accepted x distance to the closest ideal row in exact mode")
+    parser.add_argument("--results-format", choices=["binary", "csv", "both"], default="binary",
+                        help="Append the matching results to 'Test Data Evaluation.npy', to a CSV file, or both")
+    parser.add_argument("--first-id", type=int, default=None,
+                        help="ID of the first test point (default: continue after the IDs in the results file)")
+    parser.add_argument("--best-fit", default=BEST_FIT_FILE,
+                        help="Read the selected ideal functions from this CSV and load only their columns")
+    parser.add_argument("--refit", action="store_true",
+                        help="Select the ideal functions from all of them instead of reading --best-fit")
+    parser.add_argument("--ideal-schema", choices=["wide", "long"], default="wide",
+                        help="Read the ideal functions from the wide table or the long per-function table")
+    args = parser.parse_args()
+    main(args.source, args.batch_size, args.follow, args.poll_interval, args.idle_timeout, args.lookup,
+         args.tolerance, args.results_format, args.first_id, best_fit_file=None if args.refit else args.best_fit,
+         ideal_schema=args.ideal_schema)
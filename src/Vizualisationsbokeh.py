@@ -1,7 +1,77 @@
-from bokeh.plotting import figure, show, output_file, reset_output
+import numpy as np
+from bokeh.plotting import figure
 from bokeh.models import ColumnDataSource, Band
+from bokeh.io import save
+from bokeh.resources import CDN
+from bokeh.util.browser import view
 
-def plot_training_vs_ideal_bokeh(training_df, ideal_df, best_ideal_df):
+
+def minmax_downsample_indices(n_rows, series, max_points):
+    """
+    Selects the rows needed to draw several lines at a resolution of about max_points points.
+
+    The rows are split into max_points // 2 buckets; in each bucket the rows holding the minimum and the maximum of
+    every line are kept, plus the first and the last row. Peaks therefore survive the downsampling, and all lines
+    share the selected rows, so they can be drawn from one ColumnDataSource.
+
+    Args:
+    - n_rows (int): Number of rows of the lines.
+    - series (list): Arrays of length n_rows, one per line.
+    - max_points (int or None): Target number of points per line; None keeps every row.
+
+    Returns:
+    - np.ndarray: Sorted row indices.
+    """
+    if max_points is None or n_rows <= max_points or not len(series):
+        return np.arange(n_rows)
+    bucket_size = -(-n_rows // max(1, max_points // 2))  # Ceiling division
+    n_buckets = -(-n_rows // bucket_size)
+    values = np.column_stack([np.asarray(values, dtype=float) for values in series])
+    padding = np.full((n_buckets * bucket_size - n_rows, values.shape[1]), np.nan)
+    buckets = np.vstack([values, padding]).reshape(n_buckets, bucket_size, values.shape[1])
+    offsets = (np.arange(n_buckets) * bucket_size)[:, None]
+
+    # Missing values and the padding never win, but an all-missing bucket still yields a valid row
+    argmin = np.argmin(np.where(np.isnan(buckets), np.inf, buckets), axis=1) + offsets
+    argmax = np.argmax(np.where(np.isnan(buckets), -np.inf, buckets), axis=1) + offsets
+    rows = np.unique(np.concatenate([argmin.ravel(), argmax.ravel(), [0, n_rows - 1]]))
+    return rows[rows < n_rows]
+
+
+def downsampled_source(df, columns, max_points):
+    """
+    Creates one ColumnDataSource with the 'x' column and the given line columns, downsampled for plotting.
+
+    Args:
+    - df (pd.DataFrame): DataFrame with an 'x' column sorted in ascending order.
+    - columns (list): Names of the line columns.
+    - max_points (int or None): Target number of points per line, see minmax_downsample_indices.
+
+    Returns:
+    - ColumnDataSource: Source with 'x' and the selected columns.
+    """
+    rows = minmax_downsample_indices(len(df), [df[column].values for column in columns], max_points)
+    return ColumnDataSource(data={column: df[column].values[rows] for column in ["x"] + list(columns)})
+
+
+def write_html(obj, filename, interactive=True):
+    """
+    Writes a Bokeh plot or layout to an HTML file and opens it in the browser in interactive mode.
+
+    Unlike output_file() and show(), this keeps no global output state, so plots can be written from several
+    threads at once.
+
+    Args:
+    - obj: Bokeh plot or layout.
+    - filename (str): Path of the HTML file.
+    - interactive (bool): Whether to open the file in the browser (default is True).
+    """
+    save(obj, filename=filename, resources=CDN, title="Bokeh Plot")
+    if interactive:
+        view(filename)
+
+
+def plot_training_vs_ideal_bokeh(training_df, ideal_df, best_ideal_df, interactive=True, max_points=None):
     """
     Plots the training functions against their best corresponding ideal functions using Bokeh.
 
@@ -9,13 +79,21 @@ def plot_training_vs_ideal_bokeh(training_df, ideal_df, best_ideal_df):
     - training_df (pd.DataFrame): DataFrame containing the training data with columns 'x', 'y1', 'y2', 'y3', 'y4'.
     - ideal_df (pd.DataFrame): DataFrame containing the ideal functions with 'x' and multiple 'y' columns.
     - best_ideal_df (pd.DataFrame): DataFrame mapping training functions to their best ideal functions.
+    - interactive (bool): Whether to open the plot in the browser or only write the HTML file (default is True).
+    - max_points (int, optional): If given, the lines are drawn from shared sources downsampled to about this
+      many points, using the WebGL backend.
     """
-    reset_output()  # Clear any previous output configurations
-    output_file("Visualisations/Training_vs_Ideal_Functions.html")  # Specify output file for the plot
-
     # Create a Bokeh figure
     p = figure(title="Training Functions vs. Best Matching Ideal Functions", 
-               x_axis_label='X', y_axis_label='Y', width=800, height=600)
+               x_axis_label='X', y_axis_label='Y', width=800, height=600,
+               output_backend="webgl" if max_points else "canvas")
+
+    if max_points:
+        training_columns = [f"{func} (training func)" for func in best_ideal_df["Training Function"]]
+        ideal_columns = [f"{func} (ideal func)" for func in best_ideal_df["Ideal Function"]
+                         if f"{func} (ideal func)" in ideal_df.columns]
+        training_source = downsampled_source(training_df, training_columns, max_points)
+        ideal_source = downsampled_source(ideal_df, list(dict.fromkeys(ideal_columns)), max_points)
     
     # Define color palettes for training and ideal functions
     training_colors = ["green", "blue", "orange", "red"]
@@ -32,6 +110,14 @@ def plot_training_vs_ideal_bokeh(training_df, ideal_df, best_ideal_df):
         training_color = training_colors[int(training_func[-1]) - 1]
         ideal_color = ideal_colors[int(training_func[-1]) - 1]
 
+        if max_points:
+            p.line("x", training_col, source=training_source,
+                   legend_label=training_func, color=training_color, line_width=2)
+            if ideal_col in ideal_df.columns:
+                p.line("x", ideal_col, source=ideal_source,
+                       legend_label=ideal_col, color=ideal_color, line_dash="dotted", line_width=4)
+            continue
+
         # Plot the training function with a solid line
         p.line(training_df["x"], training_df[training_col], 
                legend_label=training_func, color=training_color, line_width=2)
@@ -50,14 +136,14 @@ def plot_training_vs_ideal_bokeh(training_df, ideal_df, best_ideal_df):
     p.legend.orientation = "horizontal"
     p.legend.label_text_font_size = "8pt"
 
-    # Show the plot
-    show(p)
+    # Write and show the plot
+    write_html(p, "Visualisations/Training_vs_Ideal_Functions.html", interactive)
 
 
-from bokeh.models import ColumnDataSource, HoverTool, Band
-from bokeh.plotting import figure, show, output_file, reset_output
+from bokeh.models import HoverTool
 
-def plot_ideal_functions_with_bands_bokeh(ideal_functions_df, ideal_functions, max_devs, within_threshold_df, outside_threshold_df):
+def plot_ideal_functions_with_bands_bokeh(ideal_functions_df, ideal_functions, max_devs, within_threshold_df, outside_threshold_df,
+                                          interactive=True, max_points=None):
     """
     Plots ideal functions with deviation bands and test data points using Bokeh.
 
@@ -67,24 +153,44 @@ def plot_ideal_functions_with_bands_bokeh(ideal_functions_df, ideal_functions, m
     - max_devs (dict): Dictionary containing maximum deviation for each ideal function.
     - within_threshold_df (pd.DataFrame): DataFrame of test points within the deviation threshold.
     - outside_threshold_df (pd.DataFrame): DataFrame of test points outside the deviation threshold.
+    - interactive (bool): Whether to open the plot in the browser or only write the HTML file (default is True).
+    - max_points (int, optional): If given, all lines and bands share one source downsampled to about this many
+      points, the per-row hover labels are replaced by renderer names and the WebGL backend is used.
     """
-    reset_output()  # Clear previous output configurations
-    output_file("Ideal_Functions_vs_Test_Data.html")  # Specify output file for the plot
 
     # Create a Bokeh figure
     p = figure(title='Ideal Functions incl. Threshold vs. Test Data', 
-               x_axis_label='X', y_axis_label='Y', width=800, height=600)
+               x_axis_label='X', y_axis_label='Y', width=800, height=600,
+               output_backend="webgl" if max_points else "canvas")
 
     # Define colors for the ideal functions
     color_list = ["purple", "red", "blue", "orange"]
 
+    if max_points:
+        columns = list(dict.fromkeys(f"{func} (ideal func)" for func in ideal_functions
+                                     if f"{func} (ideal func)" in ideal_functions_df.columns))
+        shared_source = downsampled_source(ideal_functions_df, columns, max_points)
+        for column in columns:
+            max_dev = max_devs.get(column.split(" ")[0], 0)
+            shared_source.data[f"{column} lower"] = shared_source.data[column] - max_dev
+            shared_source.data[f"{column} upper"] = shared_source.data[column] + max_dev
+
     # Plot each ideal function with its corresponding max deviation band
     for i, ideal_func in enumerate(ideal_functions):
         ideal_func_column = f"{ideal_func} (ideal func)"
         max_dev = max_devs.get(ideal_func, 0)
         color = color_list[i % len(color_list)]
 
-        if ideal_func_column in ideal_functions_df.columns:
+        if max_points and ideal_func_column in ideal_functions_df.columns:
+            # The function label is the renderer name instead of a string repeated for every row
+            line = p.line('x', ideal_func_column, source=shared_source, name=f'{ideal_func_column} ideal func with threshold',
+                          legend_label=f'Ideal {ideal_func}', line_width=2, color=color)
+            band = Band(base='x', lower=f'{ideal_func_column} lower', upper=f'{ideal_func_column} upper',
+                        source=shared_source, level='underlay', fill_color=color, fill_alpha=0.2)
+            p.add_layout(band)
+            p.add_tools(HoverTool(tooltips=[("Function", "$name")], renderers=[line], mode='mouse'))
+
+        elif ideal_func_column in ideal_functions_df.columns:
             ideal_functions_dict = {
                 'x': ideal_functions_df['x'].values,
                 'y': ideal_functions_df[ideal_func_column].values,
@@ -140,49 +246,61 @@ def plot_ideal_functions_with_bands_bokeh(ideal_functions_df, ideal_functions, m
     # Customize and show the plot
     p.add_layout(p.legend[0], 'right')
     p.legend.title = "Legend"
-    show(p)
+    write_html(p, "Ideal_Functions_vs_Test_Data.html", interactive)
 
 
-import matplotlib.pyplot as plt
-
-def plot_ideal_function_counts(results_df):
+def plot_ideal_function_counts(results_df, interactive=True):
     """
     Plots a bar graph showing the count of test points within threshold for each ideal function.
 
     Args:
     - results_df (pd.DataFrame): DataFrame containing results with 'No. of ideal func' and 'within_threshold' columns.
+    - interactive (bool): Whether to show the chart in a window or only write it to Ideal_Function_Counts.png
+      (default is True).
     """
     # Filter DataFrame for rows where within_threshold is True
     filtered_data = results_df[results_df['within_threshold']]
 
     # Count occurrences of each ideal function
     ideal_function_counts = filtered_data['No. of ideal func'].value_counts()
+    ideal_function_counts = ideal_function_counts[ideal_function_counts > 0]  # Categories without matches
+
+    # Matplotlib is only needed for this chart, so it is not loaded with the Bokeh plots
+    if interactive:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=(10, 6))
+    else:
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(10, 6))  # Not managed by pyplot, so it can be drawn on a background thread
 
     # Plot the counts
-    plt.figure(figsize=(10, 6))
-    ideal_function_counts.plot(kind='bar', color='skyblue', edgecolor='black')
+    ax = fig.add_subplot()
+    ax.bar(ideal_function_counts.index.astype(str), ideal_function_counts.values, color='skyblue', edgecolor='black')
 
     # Add titles and labels
-    plt.title('Test Points within Threshold per Ideal Function', fontsize=14)
-    plt.xlabel('Ideal Function', fontsize=12)
-    plt.ylabel('Within Threshold Count', fontsize=12)
+    ax.set_title('Test Points within Threshold per Ideal Function', fontsize=14)
+    ax.set_xlabel('Ideal Function', fontsize=12)
+    ax.set_ylabel('Within Threshold Count', fontsize=12)
     
     # Show the grid and the plot
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-    plt.tight_layout()
-    plt.show()
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    fig.tight_layout()
+    if interactive:
+        plt.show()
+    else:
+        fig.savefig("Ideal_Function_Counts.png")
 
 
-from bokeh.io import output_file, show
-from bokeh.models import ColumnDataSource, DataTable, TableColumn
+from bokeh.models import DataTable, TableColumn
 from bokeh.layouts import layout
 
-def create_table3(results_df):
+def create_table3(results_df, interactive=True):
     """
     Creates and displays a Bokeh DataTable from the given results DataFrame.
 
     Args:
     - results_df (pd.DataFrame): DataFrame containing results with 'within_threshold' and relevant columns for display.
+    - interactive (bool): Whether to open the table in the browser or only write the HTML file (default is True).
     """
     df_for_table = results_df[results_df['within_threshold'] == True][["X (test func)", "Y (test func)", "Delta Y (test func)", "No. of ideal func"]]
 
@@ -200,9 +318,6 @@ def create_table3(results_df):
     # Create the Bokeh DataTable
     data_table = DataTable(source=source, columns=columns, width=800, height=350)
 
-    # Output the result to an HTML file
-    output_file("table3_bokeh.html")
-
-    # Show the DataTable
+    # Output the result to an HTML file and show the DataTable
     layout_table = layout([[data_table]])
-    show(layout_table)
+    write_html(layout_table, "table3_bokeh.html", interactive)
@@ -0,0 +1,68 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+from BenchmarkPipeline import generate_datasets
+from FindIdealFunctions import fit
+from EvaluateTestData import calculate_max_deviations, compute_matches
+from Pipeline import main
+
+class TestBatchDatasets(unittest.TestCase):
+
+    def setUp(self):
+        # One shared ideal library and three datasets with training functions drawn from it
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        paths = generate_datasets(self.tmpdir.name, base_rows=40, base_tests=10)
+        self.ideal_df = pd.read_csv(paths["ideal"])
+        self.ideal_df.columns = ["x"] + [f"{column} (ideal func)" for column in self.ideal_df.columns[1:]]
+        rng = np.random.default_rng(5)
+        self.datasets = os.path.join(self.tmpdir.name, "datasets")
+        for i, chosen in enumerate([[1, 2, 3, 4], [10, 20, 30, 40], [50, 7, 7, 12]]):
+            os.makedirs(os.path.join(self.datasets, f"d{i}"))
+            training = self.ideal_df.iloc[:, chosen].values + rng.normal(scale=0.3, size=(40, 4))
+            pd.DataFrame(np.column_stack([self.ideal_df["x"], training]), columns=["x", "y1", "y2", "y3", "y4"]) \
+                .to_csv(os.path.join(self.datasets, f"d{i}", "train.csv"), index=False)
+            rows = rng.integers(0, 40, size=10)
+            pd.DataFrame({"x": self.ideal_df["x"].values[rows], "y": training[rows, 0]}) \
+                .to_csv(os.path.join(self.datasets, f"d{i}", "test.csv"), index=False)
+        self.db = f"sqlite:///{os.path.join(self.tmpdir.name, 'batch.db')}"
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_batch_matches_single_runs(self):
+        """Every dataset of a batch gets the same fit and matches as a separate run."""
+        main(["--db", self.db, "--render", "none", "import"])
+        main(["--db", self.db, "batch", "--datasets", self.datasets])
+        best_fit = pd.read_csv("ideal_vs_training_batch.csv")
+        table = pd.read_sql('SELECT * FROM "Table 3 batch"', f"sqlite:///{os.path.join(self.tmpdir.name, 'batch.db')}")
+        self.assertEqual(sorted(best_fit["Dataset"].unique()), ["d0", "d1", "d2"])
+
+        for dataset in ["d0", "d1", "d2"]:
+            training_df = pd.read_csv(os.path.join(self.datasets, dataset, "train.csv"))
+            training_df.columns = ["x"] + [f"{column} (training func)" for column in training_df.columns[1:]]
+            test_df = pd.read_csv(os.path.join(self.datasets, dataset, "test.csv"))
+            test_df["ID"] = range(1, len(test_df) + 1)
+            expected_fit = fit(training_df, self.ideal_df)
+            batch_fit = best_fit[best_fit["Dataset"] == dataset]
+            self.assertEqual(batch_fit["Ideal Function"].tolist(), expected_fit["Ideal Function"].tolist())
+
+            funcs = expected_fit["Ideal Function"].tolist()
+            max_devs = calculate_max_deviations(training_df, self.ideal_df, expected_fit["Training Function"], funcs)
+            expected = compute_matches(test_df, self.ideal_df, max_devs, funcs)
+            expected = expected[expected["within_threshold"]]
+            batch_rows = table[table["Dataset"] == dataset]
+            np.testing.assert_allclose(batch_rows["X (test func)"], expected["X (test func)"])
+            self.assertEqual(batch_rows["No. of ideal func"].tolist(), expected["No. of ideal func"].astype(str).tolist())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from BenchmarkPipeline import run_benchmarks, compare_reports
+
+class TestBenchmarkPipeline(unittest.TestCase):
+
+    def test_run_benchmarks_writes_json(self):
+        """A tiny run times every requested stage at every scale and writes the report."""
+        stages = ["importcsv", "load_df", "get_min_sse", "calculate_max_deviations", "match_test_to_ideal"]
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "benchmark.json")
+            report = run_benchmarks(row_scales=[1, 2], func_scales=[1], stages=stages, repeats=1, output=output,
+                                    base_rows=20, base_tests=5)
+            with open(output) as handle:
+                self.assertEqual(json.load(handle), report)
+
+        self.assertEqual(len(report["results"]), 2 * len(stages))
+        self.assertEqual({result["rows"] for result in report["results"]}, {20, 40})
+
+    def test_compare_reports(self):
+        baseline = {"results": [{"stage": "get_min_sse", "row_scale": 1, "func_scale": 1, "seconds": 1.0}]}
+        current = {"results": [{"stage": "get_min_sse", "row_scale": 1, "func_scale": 1, "seconds": 1.5}]}
+        self.assertEqual(compare_reports(current, baseline), [("get_min_sse", 1, 1, None, 1.5)])
+        self.assertEqual(compare_reports(current, baseline, threshold=2.0), [])
+
+if __name__ == '__main__':
+    unittest.main()
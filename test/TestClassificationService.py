@@ -0,0 +1,140 @@
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+from EvaluateTestData import compute_matches
+from ClassificationService import Classifier, ClassificationService, ServiceClient
+
+class TestClassificationService(unittest.TestCase):
+
+    def setUp(self):
+        self.ideal_df = pd.DataFrame({
+            'x': [1.0, 2.0, 3.0],
+            'y1 (ideal func)': [1.0, 2.0, 3.0],
+            'y2 (ideal func)': [0.0, 0.0, 0.0]
+        })
+        self.max_devs = {'y1': 0.6, 'y2': 0.2}
+        self.factories = 0
+
+    def classifier_factory(self):
+        # Every refit selects the other ideal function first, so a swap is visible in the responses
+        self.factories += 1
+        funcs = ['y1', 'y2'] if self.factories % 2 else ['y2', 'y1']
+        return Classifier(self.ideal_df, funcs, self.max_devs)
+
+    def run_service(self, client_code, unix_path=None):
+        async def run():
+            service = ClassificationService(self.classifier_factory)
+            server = await service.start(port=0, unix_path=unix_path)
+            port = None if unix_path else server.sockets[0].getsockname()[1]
+            try:
+                return await client_code(service, lambda: ServiceClient(port=port, unix_path=unix_path))
+            finally:
+                await service.close()
+        return asyncio.run(run())
+
+    def test_classify_matches_compute_matches(self):
+        points = [(1.0, 1.1), (2.0, 0.1), (3.0, 9.0), (5.0, 0.0)]
+
+        async def client_code(service, new_client):
+            client = new_client()
+            try:
+                return await client.classify(points)
+            finally:
+                await client.close()
+        results = self.run_service(client_code)
+
+        test_df = pd.DataFrame(points, columns=['x', 'y'])
+        test_df['ID'] = range(1, len(test_df) + 1)
+        expected = compute_matches(test_df, self.ideal_df, self.max_devs, ['y1', 'y2'])
+        matched = expected[expected['within_threshold']]
+        for point_id, result in enumerate(results, start=1):
+            self.assertEqual(result['ideal_funcs'],
+                             matched.loc[matched['ID'] == point_id, 'No. of ideal func'].astype(str).tolist())
+        self.assertEqual([result['found'] for result in results], [True, True, True, False])
+        self.assertIsNone(results[3]['delta_y'])
+        np.testing.assert_allclose(list(results[0]['delta_y'].values()), [0.1, 1.1])
+
+    def test_concurrent_requests_are_batched(self):
+        async def client_code(service, new_client):
+            clients = [new_client() for _ in range(8)]
+            try:
+                results = await asyncio.gather(*[client.classify([(2.0, 2.0 + i / 10)]) for i, client in
+                                                 enumerate(clients)])
+                status, health = await clients[0].request("GET", "/health")
+                return results, health
+            finally:
+                for client in clients:
+                    await client.close()
+        results, health = self.run_service(client_code)
+
+        self.assertEqual([result[0]['y'] for result in results], [2.0 + i / 10 for i in range(8)])
+        self.assertEqual([result[0]['ideal_funcs'] for result in results], [['y1']] * 6 + [[]] * 2)
+        self.assertEqual(health['requests'], 8)
+        self.assertLessEqual(health['batches'], 8)
+
+    def test_refit_and_errors(self):
+        async def client_code(service, new_client):
+            client = new_client()
+            try:
+                before = (await client.request("GET", "/health"))[1]['ideal_funcs']
+                await client.refit()
+                after = (await client.request("GET", "/health"))[1]['ideal_funcs']
+                bad_request = (await client.request("POST", "/classify", {"x": [1.0]}))[0]
+                flat_points = (await client.request("POST", "/classify", {"points": [1.0, 2.0, 3.0, 4.0]}))[0]
+                not_found = (await client.request("GET", "/unknown"))[0]
+                return before, after, bad_request, flat_points, not_found
+            finally:
+                await client.close()
+        before, after, bad_request, flat_points, not_found = self.run_service(client_code)
+        self.assertEqual((before, after), (['y1', 'y2'], ['y2', 'y1']))
+        self.assertEqual((bad_request, flat_points, not_found), (400, 400, 404))
+
+    def test_classify_during_refit(self):
+        """The old classifier keeps answering while a refit builds the new one."""
+        release = threading.Event()
+        factory = self.classifier_factory
+
+        def slow_factory():
+            if self.factories:
+                release.wait(10)
+            return factory()
+        self.classifier_factory = slow_factory
+
+        async def client_code(service, new_client):
+            refit_client, client = new_client(), new_client()
+            try:
+                refit = asyncio.create_task(refit_client.refit())
+                results = await asyncio.wait_for(client.classify([(1.0, 1.0)]), 5)
+                release.set()
+                await refit
+                return results, (await client.request("GET", "/health"))[1]['ideal_funcs']
+            finally:
+                release.set()
+                await refit_client.close()
+                await client.close()
+        results, after = self.run_service(client_code)
+        self.assertEqual(results[0]['ideal_funcs'], ['y1'])
+        self.assertEqual(after, ['y2', 'y1'])
+
+    def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            async def client_code(service, new_client):
+                client = new_client()
+                try:
+                    return await client.classify([(1.0, 1.0)])
+                finally:
+                    await client.close()
+            results = self.run_service(client_code, unix_path=os.path.join(tmpdir, "classify.sock"))
+        self.assertEqual(results[0]['ideal_funcs'], ['y1'])
+
+if __name__ == '__main__':
+    unittest.main()
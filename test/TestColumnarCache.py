@@ -0,0 +1,81 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pandas as pd
+import numpy as np
+from ConfigandImport import Base, Parent, Trainingdata
+from ColumnarCache import load_cached_df
+from FindIdealFunctions import load_df
+
+class TestColumnarCache(unittest.TestCase):
+
+    def setUp(self):
+        # The cache only applies to file databases
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, "cache")
+        engine, Session = Parent.setup_database(f"sqlite:///{self.tmpdir.name}/test.db")
+        Base.metadata.create_all(engine)
+        self.session = Session()
+        self.session.add_all([Trainingdata(x=float(x), y1=1.0, y2=2.0, y3=3.0, y4=4.0) for x in range(5)])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.session.bind.dispose()
+        self.tmpdir.cleanup()
+
+    def test_cached_table_matches_sql(self):
+        expected = pd.read_sql(self.session.query(Trainingdata).statement, self.session.bind)
+        first = load_cached_df(self.session, Trainingdata, self.cache_dir)
+        second = load_cached_df(self.session, Trainingdata, self.cache_dir)
+        pd.testing.assert_frame_equal(first, expected)
+        pd.testing.assert_frame_equal(second, expected)
+        # Cached columns are memory-mapped, not copied
+        self.assertIsInstance(second['x'].values, np.memmap)
+
+    def test_cache_invalidated_on_change(self):
+        load_cached_df(self.session, Trainingdata, self.cache_dir)
+        self.session.query(Trainingdata).filter(Trainingdata.x == 0.0).update({Trainingdata.y1: 10.0})
+        self.session.commit()
+        reloaded = load_cached_df(self.session, Trainingdata, self.cache_dir)
+        self.assertEqual(reloaded['y1 (training func)'].iloc[0], 10.0)
+
+    def test_cache_invalidated_on_same_sums(self):
+        """Edits that keep the plain and rowid-weighted column sums, or change a value by one ulp, are detected."""
+        load_cached_df(self.session, Trainingdata, self.cache_dir)
+        for x, delta in [(1.0, 0.25), (2.0, -0.5), (3.0, 0.25)]:
+            self.session.query(Trainingdata).filter(Trainingdata.x == x).update({Trainingdata.y2: 2.0 + delta})
+        self.session.commit()
+        reloaded = load_cached_df(self.session, Trainingdata, self.cache_dir)
+        self.assertEqual(reloaded['y2 (training func)'].tolist(), [2.0, 2.25, 1.5, 2.25, 2.0])
+
+        self.session.query(Trainingdata).filter(Trainingdata.x == 4.0).update(
+            {Trainingdata.y3: float(np.nextafter(3.0, 4.0))})
+        self.session.commit()
+        reloaded = load_cached_df(self.session, Trainingdata, self.cache_dir)
+        self.assertEqual(reloaded['y3 (training func)'].iloc[4], np.nextafter(3.0, 4.0))
+
+    def test_projection_and_x_range(self):
+        """Columns and x bounds are applied the same way through SQL and through the cache."""
+        columns = ['x', 'y3 (training func)']
+        from_sql = load_df(self.session, Trainingdata, columns=columns, x_range=(1.0, 3.0))
+        from_cache = load_df(self.session, Trainingdata, cache_dir=self.cache_dir, columns=columns, x_range=(1.0, 3.0))
+        self.assertEqual(list(from_sql.columns), columns)
+        self.assertEqual(from_sql['x'].tolist(), [1.0, 2.0, 3.0])
+        pd.testing.assert_frame_equal(from_cache, from_sql)
+        # Sorted x values are selected by slicing the memory maps
+        self.assertIsInstance(from_cache['x'].values, np.memmap)
+
+        open_ended = load_df(self.session, Trainingdata, cache_dir=self.cache_dir, columns=['y4 (training func)'],
+                             x_range=(None, 1.0))
+        self.assertEqual(open_ended['y4 (training func)'].tolist(), [4.0, 4.0])
+        with self.assertRaises(KeyError):
+            load_df(self.session, Trainingdata, cache_dir=self.cache_dir, columns=['y5 (training func)'])
+
+if __name__ == '__main__':
+    unittest.main()
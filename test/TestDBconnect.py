@@ -1,12 +1,14 @@
 import sys
 import os
+import tempfile
 import unittest
 
 # Add the 'src' directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
 # Now import your module
-from ConfigandImport import Parent
+from ConfigandImport import Base, Parent, create_db_engine
+from sqlalchemy import inspect, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
@@ -23,5 +25,34 @@ class TestConfigAndImport(unittest.TestCase):
         # Check that Session is a sessionmaker instance
         self.assertIsInstance(Session, sessionmaker)
 
+    def test_engine_is_shared_and_configured(self):
+        """File databases share one engine whose connections use WAL and the configured pragmas."""
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = f"sqlite:///{os.path.join(directory, 'test.db')}"
+            engine = create_db_engine(db_path)
+            self.assertIs(create_db_engine(db_path), engine)
+            with engine.connect() as connection:
+                self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+                self.assertEqual(connection.execute(text("PRAGMA synchronous")).scalar(), 1)  # NORMAL
+                self.assertEqual(connection.execute(text("PRAGMA busy_timeout")).scalar(), 5000)
+            engine.dispose()
+
+        # Every in-memory database is separate
+        self.assertIsNot(create_db_engine("sqlite:///:memory:"), create_db_engine("sqlite:///:memory:"))
+
+    def test_missing_indexes_are_created(self):
+        """setup_database adds the index on testdata.x to a database created without it."""
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = f"sqlite:///{os.path.join(directory, 'test.db')}"
+            engine = create_db_engine(db_path, shared=False)
+            with engine.begin() as connection:
+                connection.execute(text("CREATE TABLE testdata (id INTEGER PRIMARY KEY, x FLOAT, y FLOAT)"))
+            engine.dispose()
+
+            engine, _ = Parent.setup_database(db_path)
+            indexed = [index["column_names"] for index in inspect(engine).get_indexes("testdata")]
+            self.assertIn(["x"], indexed)
+            engine.dispose()
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+from Vizualisationsbokeh import minmax_downsample_indices, plot_ideal_functions_with_bands_bokeh
+
+class TestDownsampling(unittest.TestCase):
+
+    def test_extremes_of_every_line_are_kept(self):
+        x = np.linspace(0.0, 10.0, 1000)
+        first, second = np.sin(x), np.cos(3 * x)
+        first[123] = 50.0   # Spikes must survive the downsampling
+        second[876] = -50.0
+        rows = minmax_downsample_indices(len(x), [first, second], max_points=100)
+        self.assertLessEqual(len(rows), 2 * 100 + 2)
+        self.assertTrue(np.all(np.diff(rows) > 0))
+        self.assertEqual((rows[0], rows[-1]), (0, 999))
+        self.assertIn(123, rows)
+        self.assertIn(876, rows)
+
+    def test_short_lines_are_not_downsampled(self):
+        np.testing.assert_array_equal(minmax_downsample_indices(5, [np.arange(5.0)], 10), np.arange(5))
+        np.testing.assert_array_equal(minmax_downsample_indices(5, [np.arange(5.0)], None), np.arange(5))
+
+    def test_missing_values(self):
+        rows = minmax_downsample_indices(9, [np.array([np.nan] * 4 + [1.0, np.nan, 3.0, np.nan, np.nan])], 4)
+        self.assertTrue(np.all((rows >= 0) & (rows < 9)))
+        self.assertIn(4, rows)
+        self.assertIn(6, rows)
+
+    def test_downsampled_plot_is_smaller(self):
+        """The shared-source WebGL mode writes a much smaller HTML file for long ideal functions."""
+        x = np.linspace(-20.0, 20.0, 20000)
+        ideal_df = pd.DataFrame({'x': x, 'y1 (ideal func)': np.sin(x), 'y2 (ideal func)': x})
+        test_df = pd.DataFrame({'X (test func)': [0.0], 'Y (test func)': [0.0], 'ID': [1], 'No. of ideal func': ['y1']})
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                sizes = []
+                for max_points in [None, 500]:
+                    plot_ideal_functions_with_bands_bokeh(ideal_df, ['y1', 'y2'], {'y1': 0.5, 'y2': 0.5}, test_df,
+                                                          test_df.iloc[:0], interactive=False, max_points=max_points)
+                    sizes.append(os.path.getsize("Ideal_Functions_vs_Test_Data.html"))
+                with open("Ideal_Functions_vs_Test_Data.html") as handle:
+                    self.assertIn("webgl", handle.read())
+            finally:
+                os.chdir(cwd)
+        self.assertLess(sizes[1] * 5, sizes[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+from ConfigandImport import Base, Parent, Idealfunctionarrays
+from FindIdealFunctions import get_min_sse
+import IdealIndex as ideal_index_module
+from IdealIndex import IdealIndex, sync_index, fetch_ideal_functions, get_min_sse_indexed, SYNC_SAMPLE_FUNCTIONS
+
+def make_library(n_functions, seed=0):
+    # Smooth ideal functions: random low-order polynomials and sine waves on a shared x grid
+    rng = np.random.default_rng(seed)
+    x = np.linspace(-5.0, 5.0, 200)
+    columns = {'x': x}
+    for i in range(1, n_functions + 1):
+        a, b, c, f = rng.normal(size=4)
+        columns[f'y{i} (ideal func)'] = a * x + b * x ** 2 / 5 + c * np.sin(f * x)
+    return pd.DataFrame(columns)
+
+class TestIdealIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.ideal_df = make_library(2000)
+        self.ideal_array = self.ideal_df.iloc[:, 1:].to_numpy()
+        rng = np.random.default_rng(1)
+        training = {'x': self.ideal_df['x']}
+        for j, i in enumerate([7, 512, 1999, 1200], start=1):
+            training[f'y{j} (training func)'] = self.ideal_array[:, i - 1] + rng.normal(scale=0.3, size=200)
+        self.training_df = pd.DataFrame(training)
+        self.fetch = lambda ids: self.ideal_array[:, np.asarray(ids) - 1]
+
+    def test_search_matches_exhaustive_search(self):
+        """The index returns the exact top-k of get_min_sse while reading only a fraction of the functions."""
+        index = IdealIndex.build(self.ideal_array)
+        for top_k in [1, 3]:
+            indexed = get_min_sse_indexed(self.training_df, index, self.fetch, top_k)
+            exhaustive = get_min_sse(self.training_df, self.ideal_df, top_k)
+            self.assertEqual([result['ideal_func'] for result in indexed.values()],
+                             [result['ideal_func'] for result in exhaustive.values()])
+            for func in exhaustive:
+                self.assertAlmostEqual(indexed[func]['min_sse'], exhaustive[func]['min_sse'])
+                if top_k > 1:
+                    self.assertEqual([name for name, _ in indexed[func]['candidates']],
+                                     [name for name, _ in exhaustive[func]['candidates']])
+        self.assertLess(index.verified, len(index) // 4)
+
+    def test_incremental_update_and_persistence(self):
+        """Functions added after a save are indexed without changing the results."""
+        with tempfile.TemporaryDirectory() as directory:
+            IdealIndex.build(self.ideal_array[:, :1500]).save(directory)
+            index = IdealIndex.load(directory)
+            index.add(self.ideal_array[:, 1500:])
+            self.assertEqual(index.function_ids.tolist(), list(range(1, 2001)))
+            indexed = get_min_sse_indexed(self.training_df, index, self.fetch)
+            exhaustive = get_min_sse(self.training_df, self.ideal_df)
+            for func in exhaustive:
+                self.assertEqual(indexed[func]['ideal_func'], exhaustive[func]['ideal_func'])
+                self.assertAlmostEqual(indexed[func]['min_sse'], exhaustive[func]['min_sse'])
+            self.assertIsNone(IdealIndex.load(os.path.join(directory, "missing")))
+
+    def make_session(self):
+        engine, Session = Parent.setup_database("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        session = Session()
+        self.addCleanup(session.close)
+        return session
+
+    def test_sync_index_embeds_only_new_functions(self):
+        session = self.make_session()
+        library = make_library(60)
+        Idealfunctionarrays.insert_df(library.iloc[:, :41], session)
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(len(sync_index(session, Idealfunctionarrays, directory)), 40)
+            Idealfunctionarrays.insert_df(library.iloc[:, 41:], session, include_x=False)
+            embedded, fetched = [], []
+            original, original_fetch = IdealIndex.add, ideal_index_module.fetch_ideal_functions
+
+            def recording_add(index, ideal_array, function_ids=None):
+                embedded.extend(function_ids)
+                return original(index, ideal_array, function_ids)
+
+            def recording_fetch(session, model, function_ids):
+                fetched.extend(function_ids)
+                return original_fetch(session, model, function_ids)
+
+            IdealIndex.add, ideal_index_module.fetch_ideal_functions = recording_add, recording_fetch
+            try:
+                index = sync_index(session, Idealfunctionarrays, directory)
+            finally:
+                IdealIndex.add, ideal_index_module.fetch_ideal_functions = original, original_fetch
+            self.assertEqual(embedded, list(range(41, 61)))
+            self.assertEqual(len(index), 60)
+            # Only the new functions and the sample of indexed ones are read
+            self.assertEqual(fetched[-20:], list(range(41, 61)))
+            self.assertLessEqual(len(fetched), 20 + SYNC_SAMPLE_FUNCTIONS)
+
+            training_df = pd.DataFrame({'x': library['x'], 'y1 (training func)': library['y42 (ideal func)']})
+            min_sse = get_min_sse_indexed(training_df, index,
+                                          lambda ids: fetch_ideal_functions(session, Idealfunctionarrays, ids))
+            self.assertEqual(min_sse['y1']['ideal_func'], 'y42')
+
+    def test_sync_index_follows_changed_values(self):
+        """Functions rewritten in place (with verify), reimports and a different x grid are picked up by sync_index."""
+        session = self.make_session()
+        library = make_library(300)
+        Idealfunctionarrays.insert_df(library, session)
+        fetch = lambda ids: fetch_ideal_functions(session, Idealfunctionarrays, ids)
+
+        with tempfile.TemporaryDirectory() as directory:
+            sync_index(session, Idealfunctionarrays, directory)
+            # y5 becomes the exact copy of the training function; its old embedding would prune it
+            changed = library.copy()
+            changed['y5 (ideal func)'] = changed['y250 (ideal func)'] * 3 + 7
+            session.query(Idealfunctionarrays).filter_by(function_id=5).update(
+                {Idealfunctionarrays.values: changed['y5 (ideal func)'].to_numpy(dtype="<f8").tobytes()})
+            session.commit()
+            training_df = pd.DataFrame({'x': changed['x'], 'y1 (training func)': changed['y5 (ideal func)']})
+
+            index = sync_index(session, Idealfunctionarrays, directory, verify=True)
+            indexed = get_min_sse_indexed(training_df, index, fetch)
+            self.assertEqual(indexed['y1']['ideal_func'], get_min_sse(training_df, changed)['y1']['ideal_func'])
+            self.assertEqual(indexed['y1']['ideal_func'], 'y5')
+
+            # Reimport on the same grid with other values: the sampled functions reveal it without verify
+            session.query(Idealfunctionarrays).delete()
+            reimported = make_library(300, seed=1)
+            Idealfunctionarrays.insert_df(reimported, session)
+            index = sync_index(session, Idealfunctionarrays, directory)
+            training_df = pd.DataFrame({'x': reimported['x'], 'y1 (training func)': reimported['y123 (ideal func)']})
+            self.assertEqual(get_min_sse_indexed(training_df, index, fetch)['y1']['ideal_func'], 'y123')
+
+            # Reimport on a coarser grid with the same function names
+            session.query(Idealfunctionarrays).delete()
+            coarse = library.iloc[::2].reset_index(drop=True)
+            Idealfunctionarrays.insert_df(coarse, session)
+            index = sync_index(session, Idealfunctionarrays, directory)
+            self.assertEqual(index.n_points, 100)
+            training_df = pd.DataFrame({'x': coarse['x'], 'y1 (training func)': coarse['y17 (ideal func)']})
+            self.assertEqual(get_min_sse_indexed(training_df, index, fetch)['y1']['ideal_func'], 'y17')
+
+if __name__ == '__main__':
+    unittest.main()
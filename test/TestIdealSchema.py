@@ -0,0 +1,70 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+from ConfigandImport import Base, Parent, Idealfunctions, Idealfunctionarrays, migrate_ideal_functions
+from FindIdealFunctions import load_df, iter_ideal_blocks
+
+class TestIdealSchema(unittest.TestCase):
+
+    def setUp(self):
+        # Small ideal functions CSV shaped like ideal.csv, with the first 5 of the 50 functions varying
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ideal_file = os.path.join(self.tmpdir.name, "ideal.csv")
+        x = np.linspace(-2.0, 2.0, 9)
+        data = {'x': x}
+        for i in range(1, 51):
+            data[f'y{i}'] = x * i if i <= 5 else np.full(len(x), float(i))
+        pd.DataFrame(data).to_csv(self.ideal_file, index=False)
+
+        engine, Session = Parent.setup_database("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        self.session = Session()
+
+    def tearDown(self):
+        self.session.close()
+        self.tmpdir.cleanup()
+
+    def test_long_import_matches_wide_import(self):
+        """The long table loads into the same DataFrame as the wide table."""
+        Idealfunctions.importcsv(self.ideal_file, self.session, bulk=True)
+        Idealfunctionarrays.importcsv(self.ideal_file, self.session, chunksize=7)
+        wide_df = load_df(self.session, Idealfunctions)
+        long_df = load_df(self.session, Idealfunctionarrays)
+        pd.testing.assert_frame_equal(long_df, wide_df)
+
+    def test_migration_copies_wide_table(self):
+        """The migration copies every function, can be repeated and refuses an empty wide table."""
+        with self.assertRaises(ValueError):
+            migrate_ideal_functions(self.session)
+        Idealfunctions.importcsv(self.ideal_file, self.session, bulk=True)
+        self.assertEqual(migrate_ideal_functions(self.session), 50)
+        self.assertEqual(migrate_ideal_functions(self.session), 50)
+        self.assertEqual(Idealfunctionarrays.function_ids(self.session), list(range(1, 51)))
+        pd.testing.assert_frame_equal(load_df(self.session, Idealfunctionarrays),
+                                      load_df(self.session, Idealfunctions))
+
+    def test_projection_and_blocks(self):
+        """Projections, x ranges and column blocks select the same data as the wide table."""
+        Idealfunctions.importcsv(self.ideal_file, self.session, bulk=True)
+        Idealfunctionarrays.importcsv(self.ideal_file, self.session)
+        columns = ['x', 'y3 (ideal func)', 'y1 (ideal func)']
+        long_df = load_df(self.session, Idealfunctionarrays, columns=columns, x_range=(-1.0, 1.0))
+        wide_df = load_df(self.session, Idealfunctions, columns=columns, x_range=(-1.0, 1.0))
+        pd.testing.assert_frame_equal(long_df[sorted(columns)], wide_df[sorted(columns)])
+
+        long_blocks = np.hstack([block for _, block in iter_ideal_blocks(self.session, Idealfunctionarrays, 8)])
+        wide_blocks = np.hstack([block for _, block in iter_ideal_blocks(self.session, Idealfunctions, 8)])
+        np.testing.assert_array_equal(long_blocks, wide_blocks)
+
+        with self.assertRaises(KeyError):
+            load_df(self.session, Idealfunctionarrays, columns=['x', 'y51 (ideal func)'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pandas as pd
+from ConfigandImport import Base, Parent, Trainingdata, Testdata
+
+class TestImportCSV(unittest.TestCase):
+
+    def setUp(self):
+        # Small CSV files shaped like train.csv and test.csv
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.train_file = os.path.join(self.tmpdir.name, "train.csv")
+        self.test_file = os.path.join(self.tmpdir.name, "test.csv")
+        pd.DataFrame({
+            'x': [float(x) for x in range(10)],
+            'y1': [1.0] * 10, 'y2': [2.0] * 10, 'y3': [3.0] * 10, 'y4': [4.0] * 10
+        }).to_csv(self.train_file, index=False)
+        pd.DataFrame({'x': [0.5, 1.5, 2.5], 'y': [1.0, 2.0, 3.0]}).to_csv(self.test_file, index=False)
+
+        engine, Session = Parent.setup_database("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        self.session = Session()
+
+    def tearDown(self):
+        self.session.close()
+        self.tmpdir.cleanup()
+
+    def test_bulk_import_matches_row_import(self):
+        """Bulk mode inserts the same rows as the ORM row-by-row path, across several chunks."""
+        Trainingdata.importcsv(self.train_file, self.session, bulk=True, chunksize=3)
+        bulk_rows = pd.read_sql(self.session.query(Trainingdata).statement, self.session.bind)
+        self.session.query(Trainingdata).delete()
+        self.session.commit()
+
+        Trainingdata.importcsv(self.train_file, self.session)
+        orm_rows = pd.read_sql(self.session.query(Trainingdata).statement, self.session.bind)
+
+        self.assertEqual(len(bulk_rows), 10)
+        pd.testing.assert_frame_equal(bulk_rows, orm_rows)
+
+    def test_bulk_import_autoincrement_id(self):
+        """The autoincrement id of Testdata is generated by the database in bulk mode."""
+        Testdata.importcsv(self.test_file, self.session, bulk=True)
+        rows = pd.read_sql(self.session.query(Testdata).statement, self.session.bind)
+        self.assertEqual(rows['id'].tolist(), [1, 2, 3])
+
+    def test_bulk_import_missing_column_rolls_back(self):
+        """A CSV without the mapped columns leaves the table empty."""
+        Trainingdata.importcsv(self.test_file, self.session, bulk=True)
+        self.assertEqual(self.session.query(Trainingdata).count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
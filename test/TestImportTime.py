@@ -0,0 +1,44 @@
+import sys
+import os
+import json
+import tempfile
+import subprocess
+import unittest
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+
+# Pipeline modules that batch jobs import; none of them may load plotting libraries or connect to a database
+PIPELINE_MODULES = ["ConfigandImport", "FindIdealFunctions", "EvaluateTestData", "StreamTestData",
+                    "ParallelMatching", "Pipeline"]
+PLOTTING_MODULES = ["bokeh", "matplotlib", "seaborn"]
+
+# Seconds allowed for importing the pipeline modules on top of numpy, pandas and SQLAlchemy
+IMPORT_TIME_BUDGET = 1.0
+
+IMPORT_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {src!r})
+import numpy, pandas, sqlalchemy, sqlalchemy.orm
+start_time = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{"seconds": time.perf_counter() - start_time,
+                  "plotting": [name for name in {plotting!r} if name in sys.modules]}}))
+"""
+
+class TestImportTime(unittest.TestCase):
+
+    def test_imports_are_light_and_side_effect_free(self):
+        """Importing the pipeline stays within budget, loads no plotting library and creates no database."""
+        script = IMPORT_SCRIPT.format(src=SRC_DIR, modules=PIPELINE_MODULES, plotting=PLOTTING_MODULES)
+        with tempfile.TemporaryDirectory() as directory:
+            completed = subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True,
+                                       text=True, check=True)
+            self.assertEqual(os.listdir(directory), [])
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.assertEqual(result["plotting"], [])
+        self.assertNotIn("Setting up database connection", completed.stdout)
+        self.assertLess(result["seconds"], IMPORT_TIME_BUDGET)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import sys
+import os
+import io
+import tempfile
+import unittest
+import contextlib
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+import FindIdealFunctions
+from FindIdealFunctions import get_min_sse
+from EvaluateTestData import calculate_max_deviations
+from IncrementalFit import FitAccumulator, fit_incremental
+from BenchmarkPipeline import generate_datasets
+from Pipeline import main
+
+class TestIncrementalFit(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        x = np.round(np.linspace(-10.0, 10.0, 120), 6)
+        ideal = rng.normal(size=(120, 30)).cumsum(axis=0)
+        self.ideal_df = pd.DataFrame(ideal, columns=[f"y{i} (ideal func)" for i in range(1, 31)])
+        self.ideal_df.insert(0, "x", x)
+        training = ideal[:, [3, 17, 22, 8]] + rng.normal(scale=0.2, size=(120, 4))
+        self.training_df = pd.DataFrame(training, columns=[f"y{j} (training func)" for j in range(1, 5)])
+        self.training_df.insert(0, "x", x)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.tmpdir.name, "fit_state.npz")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def assert_matches_full_fit(self, accumulator, training_df, ideal_df):
+        full = get_min_sse(training_df, ideal_df)
+        incremental = accumulator.min_sse()
+        for func in full:
+            self.assertEqual(incremental[func]['ideal_func'], full[func]['ideal_func'])
+            self.assertAlmostEqual(incremental[func]['min_sse'], full[func]['min_sse'], places=6)
+        funcs = [result['ideal_func'] for result in full.values()]
+        expected = calculate_max_deviations(training_df, ideal_df, list(full), funcs)
+        np.testing.assert_allclose(list(accumulator.max_deviations(list(full), funcs).values()),
+                                   list(expected.values()))
+
+    def test_appended_rows_and_functions(self):
+        """Appending rows and ideal functions gives the same fit as a full recompute."""
+        accumulator = fit_incremental(self.training_df.iloc[:80], self.ideal_df.iloc[:80, :21], self.state_file)
+        self.assertEqual(len(accumulator.x), 80)
+
+        # New rows and new ideal functions at once; only the delta is processed
+        accumulator = fit_incremental(self.training_df, self.ideal_df, self.state_file)
+        self.assertEqual(accumulator.update(self.training_df, self.ideal_df), (0, 0))
+        self.assertEqual(len(accumulator.x), 120)
+        self.assertEqual(len(accumulator.ideal_funcs), 30)
+        self.assertTrue(accumulator.verify(self.training_df, self.ideal_df))
+        self.assert_matches_full_fit(accumulator, self.training_df, self.ideal_df)
+
+    def test_verify_rebuilds_changed_state(self):
+        """Rows changed in place are caught by the consistency check and the state is rebuilt."""
+        fit_incremental(self.training_df, self.ideal_df, self.state_file)
+        changed_df = self.ideal_df.copy()
+        changed_df.iloc[5, 1:] += 100.0
+        self.assertFalse(FitAccumulator.load(self.state_file).verify(self.training_df, changed_df))
+        accumulator = fit_incremental(self.training_df, changed_df, self.state_file, verify=True)
+        self.assertTrue(accumulator.verify(self.training_df, changed_df))
+        self.assert_matches_full_fit(accumulator, self.training_df, changed_df)
+
+    def test_changed_values_restart_accumulation(self):
+        """Values changed throughout the accumulated rows, as after a reimport, are detected without verify."""
+        fit_incremental(self.training_df, self.ideal_df, self.state_file)
+        changed_df = self.ideal_df.copy()
+        changed_df.iloc[:, 1:] = changed_df.iloc[:, 1:].values[:, ::-1]
+        accumulator = fit_incremental(self.training_df, changed_df, self.state_file)
+        self.assert_matches_full_fit(accumulator, self.training_df, changed_df)
+
+    def test_reimport_with_changed_values(self):
+        """An incremental fit after importing different data on the same x grid matches a full fit."""
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        self.addCleanup(os.chdir, cwd)
+        db = f"sqlite:///{os.path.join(self.tmpdir.name, 'incremental.db')}"
+        generate_datasets(self.tmpdir.name, base_rows=40, base_tests=10, seed=0)
+        main(["--db", db, "--render", "none", "import"])
+        main(["--db", db, "--render", "none", "fit", "--incremental"])
+
+        generate_datasets(self.tmpdir.name, base_rows=40, base_tests=10, seed=3)
+        main(["--db", db, "--render", "none", "import"])
+        main(["--db", db, "--render", "none", "fit", "--incremental"])
+        incremental = pd.read_csv("ideal_vs_training.csv")
+        main(["--db", db, "--render", "none", "fit", "--incremental", "--verify-incremental"])
+        verified = pd.read_csv("ideal_vs_training.csv")
+        main(["--db", db, "--render", "none", "fit"])
+        full = pd.read_csv("ideal_vs_training.csv")
+        for fit_df in [incremental, verified]:
+            self.assertEqual(fit_df["Ideal Function"].tolist(), full["Ideal Function"].tolist())
+            np.testing.assert_allclose(fit_df["SSE"], full["SSE"])
+        self.assertEqual(len(os.listdir(".fit_state")), 1)
+
+    def test_incremental_rejects_block_size_and_index(self):
+        """The incremental fit is not silently dropped when a block size or the index is requested."""
+        db = f"sqlite:///{os.path.join(self.tmpdir.name, 'incremental.db')}"
+        for options in [["--incremental", "--block-size", "10"], ["--verify-incremental", "--index"]]:
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                main(["--db", db, "--render", "none", "fit"] + options)
+        with self.assertRaises(ValueError):
+            FindIdealFunctions.main(block_size=10, incremental=True)
+
+if __name__ == '__main__':
+    unittest.main()
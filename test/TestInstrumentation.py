@@ -0,0 +1,35 @@
+import sys
+import os
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from Instrumentation import Metrics
+
+class TestMetrics(unittest.TestCase):
+
+    def test_disabled_metrics_record_nothing(self):
+        metrics = Metrics(enabled=False)
+        with metrics.stage("load", rows=10) as stage:
+            stage.add_rows(5)
+        self.assertEqual(metrics.records, [])
+
+    def test_enabled_metrics_record_stages(self):
+        metrics = Metrics(enabled=True, profile=["tracemalloc"])
+        with metrics.stage("load") as stage:
+            stage.add_rows(3)
+            stage.add_rows(4)
+        with metrics.stage("load", rows=1):
+            pass
+
+        self.assertEqual([record["rows"] for record in metrics.records], [7, 1])
+        self.assertIn("tracemalloc_peak_bytes", metrics.records[0])
+
+        # Repeated stages are summed in the Prometheus output
+        text = metrics.prometheus_text()
+        self.assertIn('pipeline_stage_rows{stage="load"} 8', text)
+        self.assertIn('pipeline_stage_runs{stage="load"} 2', text)
+
+if __name__ == '__main__':
+    unittest.main()
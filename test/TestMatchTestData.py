@@ -0,0 +1,111 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pandas as pd
+import numpy as np
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+from EvaluateTestData import match_test_to_ideal, compute_matches, read_results, write_results, XIndex
+from ParallelMatching import compute_matches_parallel
+
+class TestMatchTestToIdeal(unittest.TestCase):
+
+    def setUp(self):
+        # match_test_to_ideal writes its results file to the working directory
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.session = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+
+        self.ideal_df = pd.DataFrame({
+            'x': [3.0, 1.0, 2.0],
+            'y1 (ideal func)': [3.0, 1.0, 2.0],
+            'y2 (ideal func)': [0.0, 0.0, 0.0]
+        })
+        self.test_df = pd.DataFrame({'x': [2.0, 5.0, 1.0], 'y': [2.5, 0.0, 1.0]})
+        self.max_devs = {'y1': 0.6, 'y2': 0.2}
+
+    def tearDown(self):
+        self.session.close()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_xindex_locate(self):
+        # Unsorted x values are resolved to their original row, unknown x values to -1
+        index = XIndex(self.ideal_df['x'])
+        np.testing.assert_array_equal(index.locate([1.0, 3.0, 2.5]), [1, 0, -1])
+
+    def test_xindex_resolve_modes(self):
+        # On a uniform grid, linear interpolation is exact for lines and cubic interpolation for parabolas
+        x = np.linspace(-2.0, 2.0, 9)
+        index = XIndex(x)
+        self.assertAlmostEqual(index.step, 0.5)
+        values = np.column_stack([2 * x + 1, x ** 2])
+        query = [0.25, -1.9, 3.0]
+
+        linear, found = index.resolve(query, values, mode="linear")
+        np.testing.assert_array_equal(found, [True, True, False])
+        np.testing.assert_allclose(linear[:2, 0], [1.5, -2.8])
+
+        cubic, _ = index.resolve(query, values, mode="cubic")
+        np.testing.assert_allclose(cubic[:2, 1], [0.0625, 3.61])
+
+        # Exact mode only accepts grid points, unless a tolerance is given
+        _, found = index.resolve([0.5 + 1e-9], values)
+        self.assertFalse(found[0])
+        nearest, found = index.resolve([0.5 + 1e-9], values, tolerance=1e-6)
+        self.assertTrue(found[0])
+        np.testing.assert_allclose(nearest[0], [2.0, 0.25])
+
+    def test_match_test_to_ideal(self):
+        results = match_test_to_ideal(self.test_df, self.ideal_df, self.max_devs, ['y1', 'y2'], self.session)
+
+        # The test point at x=5.0 has no ideal row and is dropped
+        self.assertEqual(results['ID'].tolist(), [1, 1, 3, 3])
+        self.assertEqual(results['No. of ideal func'].tolist(), ['y1', 'y2', 'y1', 'y2'])
+        np.testing.assert_allclose(results['Delta Y (test func)'], [0.5, 2.5, 0.0, 1.0])
+        self.assertEqual(results['within_threshold'].tolist(), [True, False, True, False])
+
+        # Only matches within the threshold are exported to Table 3
+        table3 = pd.read_sql('SELECT * FROM "Table 3"', self.session.bind)
+        self.assertEqual(table3['No. of ideal func'].tolist(), ['y1', 'y1'])
+        indexed = [index["column_names"] for index in inspect(self.session.bind).get_indexes("Table 3")]
+        self.assertEqual(sorted(indexed), [["No. of ideal func"], ["X (test func)"]])
+
+    def test_results_file(self):
+        # The results are written once as a typed binary file; CSV is only written on request
+        results = match_test_to_ideal(self.test_df, self.ideal_df, self.max_devs, ['y1', 'y2'], self.session)
+        self.assertEqual(results['No. of ideal func'].dtype, 'category')
+        self.assertEqual(results['within_threshold'].dtype, bool)
+        pd.testing.assert_frame_equal(read_results("Test Data Evaluation.npy"), results)
+        self.assertFalse(os.path.exists("Test Data Evaluation.csv"))
+
+        match_test_to_ideal(self.test_df, self.ideal_df, self.max_devs, ['y1', 'y2'], self.session,
+                            results_format="csv")
+        csv_results = pd.read_csv("Test Data Evaluation.csv", index_col=0)
+        self.assertEqual(csv_results['No. of ideal func'].tolist(), ['y1', 'y2', 'y1', 'y2'])
+
+    def test_results_file_large_function_numbers(self):
+        # Libraries of tens of thousands of functions need function numbers beyond int16
+        ideal_df = self.ideal_df.rename(columns={'y2 (ideal func)': 'y40000 (ideal func)'})
+        max_devs = {'y1': 0.6, 'y40000': 0.2}
+        results = compute_matches(self.test_df.assign(ID=[1, 2, 3]), ideal_df, max_devs, ['y1', 'y40000'])
+        write_results(results, "large.npy")
+        pd.testing.assert_frame_equal(read_results("large.npy"), results)
+
+    def test_compute_matches_parallel(self):
+        # Sharding across processes gives the same rows in the same order as the serial path
+        test_df = pd.DataFrame({'x': [3.0, 2.0, 5.0, 1.0, 2.0], 'y': [3.1, 0.1, 1.0, 0.5, 2.0]})
+        test_df['ID'] = range(1, len(test_df) + 1)
+        serial = compute_matches(test_df, self.ideal_df, self.max_devs, ['y1', 'y2'])
+        parallel = compute_matches_parallel(test_df, self.ideal_df, self.max_devs, ['y1', 'y2'],
+                                            workers=2, shard_size=2)
+        pd.testing.assert_frame_equal(parallel, serial)
+
+if __name__ == '__main__':
+    unittest.main()
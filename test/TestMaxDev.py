@@ -7,7 +7,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'
 
 import pandas as pd
 import numpy as np
-from EvaluateTestData import calculate_max_deviations  # Adjust according to your actual import path
+from EvaluateTestData import calculate_max_deviations, max_deviations_batch  # Adjust according to your actual import path
 
 class TestCalculateMaxDeviations(unittest.TestCase):
     
@@ -38,5 +38,16 @@ class TestCalculateMaxDeviations(unittest.TestCase):
         self.assertEqual(max_devs['y1'], expected_deviations['y1'])
         self.assertEqual(max_devs['y2'], expected_deviations['y2'])
 
+    def test_max_deviations_batch(self):
+        # Pair both training functions with the same ideal function, reporting where the maximum occurs
+        training_array = np.array([[1.0, 2.0], [2.0, 3.0], [3.0, 5.0]])
+        ideal_array = np.array([[1.0], [2.5], [3.0]])
+        result = max_deviations_batch(training_array, ideal_array, [0, 0], x=np.array([10.0, 20.0, 30.0]),
+                                      percentiles=[50])
+
+        np.testing.assert_allclose(result['max_dev'], [0.5 * np.sqrt(2), 2.0 * np.sqrt(2)])
+        np.testing.assert_array_equal(result['argmax_x'], [20.0, 30.0])
+        np.testing.assert_allclose(result['percentiles'][:, 0], [0.0, 1.0 * np.sqrt(2)])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -7,7 +7,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'
 
 import pandas as pd
 import numpy as np
-from FindIdealFunctions import get_min_sse
+from FindIdealFunctions import get_min_sse, get_sse_matrix, get_min_sse_streaming
 
 class TestMinSSE(unittest.TestCase):
     
@@ -45,6 +45,27 @@ class TestMinSSE(unittest.TestCase):
         self.assertEqual(result['y2']['ideal_func'], expected_result['y2']['ideal_func'])
         self.assertEqual(result['y2']['min_sse'], expected_result['y2']['min_sse'])
 
+    def test_get_sse_matrix(self):
+        # Every entry of the matrix must match the direct pairwise SSE
+        matrix = get_sse_matrix(self.training_df, self.ideal_df)
+        for train_col in ['y1', 'y2']:
+            for ideal_col in ['y1', 'y2', 'y3']:
+                expected = np.sum((self.training_df[train_col] - self.ideal_df[ideal_col]) ** 2)
+                self.assertAlmostEqual(matrix.loc[train_col, ideal_col], expected)
+
+    def test_get_min_sse_top_k(self):
+        # Candidates are sorted by SSE and the first one is the overall minimum
+        result = get_min_sse(self.training_df, self.ideal_df, top_k=2)
+        self.assertEqual([func for func, _ in result['y1']['candidates']], ['y1', 'y2'])
+        self.assertEqual([func for func, _ in result['y2']['candidates']], ['y3', 'y2'])
+        self.assertAlmostEqual(result['y2']['candidates'][1][1], 3 * 0.4 ** 2)
+
+    def test_get_min_sse_streaming(self):
+        # Searching one ideal column per block gives the same result as the in-memory search
+        ideal_array = self.ideal_df.iloc[:, 1:].values
+        blocks = ((i, ideal_array[:, i:i + 1]) for i in range(ideal_array.shape[1]))
+        result = get_min_sse_streaming(self.training_df, blocks, top_k=2)
+        self.assertEqual(result, get_min_sse(self.training_df, self.ideal_df, top_k=2))
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
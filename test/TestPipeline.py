@@ -0,0 +1,49 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pandas as pd
+from BenchmarkPipeline import generate_datasets
+from Pipeline import main
+from EvaluateTestData import read_results
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        # The pipeline writes its CSV and HTML outputs to the working directory
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        os.makedirs("Visualisations")
+        generate_datasets(self.tmpdir.name, base_rows=40, base_tests=10)
+        self.db = f"sqlite:///{os.path.join(self.tmpdir.name, 'pipeline.db')}"
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_run_all(self):
+        """run-all imports, fits and evaluates in one process and writes the usual outputs."""
+        main(["--db", self.db, "--render", "file", "run-all"])
+        for artifact in ["Visualisations/Training_vs_Ideal_Functions.html", "Ideal_Functions_vs_Test_Data.html",
+                         "table3_bokeh.html", "Ideal_Function_Counts.png"]:
+            self.assertTrue(os.path.exists(artifact), artifact)
+        best_ideal_df = pd.read_csv("ideal_vs_training.csv")
+        self.assertEqual(best_ideal_df["Training Function"].tolist(), ["y1", "y2", "y3", "y4"])
+        results = read_results("Test Data Evaluation.npy")
+        self.assertEqual(sorted(results["ID"].unique()), list(range(1, 11)))
+
+    def test_subcommands_match_run_all(self):
+        main(["--db", self.db, "--render", "none", "import"])
+        main(["--db", self.db, "--render", "none", "fit"])
+        main(["--db", self.db, "--render", "none", "evaluate", "--best-fit", "ideal_vs_training.csv"])
+        separate = read_results("Test Data Evaluation.npy")
+        main(["--db", self.db, "--render", "none", "run-all", "--skip-import"])
+        pd.testing.assert_frame_equal(read_results("Test Data Evaluation.npy"), separate)
+
+if __name__ == '__main__':
+    unittest.main()
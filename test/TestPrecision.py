@@ -0,0 +1,160 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+from ConfigandImport import Parent, Idealfunctions, import_all
+from FindIdealFunctions import get_min_sse, sse_matrix, create_results_df, check_fit_precision
+from EvaluateTestData import calculate_max_deviations, compute_matches, match_test_to_ideal, check_match_precision
+from ParallelMatching import compute_matches_parallel
+from ClassificationService import Classifier
+from IdealIndex import sync_index, fetch_ideal_functions, get_min_sse_indexed
+from Precision import precision, compare_decisions, PRECISION_CHECK_CANDIDATES
+import BatchDatasets
+
+class TestPrecision(unittest.TestCase):
+
+    def setUp(self):
+        # The columnar cache and the results files are written to the working directory
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+
+        # Values on a 1/8 grid near 1024 are exact in float32, where the offsets of y1 and y2 round away
+        rng = np.random.default_rng(0)
+        x = np.arange(40) * 0.5
+        base = 1024.0 + np.round(np.sin(x) * 8) / 8
+        ideal = rng.normal(size=(40, 50)).cumsum(axis=0)
+        ideal[:, 0] = base + 1e-5
+        ideal[:, 1] = base + 0.9e-5  # The better fit in float64, a tie with y1 in float32
+        self.ideal_df = pd.DataFrame(ideal, columns=[f"y{i} (ideal func)" for i in range(1, 51)])
+        self.ideal_df.insert(0, "x", x)
+        training = np.column_stack([base] + [ideal[:, i] + rng.normal(scale=0.1, size=40) for i in (9, 19, 29)])
+        self.training_df = pd.DataFrame(training, columns=[f"y{j} (training func)" for j in range(1, 5)])
+        self.training_df.insert(0, "x", x)
+        # The first test point is 5e-5 above y1: outside its float64 threshold, within it in float32
+        self.test_df = pd.DataFrame({"x": x[[3, 7, 11]], "y": [base[3] + 5e-5, base[7], base[11] + 1.0]})
+
+        self.training_df.rename(columns=lambda column: column.split(" ")[0]).to_csv("train.csv", index=False)
+        self.ideal_df.rename(columns=lambda column: column.split(" ")[0]).to_csv("ideal.csv", index=False)
+        self.test_df.to_csv("test.csv", index=False)
+
+    def tearDown(self):
+        precision.configure("float64", True)
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_cast_keeps_x(self):
+        """Function columns are converted to float32 while 'x' keeps float64 for the row lookups."""
+        cast_df = precision.cast(self.ideal_df, np.float32)
+        self.assertEqual(cast_df["x"].dtype, np.float64)
+        self.assertTrue((cast_df.dtypes.iloc[1:] == np.float32).all())
+        self.assertIs(precision.cast(self.ideal_df), self.ideal_df)  # float64 is a no-op
+        with self.assertRaises(ValueError):
+            precision.configure("float16")
+
+    def test_float32_computation(self):
+        """float32 selects well separated functions like float64 and keeps float32 through the calculations."""
+        self.assertEqual(sse_matrix(np.ones((3, 2), np.float32), np.zeros((3, 4), np.float32)).dtype, np.float32)
+        min_sse = get_min_sse(self.training_df, self.ideal_df, dtype=np.float32)
+        reference = get_min_sse(self.training_df, self.ideal_df)
+        self.assertEqual(reference['y1']['ideal_func'], 'y2')
+        self.assertEqual(min_sse['y1']['ideal_func'], 'y1')
+        for func in ['y2', 'y3', 'y4']:
+            self.assertEqual(min_sse[func]['ideal_func'], reference[func]['ideal_func'])
+
+        funcs = [result['ideal_func'] for result in reference.values()]
+        max_devs = calculate_max_deviations(self.training_df, self.ideal_df, list(reference), funcs, np.float32)
+        self.assertTrue(all(max_dev.dtype == np.float32 for max_dev in max_devs.values()))
+        test_df = self.test_df.assign(ID=range(1, 4))
+        results_df = compute_matches(test_df, self.ideal_df, max_devs, funcs, dtype=np.float32)
+        self.assertEqual(results_df["Delta Y (test func)"].dtype, np.float32)
+
+    def test_float32_parallel_and_classifier(self):
+        """The parallel matching and the classifier compute in float32 like compute_matches."""
+        funcs = ['y1', 'y10', 'y20', 'y30']
+        max_devs = calculate_max_deviations(self.training_df, self.ideal_df, ['y1', 'y2', 'y3', 'y4'], funcs,
+                                            np.float32)
+        test_df = self.test_df.assign(ID=range(1, 4))
+        serial = compute_matches(test_df, self.ideal_df, max_devs, funcs, dtype=np.float32)
+        parallel = compute_matches_parallel(test_df, self.ideal_df, max_devs, funcs, workers=2, shard_size=1,
+                                            dtype=np.float32)
+        pd.testing.assert_frame_equal(parallel, serial)
+        self.assertEqual(parallel["Delta Y (test func)"].dtype, np.float32)
+        # In float32 the first point is within the threshold of y1, unlike in float64
+        self.assertTrue(parallel["within_threshold"].iloc[0])
+
+        classifier = Classifier(self.ideal_df, funcs, max_devs, dtype=np.float32)
+        found, delta_y, within = classifier.classify(test_df["x"].values, test_df["y"].values)
+        self.assertEqual(delta_y.dtype, np.float32)
+        np.testing.assert_array_equal(within.ravel(), serial["within_threshold"].values)
+
+    def test_other_paths_in_float32(self):
+        """The batch mode is checked against float64; the index and the classifier compute in float64."""
+        os.makedirs(os.path.join("datasets", "d0"))
+        for file in ["train.csv", "test.csv"]:
+            shutil.copy(file, os.path.join("datasets", "d0", file))
+        engine, Session = Parent.setup_database(f"sqlite:///{os.path.join(self.tmpdir.name, 'precision.db')}")
+        session = Session()
+        try:
+            import_all(engine, session)
+            precision.configure("float32")
+            with self.assertLogs(level="WARNING") as logs:
+                BatchDatasets.main("datasets", session_factory=Session)
+            self.assertTrue(any("float32 selected y1 for y1, float64 selects y2" in line for line in logs.output))
+            self.assertTrue(any("changed 1 of" in line for line in logs.output))
+
+            index = sync_index(session, Idealfunctions, os.path.join(self.tmpdir.name, "index"))
+            min_sse = get_min_sse_indexed(self.training_df, index,
+                                          lambda ids: fetch_ideal_functions(session, Idealfunctions, ids))
+            self.assertEqual(min_sse['y1']['ideal_func'], 'y2')
+
+            with self.assertLogs(level="WARNING") as logs:
+                classifier = Classifier.from_database(Session)
+            self.assertTrue(any("float64 selects y2" in line for line in logs.output))
+            self.assertEqual(classifier.values.dtype, np.float64)
+        finally:
+            session.close()
+            engine.dispose()
+
+    def test_compare_decisions(self):
+        """Only rows whose within_threshold differs from the float64 results are reported."""
+        reference_df = pd.DataFrame({"ID": [1, 1, 2], "No. of ideal func": pd.Categorical(["y1", "y2", "y1"]),
+                                     "Delta Y (test func)": [0.1, 0.2, 0.3], "Max Deviation": [0.15] * 3,
+                                     "within_threshold": [True, False, False]})
+        results_df = reference_df.assign(within_threshold=[True, True, False])
+        flipped = compare_decisions(results_df, reference_df)
+        self.assertEqual(flipped[["ID", "No. of ideal func"]].values.tolist(), [[1, "y2"]])
+        self.assertFalse(flipped.loc[0, "within_threshold (float64)"])
+
+    def test_checks_against_float64(self):
+        """The guardrail flags the changed selection and the flipped threshold decision of a float32 run."""
+        engine, Session = Parent.setup_database(f"sqlite:///{os.path.join(self.tmpdir.name, 'precision.db')}")
+        session = Session()
+        try:
+            import_all(engine, session)
+            precision.configure("float32")
+            min_sse = get_min_sse(self.training_df, self.ideal_df, top_k=PRECISION_CHECK_CANDIDATES)
+            self.assertEqual(check_fit_precision(session, Idealfunctions, min_sse), [("y1", "y1", "y2")])
+
+            best_ideal_df = create_results_df(min_sse)
+            funcs = best_ideal_df["Ideal Function"].tolist()
+            max_devs = calculate_max_deviations(self.training_df, self.ideal_df, best_ideal_df["Training Function"],
+                                                funcs)
+            results_df = match_test_to_ideal(self.test_df.copy(), self.ideal_df, max_devs, funcs, session, workers=2,
+                                             shard_size=1)
+            flipped = check_match_precision(session, Idealfunctions, best_ideal_df, results_df)
+            self.assertEqual(flipped[["ID", "No. of ideal func"]].values.tolist(), [[1, "y1"]])
+            self.assertTrue(flipped.loc[0, "within_threshold"])
+        finally:
+            session.close()
+            engine.dispose()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import sys
+import os
+import threading
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from Rendering import Renderer
+
+class TestRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def plot(self, name, interactive=True):
+        self.calls.append((name, interactive, threading.current_thread().name))
+
+    def failing_plot(self, interactive=True):
+        raise RuntimeError("render failed")
+
+    def test_none_mode_skips_plots(self):
+        renderer = Renderer(mode="none")
+        self.assertIsNone(renderer.submit(self.plot, "a"))
+        self.assertEqual(self.calls, [])
+
+    def test_file_mode_renders_in_background(self):
+        renderer = Renderer(mode="file", workers=2)
+        futures = [renderer.submit(self.plot, name) for name in ["a", "b"]]
+        renderer.wait()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(sorted(call[:2] for call in self.calls), [("a", False), ("b", False)])
+        self.assertTrue(all(call[2].startswith("render") for call in self.calls))
+
+    def test_interactive_mode_renders_inline(self):
+        renderer = Renderer(mode="interactive")
+        renderer.submit(self.plot, "a")
+        self.assertEqual(self.calls, [("a", True, threading.current_thread().name)])
+
+    def test_errors_are_raised_on_wait(self):
+        renderer = Renderer(mode="file", workers=1)
+        renderer.submit(self.failing_plot)
+        renderer.submit(self.plot, "a")
+        with self.assertRaises(RuntimeError):
+            renderer.wait()
+        self.assertEqual(len(self.calls), 1)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Renderer(mode="browser")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pandas as pd
+from ResultCache import ResultCache
+from FindIdealFunctions import get_min_sse_cached
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.training_df = pd.DataFrame({'x': [1.0, 2.0], 'y1': [1.0, 2.0]})
+        self.ideal_df = pd.DataFrame({'x': [1.0, 2.0], 'y1': [0.0, 0.0], 'y2': [1.0, 2.0]})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hit_on_unchanged_inputs(self):
+        cache = ResultCache(self.tmpdir.name)
+        first = get_min_sse_cached(self.training_df, self.ideal_df, cache)
+        second = get_min_sse_cached(self.training_df, self.ideal_df.copy(), cache)
+        self.assertEqual(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # A new cache instance finds the result on disk
+        reopened = ResultCache(self.tmpdir.name)
+        self.assertEqual(get_min_sse_cached(self.training_df, self.ideal_df, reopened), first)
+        self.assertEqual(reopened.hits, 1)
+
+    def test_miss_on_changed_inputs(self):
+        cache = ResultCache(self.tmpdir.name)
+        get_min_sse_cached(self.training_df, self.ideal_df, cache)
+        changed = self.ideal_df.assign(y1=[1.0, 2.0])
+        self.assertEqual(get_min_sse_cached(self.training_df, changed, cache)['y1']['ideal_func'], 'y1')
+        self.assertEqual(cache.misses, 2)
+
+    def test_lru_eviction(self):
+        cache = ResultCache(self.tmpdir.name, max_entries=2)
+        for value in range(3):
+            cache.cached("square", (value,), lambda: value ** 2)
+        self.assertEqual(len(cache.entries), 2)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 2)
+        # The oldest entry was evicted and is computed again
+        cache.cached("square", (0,), lambda: 0)
+        self.assertEqual(cache.misses, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the 'src' directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from ConfigandImport import Parent, import_all
+from StreamTestData import StreamingEvaluator, iter_point_batches, iter_tail_batches, main
+from EvaluateTestData import read_results
+
+class TestStreamingEvaluator(unittest.TestCase):
+
+    def setUp(self):
+        # The evaluator appends to the results files in the working directory
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.session = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+
+        self.ideal_df = pd.DataFrame({
+            'x': [1.0, 2.0, 3.0],
+            'y1 (ideal func)': [1.0, 2.0, 3.0],
+            'y2 (ideal func)': [0.0, 0.0, 0.0]
+        })
+        self.max_devs = {'y1': 0.6, 'y2': 0.2}
+
+    def tearDown(self):
+        self.session.close()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_batches_are_appended(self):
+        evaluator = StreamingEvaluator(self.ideal_df, ['y1', 'y2'], self.max_devs, self.session,
+                                       results_format="both")
+        points = iter([(1.0, 1.1), (2.0, 0.1), (3.0, 9.0)])
+        evaluator.run(iter_point_batches(points, batch_size=2))
+
+        # IDs continue across batches and every batch is appended to the outputs
+        self.assertEqual(len(evaluator.latencies), 2)
+        results = pd.read_csv("Test Data Evaluation.csv", index_col=0)
+        self.assertEqual(results['ID'].tolist(), [1, 1, 2, 2, 3, 3])
+        self.assertEqual(results.index.tolist(), list(range(6)))
+        binary_results = read_results("Test Data Evaluation.npy")
+        self.assertEqual(binary_results['ID'].tolist(), [1, 1, 2, 2, 3, 3])
+        self.assertEqual(binary_results['within_threshold'].tolist(), results['within_threshold'].tolist())
+        table3 = pd.read_sql('SELECT * FROM "Table 3"', self.session.bind)
+        self.assertEqual(table3['No. of ideal func'].tolist(), ['y1', 'y2'])
+
+    def test_runs_continue_ids(self):
+        """Runs append after the IDs of earlier runs and read the selection from the best fit file by default."""
+        x = np.arange(10.0)
+        ideal = np.column_stack([x * (i % 7) + i for i in range(1, 51)])
+        pd.DataFrame({"x": x, **{f"y{i}": ideal[:, i - 1] for i in range(1, 51)}}).to_csv("ideal.csv", index=False)
+        pd.DataFrame({"x": x, **{f"y{j}": ideal[:, j - 1] + 0.1 for j in range(1, 5)}}).to_csv("train.csv", index=False)
+        pd.DataFrame({"x": x[:3], "y": ideal[:3, 0]}).to_csv("test.csv", index=False)
+        engine, Session = Parent.setup_database(f"sqlite:///{os.path.join(self.tmpdir.name, 'stream.db')}")
+        session = Session()
+        try:
+            import_all(engine, session)
+        finally:
+            session.close()
+
+        try:
+            main("test.csv", batch_size=2, results_format="both", session_factory=Session, best_fit_file=None)
+            # By default the selection is read from the FindIdealFunctions output instead of refitting
+            pd.DataFrame({"Training Function": ["y1", "y2", "y3", "y4"], "Ideal Function": ["y8", "y9", "y10", "y11"],
+                          "SSE": [0.0] * 4}).to_csv("ideal_vs_training.csv", index=False)
+            main("test.csv", batch_size=2, results_format="both", session_factory=Session)
+            main("test.csv", results_format="both", first_id=100, session_factory=Session)
+        finally:
+            engine.dispose()
+        results = pd.read_csv("Test Data Evaluation.csv", index_col=0)
+        self.assertEqual(sorted(results['ID'].unique()), [1, 2, 3, 4, 5, 6, 100, 101, 102])
+        self.assertEqual(sorted(results.loc[results['ID'] <= 3, 'No. of ideal func'].unique()),
+                         ['y1', 'y2', 'y3', 'y4'])
+        self.assertEqual(sorted(results.loc[results['ID'] > 3, 'No. of ideal func'].unique()),
+                         ['y10', 'y11', 'y8', 'y9'])
+        self.assertEqual(results.index.tolist(), list(range(len(results))))
+        self.assertEqual(read_results("Test Data Evaluation.npy")['ID'].tolist(), results['ID'].tolist())
+
+    def test_tail_batches(self):
+        # A partial batch is flushed once the file stops growing
+        with open("stream.csv", "w") as handle:
+            handle.write("x,y\n1.0,1.0\n2.0,2.0\n3.0,3.0\n")
+        batches = list(iter_tail_batches("stream.csv", batch_size=2, poll_interval=0.01, idle_timeout=0.05))
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+
+if __name__ == '__main__':
+    unittest.main()